@@ -66,6 +66,23 @@ cd "${APP_HOME}"
 
 sleep ${STARTUP_DELAY}
 
+# Repair output files damaged by power loss before logging restarts.
+# Only obd_logger output files in VIN directories are checked, other
+# loggers share ${APP_BASE_PATH}.
+for VIN_DIR in "${APP_BASE_PATH}"/*/
+do
+	if [ -d "${VIN_DIR}" ]
+	then
+		${APP_PYTHON} -m telemetry_obd.obd_log_check \
+			--quick \
+			--repair \
+			"${VIN_DIR}"
+
+		export RtnVal="$?"
+		echo obd_log_check "${VIN_DIR}" returns "${RtnVal}"
+	fi
+done
+
 if [ -f "${COMMAND_TESTER}" ]
 then
 	# get next application startup counter
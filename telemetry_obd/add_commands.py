@@ -1,6 +1,7 @@
 # add_commands.py
 # https://python-obd.readthedocs.io/en/latest/Custom%20Commands/
 import logging
+from functools import lru_cache
 from obd import OBDCommand, ECU
 from obd.decoders import percent, count, raw_string, pid, encoded_string
 from pint import UnitRegistry
@@ -14,12 +15,57 @@ logger = logging.getLogger(__name__)
 # ureg.define(UnitDefinition('percent', 'percent', (), ScaleConverter(1 / 100.0)))
 # ureg.define("ppm = count / 1000000 = PPM = parts_per_million")
 
-ureg = UnitRegistry()
-ureg.define("percent = [] = %")
-ureg.define("ratio = []")
-ureg.define("gps = gram / second = GPS = grams_per_second")
-ureg.define("lph = liter / hour = LPH = liters_per_hour")
-ureg.define("ppm = count / 1000000 = PPM = parts_per_million")
+UNIT_DEFINITIONS = [
+    "percent = [] = %",
+    "ratio = []",
+    "gps = gram / second = GPS = grams_per_second",
+    "lph = liter / hour = LPH = liters_per_hour",
+    "ppm = count / 1000000 = PPM = parts_per_million",
+]
+
+# pint caches parsed unit definition files here, ":auto:" is the user cache directory
+UNIT_REGISTRY_CACHE_FOLDER = ":auto:"
+
+@lru_cache(maxsize=None)
+def get_unit_registry() -> UnitRegistry:
+    """
+    Returns the pint UnitRegistry used by the decoders, created on first use.
+    Building a UnitRegistry takes seconds on a Raspberry Pi, the parsed pint
+    unit definitions are cached on disk to speed up later runs.
+    """
+    global ureg
+
+    try:
+        unit_registry = UnitRegistry(cache_folder=UNIT_REGISTRY_CACHE_FOLDER)
+    except Exception as e:
+        logging.warning(f"pint UnitRegistry cache_folder {UNIT_REGISTRY_CACHE_FOLDER}: {e.__class__.__name__}: {e}")
+        unit_registry = UnitRegistry()
+
+    for unit_definition in UNIT_DEFINITIONS:
+        unit_registry.define(unit_definition)
+
+    # decoders look up ureg on every call, skip the LazyUnitRegistry from now on
+    ureg = unit_registry
+
+    return unit_registry
+
+class LazyUnitRegistry():
+    """
+    Stand-in for the decoders' pint UnitRegistry so that importing this
+    module doesn't pay for building it.  The UnitRegistry is created by
+    get_unit_registry() on first use.
+    """
+
+    def __getattr__(self, name):
+        return getattr(get_unit_registry(), name)
+
+    def __getitem__(self, name):
+        return get_unit_registry()[name]
+
+    def __call__(self, *args, **kwargs):
+        return get_unit_registry()(*args, **kwargs)
+
+ureg = LazyUnitRegistry()
 
 
 # useful code insert for debugging decoders
@@ -0,0 +1,909 @@
+# OBD Benchmarks
+# telemetry-obd/telemetry_obd/obd_benchmark.py
+"""
+Micro-benchmarks for telemetry_obd hot paths using synthetic OBD responses.
+"""
+from argparse import ArgumentParser
+from multiprocessing import Pipe, Process
+from statistics import median
+from sys import stdout
+from time import perf_counter, sleep
+from timeit import repeat
+from subprocess import run
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import sys
+import json
+import logging
+import obd
+from obd.OBDResponse import Status
+from obd.codes import BASE_TESTS
+from obd.utils import BitArray
+from rich.console import Console
+from rich.table import Table
+from .__init__ import __version__
+from .add_commands import NEW_COMMANDS, ureg
+from .obd_common_functions import (
+    clean_obd_query_response,
+    get_error_capture_command,
+    get_obd_command,
+    get_obd_error_message,
+    normalize_obd_response_value,
+    StructuredValueEncoder,
+    tuple_to_list_converter,
+    OBD_ERROR_MESSAGES,
+)
+from .obd_byte_layouts import get_compiled_command
+from .obd_bulk_decoder import (
+    bulk_decode,
+    get_bulk_commands,
+    get_bulk_layout,
+    get_payload_array,
+    get_payload_width,
+    layout_fits,
+    scalar_decode,
+)
+from .obd_raw_decoder import get_protocol
+from .obd_synthetic_responses import (
+    build_obd_response,
+    build_coverage_messages,
+    build_decoder_messages,
+    decoded_new_commands,
+    synthetic_payload,
+    CAN_11_500,
+)
+from .obd_log_reader import read_log_records
+from .obd_sqlite_sink import SQLiteSink, SQLITE_BATCH_SIZE
+from .obd_shared_values import SharedValuesWriter, SharedValuesReader
+from .units_lite import (
+    get_lite_command,
+    get_sample_messages,
+)
+
+logger = logging.getLogger(__name__)
+
+ITERATIONS = 10000
+BULK_ROWS = 1000
+REPEAT = 5
+# pipeline runs every command, fewer calls per timing run keeps it under a minute
+PIPELINE_ITERATIONS_DIVISOR = 20
+# percent slower than baseline before a case counts as a regression
+TOLERANCE = 25.0
+PIPELINE_ISO_TS = "2023-01-01T00:00:00.000000+00:00"
+LOG_READER_CYCLES = 200
+LOG_READER_COMMAND_NAME = "RPM"
+# every unbatched insert is a synchronous commit, fewer calls keeps it under a minute on SD cards
+SQLITE_ITERATIONS_DIVISOR = 20
+SQLITE_BATCH_SIZES = [10, SQLITE_BATCH_SIZE, ]
+SHARED_VALUES_NAME = "TELEMETRY_OBD_BENCHMARK"
+SHARED_VALUES_COMMAND_NAME = "RPM"
+# publish to read latency samples are iterations divided by this
+SHARED_VALUES_ITERATIONS_DIVISOR = 20
+SHARED_VALUES_INTERVAL = 0.001      # seconds between latency samples
+SHARED_VALUES_TIMEOUT = 10.0        # seconds to wait for the latency sampling process
+
+# python-obd builds its own UnitRegistry on import, obd is the floor
+IMPORT_TIME_MODULES = [
+    "obd",
+    "telemetry_obd.add_commands",
+    "telemetry_obd.obd_common_functions",
+    "telemetry_obd.list_all_commands",
+]
+
+ERROR_SCAN_RESPONSES = {
+    "RPM single frame": [
+        "7E8 04 41 0C 1A F8",
+    ],
+    "RPM two ECUs": [
+        "7E8 04 41 0C 1A F8",
+        "7E9 04 41 0C 1A F8",
+    ],
+    "VIN multi-frame": [
+        "7E8 10 14 49 02 01 31 46 54",
+        "7E8 21 46 57 31 45 47 33 4B",
+        "7E8 22 46 41 30 30 30 30 30",
+    ],
+    "VIN multi-frame two ECUs": [
+        "7E8 10 14 49 02 01 31 46 54",
+        "7E8 21 46 57 31 45 47 33 4B",
+        "7E8 22 46 41 30 30 30 30 30",
+        "7E9 10 14 49 02 01 31 46 54",
+        "7E9 21 46 57 31 45 47 33 4B",
+        "7E9 22 46 41 30 30 30 30 30",
+    ],
+    "VIN multi-frame BUFFER FULL": [
+        "7E8 10 14 49 02 01 31 46 54",
+        "7E8 21 46 57 31 45 47 33 4B",
+        "7E8 22 46 41 30 30 30 30 30",
+        "BUFFER FULL",
+    ],
+    "NO DATA": [
+        "NO DATA",
+    ],
+    ">DATA ERROR": [
+        "7E8 04 41 0C 1A F8",
+        "7E8 04 41 0C 1A F8 >DATA ERROR",
+    ],
+}
+
+def time_function(function, iterations:int=ITERATIONS, repeat_count:int=REPEAT) -> float:
+    """
+    Returns best of repeat_count runs of function in seconds per call.
+    """
+    return min(repeat(function, number=iterations, repeat=repeat_count)) / iterations
+
+def nested_loop_obd_error_message(obd_response) -> str:
+    """
+    Reference get_obd_error_message() implementation scanning every message
+    once for every OBD_ERROR_MESSAGES key.
+    """
+    for message in obd_response.messages:
+        for obd_error_message in OBD_ERROR_MESSAGES:
+            raw_message = message.raw()
+            if obd_error_message in raw_message:
+                return obd_error_message
+
+    return None
+
+def benchmark_error_scan(iterations:int=ITERATIONS, repeat_count:int=REPEAT) -> list:
+    """
+    Compare nested loop and single pass OBD adapter error message scans.
+    Each case is also decoded the way obd_logger queries are, through the
+    command's ECU filter, to check the error message survives filtering.
+    """
+    results = []
+    command = get_error_capture_command(obd.commands["VIN"])
+
+    for case, lines in ERROR_SCAN_RESPONSES.items():
+        obd_response = build_obd_response("VIN", lines)
+
+        expected = nested_loop_obd_error_message(obd_response)
+        actual = get_obd_error_message(obd_response)
+        if expected != actual:
+            logging.error(f"error_scan: {case}: expected {expected}, got {actual}")
+
+        # adapter error lines are tagged ECU.UNKNOWN and dropped by the ECU filter
+        decoded = get_obd_error_message(command(get_protocol(CAN_11_500)(lines)))
+        if expected != decoded:
+            logging.error(f"error_scan: {case}: decoded expected {expected}, got {decoded}")
+
+        results.append({
+            'benchmark': 'error_scan',
+            'case': case,
+            'result': str(actual) if expected == actual == decoded else 'MISMATCH',
+            'reference': time_function(lambda: nested_loop_obd_error_message(obd_response), iterations, repeat_count),
+            'current': time_function(lambda: get_obd_error_message(obd_response), iterations, repeat_count),
+        })
+
+    return results
+
+def isinstance_chain_normalizer(command_name:str, value):
+    """
+    Reference obd_response.value normalizer running the full isinstance
+    chain on every call.
+    """
+    if isinstance(value, bytearray):
+        return value.decode("utf-8")
+
+    if isinstance(value, BitArray):
+        return list(value)
+
+    if isinstance(value, Status):
+        return [
+            str(value.__dict__[base_test])
+            for base_test in BASE_TESTS
+        ]
+
+    if isinstance(value, ureg.Quantity) or 'Quantity' in value.__class__.__name__:
+        return str(value)
+
+    if isinstance(value, list):
+        return_value = []
+        for item in value:
+            if isinstance(item, ureg.Quantity) or isinstance(item, bytearray):
+                return_value.append(str(item))
+            elif 'Quantity' in item.__class__.__name__:
+                return_value.append(str(item))
+            else:
+                return_value.append(item)
+        return return_value
+
+    if isinstance(value, tuple):
+        return tuple_to_list_converter(value)
+
+    return value
+
+def benchmark_normalizer(iterations:int=ITERATIONS, repeat_count:int=REPEAT) -> list:
+    """
+    Compare isinstance chain and cached per-command normalizers
+    across NEW_COMMANDS decoder output.
+    """
+    results = []
+
+    for command_name, obd_response in decoded_new_commands().items():
+        value = obd_response.value
+
+        expected = isinstance_chain_normalizer(command_name, value)
+        actual = normalize_obd_response_value(command_name, value)
+        if expected != actual:
+            logging.error(f"normalizer: {command_name}: expected {expected}, got {actual}")
+
+        results.append({
+            'benchmark': 'normalizer',
+            'case': command_name,
+            'result': value.__class__.__name__,
+            'reference': time_function(lambda: isinstance_chain_normalizer(command_name, value), iterations, repeat_count),
+            'current': time_function(lambda: normalize_obd_response_value(command_name, value), iterations, repeat_count),
+        })
+
+    return results
+
+def benchmark_structured_values(iterations:int=ITERATIONS, repeat_count:int=REPEAT) -> list:
+    """
+    Compare Pint string formatting and magnitude/unit id encoding
+    across NEW_COMMANDS decoder output containing Quantity values.
+    """
+    results = []
+    value_encoder = StructuredValueEncoder()
+
+    def encode(command_name, value):
+        return value_encoder.normalize(command_name, value), value_encoder.pop_unit()
+
+    for command_name, obd_response in decoded_new_commands().items():
+        value = obd_response.value
+
+        value_part, unit = encode(command_name, value)
+        if unit is None:
+            # no Quantity values to encode
+            continue
+
+        results.append({
+            'benchmark': 'structured_values',
+            'case': command_name,
+            'result': value.__class__.__name__,
+            'reference': time_function(lambda: normalize_obd_response_value(command_name, value), iterations, repeat_count),
+            'current': time_function(lambda: encode(command_name, value), iterations, repeat_count),
+        })
+
+    return results
+
+def benchmark_units_lite(iterations:int=ITERATIONS, repeat_count:int=REPEAT) -> list:
+    """
+    Compare pint and units lite decoding time for NEW_COMMANDS decoders
+    covered by UNIT_SCHEMA.
+    """
+    results = []
+
+    for command in NEW_COMMANDS:
+        lite_command = get_lite_command(command)
+        if lite_command is command:
+            # pint only
+            continue
+
+        for messages in get_sample_messages(command):
+            try:
+                expected = normalize_obd_response_value(command.name, command(messages).value)
+                break
+            except Exception:
+                # data the decoder can't handle, try the next sample
+                continue
+
+        actual = normalize_obd_response_value(command.name, lite_command(messages).value)
+        if expected != actual:
+            logging.error(f"units_lite: {command.name}: expected {expected}, got {actual}")
+
+        results.append({
+            'benchmark': 'units_lite',
+            'case': command.name,
+            'result': 'match' if expected == actual else 'MISMATCH',
+            'reference': time_function(lambda: command(messages), iterations, repeat_count),
+            'current': time_function(lambda: lite_command(messages), iterations, repeat_count),
+        })
+
+    return results
+
+def benchmark_byte_layouts(iterations:int=ITERATIONS, repeat_count:int=REPEAT) -> list:
+    """
+    Compare hand written add_commands.py decoders and compiled byte layout
+    decoders across NEW_COMMANDS commands with a byte layout.
+    """
+    results = []
+
+    for command in NEW_COMMANDS:
+        compiled_command = get_compiled_command(command)
+        if compiled_command is command:
+            # no byte layout
+            continue
+
+        messages = build_decoder_messages(command, printable=False)
+
+        expected = normalize_obd_response_value(command.name, command(messages).value)
+        actual = normalize_obd_response_value(command.name, compiled_command(messages).value)
+        if expected != actual:
+            logging.error(f"byte_layouts: {command.name}: expected {expected}, got {actual}")
+
+        results.append({
+            'benchmark': 'byte_layouts',
+            'case': command.name,
+            'result': 'match' if expected == actual else 'MISMATCH',
+            'reference': time_function(lambda: command.decode(messages), iterations, repeat_count),
+            'current': time_function(lambda: compiled_command.decode(messages), iterations, repeat_count),
+        })
+
+    return results
+
+def benchmark_bulk_decode(iterations:int=ITERATIONS, repeat_count:int=REPEAT) -> list:
+    """
+    Compare per row decode time of scalar decoders and vectorized bulk
+    decoding across BULK_ROWS synthetic payloads per command.
+    """
+    results = []
+    bulk_iterations = max(1, iterations // BULK_ROWS)
+
+    for command in get_bulk_commands():
+        width = get_payload_width(command)
+        layout = get_bulk_layout(command)
+        if layout is None or not layout_fits(layout, width):
+            # scalar decoder only
+            continue
+
+        payloads = get_payload_array([
+            synthetic_payload(width, seed, printable=False) for seed in range(BULK_ROWS)
+        ], width)
+
+        result = bulk_decode(command.name, payloads)
+
+        results.append({
+            'benchmark': 'bulk_decode',
+            'case': command.name,
+            'result': f"{len(result['columns'])} columns",
+            'reference': time_function(lambda: scalar_decode(command, payloads), bulk_iterations, repeat_count) / BULK_ROWS,
+            'current': time_function(lambda: bulk_decode(command.name, payloads), bulk_iterations, repeat_count) / BULK_ROWS,
+        })
+
+    return results
+
+def get_pipeline_commands() -> list:
+    """
+    NEW_COMMANDS and python-obd Mode 01 and Mode 09 commands, the way
+    obd_logger looks them up by name.
+    """
+    commands = {}
+
+    for command in list(NEW_COMMANDS) + list(obd.commands[1]) + list(obd.commands[9]):
+        if command and command.name not in commands:
+            commands[command.name] = get_obd_command(command.name)
+
+    return list(commands.values())
+
+def run_pipeline(command:obd.OBDCommand, messages:list) -> str:
+    """
+    obd_logger's per command work on received messages: decode, clean the
+    response and serialize the output record.
+    """
+    obd_response = command(messages)
+    obd_response_value = clean_obd_query_response(command.name, obd_response)
+
+    return json.dumps({
+        'command_name': command.name,
+        'obd_response_value': obd_response_value,
+        'iso_ts_pre': PIPELINE_ISO_TS,
+        'iso_ts_post': PIPELINE_ISO_TS,
+    })
+
+def get_pipeline_sample(command:obd.OBDCommand) -> tuple:
+    """
+    Synthetic messages run_pipeline() handles for command: the default
+    sample or else the first sample covering every support bit that works.
+    Returns (messages, record) or (None, first exception) when every sample fails.
+    """
+    # string decoders (VIN, CALIBRATION_ID) need printable data
+    samples = [
+        build_decoder_messages(command, printable=(command.command[:2] == b"09")),
+    ] + build_coverage_messages(command)
+    exception = None
+
+    for messages in samples:
+        try:
+            return messages, run_pipeline(command, messages)
+        except Exception as e:
+            exception = exception or e
+
+    return None, exception
+
+def benchmark_pipeline(iterations:int=ITERATIONS, repeat_count:int=REPEAT) -> list:
+    """
+    Time decode, clean_obd_query_response() and JSON serialization for every
+    NEW_COMMANDS and python-obd Mode 01/09 command on synthetic messages.
+    Reference is the current time unless a baseline is being compared.
+    Commands failing on every synthetic sample are listed as skipped.
+    """
+    results = []
+    pipeline_iterations = max(1, iterations // PIPELINE_ITERATIONS_DIVISOR)
+
+    for command in get_pipeline_commands():
+        messages, record = get_pipeline_sample(command)
+
+        if messages is None:
+            logging.warning(f"pipeline: {command.name}: skipped, synthetic data exception {record.__class__.__name__}: {record}")
+            results.append({
+                'benchmark': 'pipeline',
+                'case': command.name,
+                'result': f"skipped: {record.__class__.__name__}",
+                'reference': None,
+                'current': None,
+            })
+            continue
+
+        current = time_function(lambda: run_pipeline(command, messages), pipeline_iterations, repeat_count)
+
+        results.append({
+            'benchmark': 'pipeline',
+            'case': command.name,
+            'result': f"{len(record)} bytes",
+            'reference': current,
+            'current': current,
+        })
+
+    return results
+
+def write_benchmark_log_file(log_file_path:Path) -> int:
+    """
+    Write an obd_logger style output file with LOG_READER_CYCLES copies of
+    every pipeline command record.  Returns line count.
+    """
+    records = []
+    for command in get_pipeline_commands():
+        messages, record = get_pipeline_sample(command)
+        if messages is None:
+            logging.warning(f"log_reader: {command.name}: skipped, synthetic data exception {record.__class__.__name__}: {record}")
+            continue
+        records.append(record)
+
+    with open(log_file_path, mode='w', encoding='utf-8') as log_file:
+        for _ in range(LOG_READER_CYCLES):
+            for record in records:
+                log_file.write(record + "\n")
+
+    return len(records) * LOG_READER_CYCLES
+
+def naive_read_log_records(log_file_path:Path, command_names:list=None) -> list:
+    """Reference reader: json.loads() on every line, filtering afterwards."""
+    records = []
+
+    with open(log_file_path, mode='r', encoding='utf-8') as log_file:
+        for line in log_file:
+            record = json.loads(line)
+            if command_names is None or record['command_name'] in command_names:
+                records.append(record)
+
+    return records
+
+def benchmark_log_reader(iterations:int=ITERATIONS, repeat_count:int=REPEAT) -> list:
+    """
+    Compare json.loads() per line with obd_log_reader.read_log_records()
+    reading a synthetic output file.  Times are per line in the file.
+    """
+    results = []
+
+    with TemporaryDirectory() as temporary_dir:
+        log_file_path = Path(temporary_dir) / "benchmark.json"
+        line_count = write_benchmark_log_file(log_file_path)
+        # one file read per timing run
+        read_iterations = max(1, iterations // line_count)
+
+        cases = {
+            "all commands": None,
+            f"{LOG_READER_COMMAND_NAME} only": [LOG_READER_COMMAND_NAME, ],
+        }
+
+        for case, command_names in cases.items():
+            expected = naive_read_log_records(log_file_path, command_names)
+            actual = [log_record.record for log_record in read_log_records(log_file_path, command_names)]
+            if expected != actual:
+                logging.error(f"log_reader: {case}: {len(expected)} records expected, got {len(actual)}")
+
+            results.append({
+                'benchmark': 'log_reader',
+                'case': case,
+                'result': f"{len(actual)} records" if expected == actual else 'MISMATCH',
+                'reference': time_function(
+                    lambda: naive_read_log_records(log_file_path, command_names), read_iterations, repeat_count
+                ) / line_count,
+                'current': time_function(
+                    lambda: list(read_log_records(log_file_path, command_names)), read_iterations, repeat_count
+                ) / line_count,
+            })
+
+    return results
+
+def insert_sqlite_records(sqlite_sink:SQLiteSink, records:list, record_count:int):
+    """Add record_count records to sqlite_sink, cycling through records, and commit."""
+    for record_number in range(record_count):
+        sqlite_sink.add_record(records[record_number % len(records)])
+    sqlite_sink.commit()
+
+def benchmark_sqlite_sink(iterations:int=ITERATIONS, repeat_count:int=REPEAT) -> list:
+    """
+    Insert time per record into a SQLite database (obd_logger --sqlite_file)
+    committing every record and committing in batches.  The database is
+    in the temporary directory, set TMPDIR to time other storage.
+    """
+    records = []
+    for command in get_pipeline_commands():
+        messages, record = get_pipeline_sample(command)
+        if messages is None:
+            logging.warning(f"sqlite_sink: {command.name}: skipped, synthetic data exception {record.__class__.__name__}: {record}")
+            continue
+        records.append(json.loads(record))
+
+    record_count = max(1, iterations // SQLITE_ITERATIONS_DIVISOR)
+    results = []
+
+    with TemporaryDirectory() as temporary_dir:
+        logging.info(f"sqlite_sink: database directory {temporary_dir}")
+
+        # batch_seconds long enough that only batch_size triggers commits
+        reference_sink = SQLiteSink(Path(temporary_dir) / "reference.db", batch_size=1, batch_seconds=3600.0)
+
+        for batch_size in SQLITE_BATCH_SIZES:
+            sqlite_sink = SQLiteSink(Path(temporary_dir) / f"batch-{batch_size}.db", batch_size, batch_seconds=3600.0)
+
+            results.append({
+                'benchmark': 'sqlite_sink',
+                'case': f"batch size {batch_size}",
+                'result': f"{record_count} records",
+                'reference': time_function(
+                    lambda: insert_sqlite_records(reference_sink, records, record_count), 1, repeat_count
+                ) / record_count,
+                'current': time_function(
+                    lambda: insert_sqlite_records(sqlite_sink, records, record_count), 1, repeat_count
+                ) / record_count,
+            })
+
+            sqlite_sink.close()
+
+        reference_sink.close()
+
+    return results
+
+def read_shared_value_latencies(connection, sample_count:int, start_time:float):
+    """
+    Latency sampling process: spins on the shared values table until
+    sample_count new values arrive or the publisher says it's done
+    (publishes closer together than a read coalesce).  Values are the
+    writer's perf_counter() (system wide on Linux), values from before
+    start_time aren't samples.  Sends the latencies back over connection.
+    """
+    reader = SharedValuesReader(SHARED_VALUES_NAME)
+    latencies = []
+    last_value = None
+    done = False
+    connection.send(None)
+
+    while len(latencies) < sample_count:
+        shared_value = reader.get(SHARED_VALUES_COMMAND_NAME)
+        value = shared_value['value'] if shared_value else None
+
+        if isinstance(value, float) and value >= start_time and value != last_value:
+            latencies.append(perf_counter() - value)
+            last_value = value
+        elif done:
+            break
+        else:
+            # one more read after done for the last value
+            done = connection.poll()
+
+    reader.close()
+    connection.send(latencies)
+
+def read_pipe_latencies(connection, sample_count:int, start_time:float):
+    """Reference latency sampling process: JSON records through a pipe."""
+    latencies = []
+    connection.send(None)
+
+    while len(latencies) < sample_count:
+        record = json.loads(connection.recv_bytes())
+        latencies.append(perf_counter() - record['obd_response_value'])
+
+    connection.send(latencies)
+
+def receive(connection, process:Process):
+    """Next message from process over connection, giving up after SHARED_VALUES_TIMEOUT."""
+    if not connection.poll(SHARED_VALUES_TIMEOUT):
+        process.terminate()
+        process.join()
+        raise TimeoutError(f"no answer from latency sampling process in {SHARED_VALUES_TIMEOUT} seconds")
+
+    return connection.recv()
+
+def measure_latency(target, publish, sample_count:int) -> tuple:
+    """
+    Returns (median publish to read latency in seconds, samples read).
+    publish(connection, value) sends value to the target reader process
+    every SHARED_VALUES_INTERVAL.
+    """
+    connection, child_connection = Pipe()
+    process = Process(target=target, args=(child_connection, sample_count, perf_counter(), ))
+    process.start()
+    # reader ready
+    receive(connection, process)
+
+    for _ in range(sample_count):
+        publish(connection, perf_counter())
+        sleep(SHARED_VALUES_INTERVAL)
+
+    # done publishing
+    connection.send(None)
+
+    latencies = receive(connection, process)
+    process.join()
+
+    return (median(latencies) if latencies else float('nan')), len(latencies)
+
+def benchmark_shared_values(iterations:int=ITERATIONS, repeat_count:int=REPEAT) -> list:
+    """
+    Shared memory latest value table (obd_logger --shared_values) compared
+    with JSON serialization: publish time, read time and median publish to
+    read latency between processes (reference is JSON through a pipe).
+    """
+    record = {
+        'command_name': SHARED_VALUES_COMMAND_NAME,
+        'obd_response_value': "1234.5 revolutions_per_minute",
+        'iso_ts_pre': PIPELINE_ISO_TS,
+        'iso_ts_post': PIPELINE_ISO_TS,
+    }
+    line = json.dumps(record)
+
+    writer = SharedValuesWriter(SHARED_VALUES_NAME)
+    results = []
+
+    try:
+        writer.publish(record)
+        reader = SharedValuesReader(SHARED_VALUES_NAME)
+
+        results.append({
+            'benchmark': 'shared_values',
+            'case': "publish",
+            'result': '',
+            'reference': time_function(lambda: json.dumps(record), iterations, repeat_count),
+            'current': time_function(lambda: writer.publish(record), iterations, repeat_count),
+        })
+        results.append({
+            'benchmark': 'shared_values',
+            'case': "read",
+            'result': '',
+            'reference': time_function(lambda: json.loads(line), iterations, repeat_count),
+            'current': time_function(lambda: reader.get(SHARED_VALUES_COMMAND_NAME), iterations, repeat_count),
+        })
+        reader.close()
+
+        sample_count = max(1, iterations // SHARED_VALUES_ITERATIONS_DIVISOR)
+
+        def publish_shared_value(connection, value):
+            writer.publish({**record, 'obd_response_value': value, })
+
+        def publish_pipe(connection, value):
+            connection.send_bytes(json.dumps({**record, 'obd_response_value': value, }).encode('utf-8'))
+
+        reference_latency, _ = measure_latency(read_pipe_latencies, publish_pipe, sample_count)
+        # "no response" in the slot so the last published value isn't read as a sample
+        writer.publish({**record, 'obd_response_value': None, })
+        current_latency, read_count = measure_latency(read_shared_value_latencies, publish_shared_value, sample_count)
+
+        results.append({
+            'benchmark': 'shared_values',
+            'case': "publish to read latency",
+            'result': f"{read_count} of {sample_count} samples read",
+            'reference': reference_latency,
+            'current': current_latency,
+        })
+    finally:
+        writer.close()
+
+    return results
+
+def time_python(source:str, repeat_count:int=REPEAT) -> float:
+    """
+    Returns best of repeat_count runs of source in a new Python interpreter
+    in seconds, interpreter startup included.
+    """
+    return min(
+        time_function(lambda: run([sys.executable, "-c", source], check=True), 1, 1)
+        for _ in range(repeat_count)
+    )
+
+def benchmark_import_time(iterations:int=ITERATIONS, repeat_count:int=REPEAT) -> list:
+    """
+    Compare module import time with the add_commands.py UnitRegistry created
+    lazily (current) and eagerly without pint's definition cache (reference).
+    iterations is ignored, each run is a new Python interpreter.
+    """
+    results = []
+
+    for module in IMPORT_TIME_MODULES:
+        reference_source = f"import {module}"
+        if module.startswith("telemetry_obd."):
+            reference_source += "; import pint; pint.UnitRegistry()"
+
+        results.append({
+            'benchmark': 'import_time',
+            'case': module,
+            'result': '',
+            'reference': time_python(reference_source, repeat_count),
+            'current': time_python(f"import {module}", repeat_count),
+        })
+
+    return results
+
+BENCHMARKS = {
+    'error_scan': benchmark_error_scan,
+    'normalizer': benchmark_normalizer,
+    'structured_values': benchmark_structured_values,
+    'units_lite': benchmark_units_lite,
+    'byte_layouts': benchmark_byte_layouts,
+    'bulk_decode': benchmark_bulk_decode,
+    'import_time': benchmark_import_time,
+    'pipeline': benchmark_pipeline,
+    'log_reader': benchmark_log_reader,
+    'sqlite_sink': benchmark_sqlite_sink,
+    'shared_values': benchmark_shared_values,
+}
+
+def save_baseline(results:list, baseline_path:Path):
+    """Save current times as the baseline for later --baseline runs."""
+    baseline = {}
+    for result in results:
+        if result['current'] is not None:
+            baseline.setdefault(result['benchmark'], {})[result['case']] = result['current']
+
+    with open(baseline_path, "w") as baseline_file:
+        baseline_file.write(json.dumps({'version': __version__, 'benchmarks': baseline}, indent=4) + "\n")
+
+def compare_baseline(results:list, baseline_path:Path, tolerance:float=TOLERANCE) -> int:
+    """
+    Replace reference times with baseline times and flag cases more than
+    tolerance percent slower than baseline.  Returns the regression count.
+    Cases missing from the baseline are left alone.
+    """
+    with open(baseline_path, "r") as baseline_file:
+        baseline = json.load(baseline_file)['benchmarks']
+
+    regressions = 0
+
+    for result in results:
+        reference = baseline.get(result['benchmark'], {}).get(result['case'])
+        if reference is None or result['current'] is None:
+            continue
+
+        result['reference'] = reference
+        if result['current'] > reference * (1.0 + tolerance / 100.0):
+            logging.error(f"{result['benchmark']}: {result['case']}: regression {reference * 1000000:.3f} µs -> {result['current'] * 1000000:.3f} µs")
+            result['result'] = 'REGRESSION'
+            regressions += 1
+
+    return regressions
+
+def rich_print(results:list):
+    console = Console()
+
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("Benchmark", justify='left')
+    table.add_column("Case", justify='left')
+    table.add_column("Result", justify='left')
+    table.add_column("Reference µs", justify='right')
+    table.add_column("Current µs", justify='right')
+    table.add_column("Speedup", justify='right')
+
+    for result in results:
+        if result['current'] is None:
+            # skipped case
+            table.add_row(result['benchmark'], result['case'], result['result'], "-", "-", "-")
+            continue
+
+        table.add_row(
+            result['benchmark'],
+            result['case'],
+            result['result'],
+            f"{result['reference'] * 1000000:.3f}",
+            f"{result['current'] * 1000000:.3f}",
+            f"{result['reference'] / result['current']:.2f}x",
+        )
+
+    console.print(table)
+
+def argument_parsing()-> dict:
+    """Argument parsing"""
+    parser = ArgumentParser(description="Telemetry OBD Benchmarks")
+    parser.add_argument(
+        "benchmarks",
+        nargs='*',
+        metavar="benchmarks",
+        default=list(BENCHMARKS),
+        help=f"Benchmarks to run.  Choose from {', '.join(BENCHMARKS)}.  Default is all of them."
+    )
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=ITERATIONS,
+        help=f"Number of calls per timing run. Default is {ITERATIONS}."
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=REPEAT,
+        help=f"Number of timing runs, the fastest is reported. Default is {REPEAT}."
+    )
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        default=None,
+        help="Compare against baseline times saved with --save_baseline. Exit status is 1 on regression."
+    )
+    parser.add_argument(
+        "--save_baseline",
+        type=Path,
+        default=None,
+        help="Save current times to this baseline file."
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=TOLERANCE,
+        help=f"Percent slower than baseline before a case is a regression. Default is {TOLERANCE}."
+    )
+    parser.add_argument(
+        "--verbose",
+        help="Turn verbose output on. Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--version",
+        help="Print version number and exit.",
+        default=False,
+        action='store_true'
+    )
+    return vars(parser.parse_args())
+
+def main():
+    """Run main function."""
+
+    args = argument_parsing()
+
+    if args['version']:
+        print(f"Version {__version__}", file=stdout)
+        exit(0)
+
+    logging_level = logging.WARNING
+
+    if args['verbose']:
+        logging_level = logging.INFO
+
+    logging.basicConfig(stream=sys.stdout, level=logging_level)
+
+    results = []
+    for benchmark in args['benchmarks']:
+        if benchmark not in BENCHMARKS:
+            logging.error(f"unknown benchmark {benchmark}, choose from {', '.join(BENCHMARKS)}")
+            exit(1)
+
+        logging.info(f"running benchmark {benchmark}")
+        results += BENCHMARKS[benchmark](args['iterations'], args['repeat'])
+
+    regressions = 0
+    if args['baseline']:
+        regressions = compare_baseline(results, args['baseline'], args['tolerance'])
+
+    rich_print(results)
+
+    if args['save_baseline']:
+        save_baseline(results, args['save_baseline'])
+
+    if regressions:
+        print(f"{regressions} regressions against baseline {args['baseline']}", file=stdout)
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
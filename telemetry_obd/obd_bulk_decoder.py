@@ -0,0 +1,474 @@
+# OBD Bulk Decoder
+# telemetry-obd/telemetry_obd/obd_bulk_decoder.py
+"""
+Vectorized bulk decoding of recorded OBD response data, one command at a
+time, for re-processing large amounts of recorded data.
+
+bulk_decode() takes every response data payload (the data bytes after the
+mode/PID bytes) for one command as a 2-D uint8 NumPy array, one row per
+response, and returns one decoded column per decoder output item.
+
+Decoders described by a byte layout are vectorized:
+    - add_commands.py decoders with a BYTE_LAYOUTS entry (obd_byte_layouts.py)
+    - python-obd Mode 01 decoders in PYTHON_OBD_LAYOUTS
+    - python-obd unsigned UAS (unit and scaling) decoders
+Vectorized columns hold magnitudes with units listed separately.  Items
+gated by support bits are NumPy masked arrays, masked where the scalar
+decoder returns None.
+
+Every other decoder (bit arrays, strings, DTCs, ...) falls back to the
+scalar decoder, one row at a time.  NumPy is optional, without it every
+command falls back to the scalar decoders.
+
+Check vectorized decoding against the scalar decoders:
+
+    python3.11 -m telemetry_obd.obd_bulk_decoder --check
+"""
+from argparse import ArgumentParser
+from functools import lru_cache, partial
+from sys import stdout
+import sys
+import logging
+import obd
+from obd.decoders import decode_uas
+from obd.UnitsAndScaling import UAS, UAS_IDS
+from obd.protocols import ECU
+from obd.protocols.protocol import Frame, Message
+from .__init__ import __version__
+from . import add_commands, obd_byte_layouts
+from .add_commands import NEW_COMMANDS, no_data
+from .obd_byte_layouts import (
+    BYTE_LAYOUTS,
+    as_bits,
+    get_layout_items,
+    value,
+)
+from .obd_common_functions import get_obd_command
+from .obd_raw_decoder import raw_record_to_messages
+from .obd_synthetic_responses import synthetic_payload
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+CHECK_SEEDS = range(16)
+
+# python-obd decoders keyed by obd.decoders function name.
+# width None is every data byte, the way python-obd's bytes_to_int(d) reads them.
+PYTHON_OBD_LAYOUTS = {
+    'percent': value(0, unit="percent", scale=100.0, divisor=255.0),
+    'percent_centered': value(0, unit="percent", raw_offset=-128, scale=100.0, divisor=128.0),
+    'temp': value(0, None, unit="celsius", offset=-40),
+    'fuel_pressure': value(0, unit="kilopascal", scale=3),
+    'pressure': value(0, unit="kilopascal"),
+    'timing_advance': value(0, unit="degree", raw_offset=-128, divisor=2.0),
+    'max_maf': value(0, unit="gps", scale=10),
+    'fuel_rate': value(0, None, unit="lph", scale=0.05),
+    'inject_timing': value(0, None, unit="degree", raw_offset=-26880, divisor=128.0),
+    'absolute_load': value(0, None, unit="percent", scale=100.0/255.0),
+    'abs_evap_pressure': value(0, None, unit="kilopascal", divisor=200.0),
+    'evap_pressure_alt': value(0, None, unit="pascal", offset=-32767),
+    'sensor_voltage': value(0, unit="volt", divisor=200.0),
+    'sensor_voltage_big': value(2, 2, unit="volt", scale=8.0, divisor=65535),
+    'current_centered': value(2, 2, unit="milliampere", divisor=256.0, offset=-128),
+    'count': value(0, None, unit="count"),
+}
+
+def get_payload_width(command:obd.OBDCommand) -> int:
+    """Number of data bytes after the mode/PID bytes in command's responses."""
+    return max(0, command.bytes - 2)
+
+def get_bulk_layout(command:obd.OBDCommand):
+    """
+    Returns the byte layout (item or list of items) decoding command's
+    responses or None when command's decoder can't be vectorized.
+    """
+    decoder = command.decode
+    width = get_payload_width(command)
+
+    if isinstance(decoder, partial):
+        if decoder.func is not decode_uas:
+            return None
+
+        uas = UAS_IDS.get(decoder.keywords.get('id_'))
+        if not isinstance(uas, UAS) or uas.signed:
+            return None
+
+        return value(0, width, unit=uas.unit, scale=uas.scale, offset=uas.offset)
+
+    name = getattr(decoder, '__name__', None)
+    module = getattr(decoder, '__module__', None)
+
+    if module in (add_commands.__name__, obd_byte_layouts.__name__, ):
+        return BYTE_LAYOUTS.get(name)
+
+    if module == obd.decoders.__name__ and name in PYTHON_OBD_LAYOUTS:
+        layout = PYTHON_OBD_LAYOUTS[name]
+        if layout['width'] is None:
+            layout = dict(layout, width=width)
+        return layout
+
+    return None
+
+def layout_fits(layout, width:int) -> bool:
+    """True when every layout field lies within width payload bytes."""
+    for item in get_layout_items(layout):
+        if item['byte'] + item['width'] > width or item['support_byte'] >= width:
+            return False
+        if item['width'] not in (1, 2, 3, 4, ):
+            return False
+
+    return True
+
+@lru_cache(maxsize=None)
+def get_unit_string(unit) -> str:
+    """Pint unit string for a layout unit (unit name or pint unit)."""
+    if unit is None:
+        return None
+
+    if isinstance(unit, str):
+        return str(add_commands.get_unit_registry().parse_units(unit))
+
+    return str(unit)
+
+def get_payload_array(payloads:list, width:int):
+    """
+    Convert a list of payloads (bytes like) into a 2-D uint8 array with width
+    columns.  Short payloads are zero padded, long payloads truncated, the
+    same way python-obd constrains response data to the command's size.
+    """
+    return numpy.frombuffer(
+        b"".join(bytes(payload[:width]).ljust(width, b"\x00") for payload in payloads),
+        dtype=numpy.uint8
+    ).reshape(len(payloads), width)
+
+def get_field_column(payloads, byte:int, width:int):
+    """Big endian unsigned integer column from payload bytes byte to byte + width."""
+    column = payloads[:, byte].astype(numpy.int64)
+
+    for index in range(byte + 1, byte + width):
+        column = (column << 8) | payloads[:, index]
+
+    return column
+
+def get_gate_column(payloads, item:dict):
+    """Boolean column, True where item's support gate is open, or None when ungated."""
+    support_column = payloads[:, item['support_byte']]
+    gate = None
+
+    for bit in as_bits(item['support']):
+        bit_gate = (support_column & (1 << bit)) != 0
+        gate = bit_gate if gate is None else gate & bit_gate
+
+    for bit in as_bits(item['unless']):
+        bit_gate = (support_column & (1 << bit)) == 0
+        gate = bit_gate if gate is None else gate & bit_gate
+
+    return gate
+
+def get_item_column(payloads, item:dict):
+    """Decode one layout item across every payload row."""
+    column = get_field_column(payloads, item['byte'], item['width'])
+
+    if item['kind'] == 'flag':
+        column = column & (1 << item['bit'])
+
+    elif item['kind'] == 'bits':
+        if item['shift']:
+            column = column >> item['shift']
+        if item['mask'] is not None:
+            column = column & item['mask']
+        if item['table'] is not None:
+            table_size = 256 if item['mask'] is None else item['mask'] + 1
+            table = numpy.array([item['table'].get(index) for index in range(table_size)], dtype=object)
+            column = table[column]
+
+    else:
+        # same operations in the same order as the scalar decoders
+        if item['float_raw']:
+            column = column.astype(numpy.float64)
+        if item['raw_offset'] is not None:
+            column = column + item['raw_offset']
+        if item['scale'] is not None:
+            column = column * item['scale']
+        if item['divisor'] is not None:
+            column = column / item['divisor']
+        if item['offset'] is not None:
+            column = column + item['offset']
+
+    gate = get_gate_column(payloads, item)
+    if gate is not None:
+        column = numpy.ma.masked_array(column, mask=~gate)
+
+    return column
+
+def vectorized_decode(payloads, layout) -> tuple:
+    """Returns (columns, units) decoding payloads with layout."""
+    items = get_layout_items(layout)
+
+    columns = [get_item_column(payloads, item) for item in items]
+    units = [get_unit_string(item['unit']) if item['kind'] == 'value' else None for item in items]
+
+    return columns, units
+
+def payload_messages(command:obd.OBDCommand, payload) -> list:
+    """Build python-obd messages holding one response payload for command."""
+    mode = int(command.command[:2], 16)
+    pid = int(command.command[2:4], 16)
+    data = bytearray([0x40 + mode, pid]) + bytes(payload)
+
+    message = Message([Frame(data.hex().upper())])
+    message.data = data
+    message.ecu = ECU.ENGINE
+
+    return [message]
+
+def scalar_decode(command:obd.OBDCommand, payloads) -> list:
+    """
+    Decode payloads one row at a time with command's scalar decoder.
+    Rows the decoder can't handle decode to None.
+    """
+    values = []
+    errors = 0
+
+    for payload in payloads:
+        try:
+            values.append(command.decode(payload_messages(command, payload)))
+        except Exception as e:
+            logging.debug(f"{command.name}: scalar decoder {e.__class__.__name__}: {e}")
+            values.append(None)
+            errors += 1
+
+    if errors:
+        logging.warning(f"{command.name}: {errors} of {len(values)} payloads failed to decode")
+
+    return values
+
+def values_to_columns(values:list) -> list:
+    """
+    Transpose per row list values into per item columns when every row
+    holds a list of the same length, otherwise a single column of values.
+    """
+    lengths = {len(item) if isinstance(item, list) else None for item in values}
+
+    if len(lengths) == 1 and None not in lengths:
+        return [list(column) for column in zip(*values)]
+
+    return [values]
+
+def bulk_decode(command_name:str, payloads) -> dict:
+    """
+    Decode every payload for command_name.  payloads is a 2-D uint8 NumPy
+    array (rows of data bytes after the mode/PID bytes) or a list of bytes.
+
+    Returns dictionary:
+        'command_name': command_name
+        'vectorized': True when decoded with NumPy, False for scalar fallback
+        'columns': one column per decoder output item, NumPy arrays
+                   (vectorized) or lists of decoder values (scalar)
+        'units': unit string per column, None for columns without units
+                 and for scalar columns (values carry their own units)
+    """
+    command = get_obd_command(command_name)
+    if not command:
+        raise LookupError(f"unknown command name {command_name}")
+
+    width = get_payload_width(command)
+    layout = get_bulk_layout(command)
+
+    if numpy is not None and layout is not None and layout_fits(layout, width):
+        if not isinstance(payloads, numpy.ndarray):
+            payloads = get_payload_array(payloads, width)
+        elif payloads.shape[1] != width:
+            payloads = get_payload_array(payloads, width)
+
+        columns, units = vectorized_decode(payloads, layout)
+
+        return {
+            'command_name': command_name,
+            'vectorized': True,
+            'columns': columns,
+            'units': units,
+        }
+
+    columns = values_to_columns(scalar_decode(command, payloads))
+
+    return {
+        'command_name': command_name,
+        'vectorized': False,
+        'columns': columns,
+        'units': [None] * len(columns),
+    }
+
+def group_raw_record_payloads(records:list) -> dict:
+    """
+    Group obd_logger --raw_capture records by command name.  Returns
+    {command_name: (record indexes, payloads)} where payloads holds the
+    data bytes of the first message accepted by the command's ECU filter.
+    Records without response data are left out.
+    """
+    groups = {}
+
+    for index, record in enumerate(records):
+        raw_messages = record.get('raw_messages')
+        if not raw_messages or raw_messages == "no response":
+            continue
+
+        command = get_obd_command(record['command_name'])
+        if not command:
+            continue
+
+        messages = [
+            message for message in raw_record_to_messages(record)
+            if command.ecu & message.ecu
+        ]
+        if not messages or no_data(messages):
+            continue
+
+        indexes, payloads = groups.setdefault(command.name, ([], [], ))
+        indexes.append(index)
+        payloads.append(messages[0].data[2:])
+
+    return groups
+
+def bulk_decode_raw_records(records:list) -> dict:
+    """
+    Bulk decode obd_logger --raw_capture records.  Returns {command_name:
+    bulk_decode() result} with 'rows' holding the record index of every
+    decoded row.
+    """
+    results = {}
+
+    for command_name, (indexes, payloads) in group_raw_record_payloads(records).items():
+        result = bulk_decode(command_name, payloads)
+        result['rows'] = indexes
+        results[command_name] = result
+
+    return results
+
+def get_bulk_commands() -> list:
+    """NEW_COMMANDS and python-obd Mode 01 commands."""
+    return [
+        command for command in obd.commands[1] if command
+    ] + [
+        get_obd_command(command.name) for command in NEW_COMMANDS
+    ]
+
+def column_item(column, row:int):
+    """Python value of column row, None when masked."""
+    if numpy.ma.is_masked(column[row]):
+        return None
+
+    item = column[row]
+    return item.item() if isinstance(item, numpy.generic) else item
+
+def check_command(command:obd.OBDCommand, payloads) -> list:
+    """
+    Compare vectorized and scalar decoding of payloads for command.
+    Returns list of mismatch descriptions.
+    """
+    result = bulk_decode(command.name, payloads)
+    values = scalar_decode(command, payloads)
+    mismatches = []
+
+    for row, scalar_value in enumerate(values):
+        scalar_items = scalar_value if isinstance(scalar_value, list) else [scalar_value]
+
+        for column, unit, scalar_item in zip(result['columns'], result['units'], scalar_items):
+            item = column_item(column, row)
+
+            if 'Quantity' in scalar_item.__class__.__name__:
+                expected = (scalar_item.magnitude.__class__.__name__, scalar_item.magnitude, str(scalar_item.units), )
+            else:
+                expected = (scalar_item.__class__.__name__, scalar_item, None, )
+
+            actual = (item.__class__.__name__, item, None if item is None else unit, )
+            if expected != actual:
+                mismatches.append(f"{command.name}: row {row}: expected {expected}, got {actual}")
+
+    return mismatches
+
+def check_bulk_decoder() -> int:
+    """
+    Compare vectorized and scalar decoding on synthetic payloads for every
+    vectorized command.  Returns mismatch count.
+    """
+    mismatches = 0
+
+    for command in get_bulk_commands():
+        layout = get_bulk_layout(command)
+        width = get_payload_width(command)
+
+        if layout is None or not layout_fits(layout, width):
+            logging.info(f"{command.name}: scalar decoder")
+            continue
+
+        payloads = get_payload_array([
+            synthetic_payload(width, seed, printable)
+            for seed in CHECK_SEEDS
+            for printable in (True, False, )
+        ], width)
+
+        for mismatch in check_command(command, payloads):
+            logging.error(mismatch)
+            mismatches += 1
+
+        logging.info(f"{command.name}: vectorized, checked {len(payloads)} payloads")
+
+    return mismatches
+
+def argument_parsing()-> dict:
+    """Argument parsing"""
+    parser = ArgumentParser(description="Telemetry OBD Bulk Decoder")
+    parser.add_argument(
+        "--check",
+        help="Check vectorized decoding against the scalar decoders. Exit status is 1 on mismatch.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--verbose",
+        help="Turn verbose output on. Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--version",
+        help="Print version number and exit.",
+        default=False,
+        action='store_true'
+    )
+    return vars(parser.parse_args())
+
+def main():
+    """Run main function."""
+
+    args = argument_parsing()
+
+    if args['version']:
+        print(f"Version {__version__}", file=stdout)
+        exit(0)
+
+    logging_level = logging.WARNING
+
+    if args['verbose']:
+        logging_level = logging.INFO
+
+    logging.basicConfig(stream=sys.stderr, level=logging_level)
+
+    if args['check']:
+        if numpy is None:
+            print("NumPy isn't installed, every command uses the scalar decoders", file=stdout)
+            exit(1)
+
+        mismatches = check_bulk_decoder()
+        print(f"{mismatches} bulk decoder mismatches", file=stdout)
+        if mismatches:
+            exit(1)
+
+
+if __name__ == "__main__":
+    main()
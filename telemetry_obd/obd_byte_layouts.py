@@ -0,0 +1,697 @@
+# OBD Byte Layout Decoders
+# telemetry-obd/telemetry_obd/obd_byte_layouts.py
+"""
+Declarative byte layouts for add_commands.py decoders compiled into fast
+decoders.
+
+Most add_commands.py decoders read a support bitmask byte followed by fixed
+width scaled fields.  BYTE_LAYOUTS describes those decoders, keyed by
+decoder function name, as a list of output items in decoder return order.
+Byte offsets count from the first data byte after the mode/PID bytes
+(a = 0, b = 1, ...).
+
+    flag()  - masked bit value (a & (1 << bit)), the way decoders return
+              support and status bits
+    bits()  - (byte >> shift) & mask, optionally looked up in a table
+    value() - big endian unsigned field, ((raw * scale) / divisor) + offset,
+              raw_offset is added to raw first
+              with optional pint units
+
+Any item may be gated by support bits (and cleared bits, unless) and is
+None when the gate is closed.
+
+compile_byte_layout() turns a layout into Python source unpacking all the
+fields with one struct.Struct.unpack_from() call.  Compiled decoders
+reproduce the hand written decoders including their quirks (copy/paste
+field offsets, int vs float results).  Decoders that don't fit a layout
+stay hand written.
+
+Check compiled decoders against add_commands.py decoders after changing
+either of them:
+
+    python3.11 -m telemetry_obd.obd_byte_layouts --check
+"""
+from argparse import ArgumentParser
+from struct import Struct
+from sys import stdout
+import sys
+import logging
+import obd
+from .__init__ import __version__
+from . import add_commands
+from .add_commands import (
+    no_data,
+    BOOST_PRESSURE_CONTROL_STATUS,
+    VGT_CONTROL_STATUS,
+)
+
+logger = logging.getLogger(__name__)
+
+# synthetic sample seeds, each seed is a set of samples covering every support bit
+CHECK_SEEDS = range(2)
+
+STRUCT_FORMATS = {
+    1: "B",
+    2: "H",
+    4: "I",
+}
+
+def flag(bit:int, byte:int=0, support=None, support_byte:int=0) -> dict:
+    """Layout item: byte & (1 << bit)."""
+    return {
+        'kind': 'flag',
+        'byte': byte,
+        'width': 1,
+        'bit': bit,
+        'support': support,
+        'support_byte': support_byte,
+        'unless': None,
+    }
+
+def bits(byte:int, shift:int=0, mask:int=None, table:dict=None, support=None, support_byte:int=0) -> dict:
+    """Layout item: (byte >> shift) & mask, looked up in table when given."""
+    return {
+        'kind': 'bits',
+        'byte': byte,
+        'width': 1,
+        'shift': shift,
+        'mask': mask,
+        'table': table,
+        'support': support,
+        'support_byte': support_byte,
+        'unless': None,
+    }
+
+def value(
+    byte:int,
+    width:int=1,
+    unit:str=None,
+    scale=None,
+    divisor=None,
+    offset=None,
+    float_raw:bool=False,
+    raw_offset=None,
+    support=None,
+    support_byte:int=0,
+    unless=None
+) -> dict:
+    """
+    Layout item: big endian unsigned field of width bytes converted
+    to (((raw + raw_offset) * scale) / divisor) + offset in pint units unit.
+    float_raw converts raw to float first.
+    """
+    return {
+        'kind': 'value',
+        'byte': byte,
+        'width': width,
+        'unit': unit,
+        'scale': scale,
+        'divisor': divisor,
+        'offset': offset,
+        'float_raw': float_raw,
+        'raw_offset': raw_offset,
+        'support': support,
+        'support_byte': support_byte,
+        'unless': unless,
+    }
+
+def flags(count:int, byte:int=0) -> list:
+    """Layout items: first count bits of byte."""
+    return [flag(bit, byte) for bit in range(count)]
+
+BYTE_LAYOUTS = {
+    'torque_percent': value(0, unit="percent", offset=-125),
+    'reference_torque': value(0, 2, unit="newton * meter", float_raw=True),
+    'mass_air_flow_sensor': [
+        value(1, 2, unit="gram / second", divisor=32.0, support=0),
+        value(3, 2, unit="gram / second", divisor=32.0, support=1),
+    ],
+    'engine_temperature': [
+        value(1, unit="celsius", offset=-40, support=0),
+        value(2, unit="celsius", offset=-40, support=1),
+    ],
+    'fuel_rate_2': [
+        value(0, 2, unit="gram / second", divisor=50.0),
+        value(2, 2, unit="gram / second", divisor=50.0),
+    ],
+    'exhaust_flow_rate': value(0, 2, unit="kilogram / second", float_raw=True, divisor=5),
+    'engine_percent_torque_data': [
+        value(byte, unit="percent", offset=-125) for byte in range(5)
+    ],
+    # first item is pto_output_status, not its support bit
+    'auxiliary_in_out_status': [flag(0, 1)] + flags(5)[1:] + flags(4, 1) + [bits(1, shift=4)],
+    'commanded_diesel_air_intake': flags(4) + [
+        value(byte, unit="percent", float_raw=True, scale=100.0, divisor=255.0) for byte in range(1, 5)
+    ],
+    'egr_temp': flags(8) + [
+        value(byte, unit="celsius", offset=-40, support=byte - 1) for byte in range(1, 5)
+    ] + [
+        value(byte, unit="celsius", scale=4, offset=-40, support=byte + 3) for byte in range(1, 5)
+    ],
+    'throttle': flags(4) + [
+        value(byte, unit="percent", scale=100.0/255.0, support=byte - 1) for byte in range(1, 5)
+    ],
+    'fuel_pressure_control': flags(6) + [
+        value(1, 2, unit="kPa", scale=10.0, support=0),
+        value(3, 2, unit="kPa", scale=10.0, support=1),
+        value(5, unit="celsius", offset=-40.0, support=2),
+        value(6, 2, unit="kPa", scale=10.0, support=3),
+        value(8, 2, unit="kPa", scale=10.0, support=4),
+        value(10, unit="celsius", offset=-40.0, support=5),
+    ],
+    # every pressure comes from bytes g and h
+    'injection_pressure_control': flags(4) + [
+        value(6, 2, unit="kPa", scale=10.0, support=bit) for bit in range(4)
+    ],
+    # (j & 12 >> 2) is j & 3, both statuses come from the same bits
+    'boost_pressure': flags(6) + [
+        value(1, 2, unit="kPa", scale=0.03125, support=0),
+        value(3, 2, unit="kPa", scale=0.03125, support=1),
+        value(5, 2, unit="kPa", scale=0.03125, support=3),
+        value(7, 2, unit="kPa", scale=0.03125, support=4),
+        bits(9, mask=3, table=BOOST_PRESSURE_CONTROL_STATUS, support=2),
+        bits(9, mask=3, table=BOOST_PRESSURE_CONTROL_STATUS, support=5),
+    ],
+    'vg_turbo_control': flags(6) + [
+        value(1, unit="percent", scale=100.0, divisor=255.0, support=0),
+        value(2, unit="percent", scale=100.0, divisor=255.0, support=1),
+        value(3, unit="percent", scale=100.0, divisor=255.0, support=3),
+        value(4, unit="percent", scale=100.0, divisor=255.0, support=4),
+        bits(5, mask=3, table=VGT_CONTROL_STATUS, support=2),
+        bits(5, shift=2, mask=3, table=VGT_CONTROL_STATUS, support=5),
+    ],
+    'wastegate_control': flags(4) + [
+        value(byte, unit="percent", scale=100.0, divisor=255.0, support=byte - 1) for byte in range(1, 5)
+    ],
+    # both banks come from bytes b and c
+    'exhaust_pressure': flags(2) + [
+        value(1, 2, unit="kPa", scale=0.01, support=0),
+        value(1, 2, unit="kPa", scale=0.01, support=1),
+    ],
+    'turbo_rpm': flags(2) + [
+        value(1, 2, unit="revolutions_per_minute", scale=10, support=0),
+        value(3, 2, unit="revolutions_per_minute", scale=10, support=1),
+    ],
+    'turbo_temp': flags(4) + [
+        value(1, unit="celsius", offset=-40, support=0),
+        value(2, unit="celsius", offset=-40, support=1),
+        value(3, 2, unit="celsius", scale=0.1, offset=-40, support=2),
+        value(5, 2, unit="celsius", scale=0.1, offset=-40, support=3),
+    ],
+    'cact': flags(4) + [
+        value(byte, unit="celsius", offset=-40, support=byte - 1) for byte in range(1, 5)
+    ],
+    'egt_bank_temp': flags(4) + [
+        value(1 + (2 * bit), 2, unit="celsius", scale=0.1, offset=-40.0, support=bit) for bit in range(4)
+    ],
+    'dpf_temp': flags(4) + [
+        value(1 + (2 * bit), 2, unit="celsius", scale=0.1, support=bit) for bit in range(4)
+    ],
+    'nte_status': flags(4),
+    'engine_run_time_aecd': flags(5) + [
+        value(1 + (4 * timer), 4, unit="second", support=timer // 2) for timer in range(10)
+    ],
+    'nox_sensor': flags(4) + [
+        flag(bit + 4, support=bit) for bit in range(4)
+    ] + [
+        value(1 + (2 * bit), 2, unit="ppm", support=(bit, bit + 4, )) for bit in range(4)
+    ],
+    'nox_control_system': flags(4) + [
+        value(1, 2, unit="lph", scale=0.05, support=0),
+        value(3, 2, unit="lph", scale=0.05, support=1),
+        value(5, unit="percent", scale=100.0, divisor=255.0, support=2),
+        value(6, 4, unit="second", support=3),
+    ],
+    'particulate_matter_support': flags(2) + [
+        value(1, 2, unit="mg/meter**3", scale=0.0125, support=0),
+        value(3, 2, unit="mg/meter**3", scale=0.0125, support=1),
+    ],
+    'intake_manifold_pressure': flags(2) + [
+        value(1, 2, unit="kPa", scale=0.03125, support=0),
+        value(3, 2, unit="kPa", scale=0.03125, support=1),
+    ],
+    'scr_inducement_system': flags(4) + [flag(7)] + flags(8, 1) + flags(8, 2) + [
+        value(byte, 2, unit="kilometer") for byte in range(3, 13, 2)
+    ],
+    'aftertreatment_status': flags(7) + [
+        flag(bit, 1, support=bit) for bit in range(4)
+    ] + [
+        value(2, unit="percent", scale=100.0, divisor=255.0, support=4),
+        value(3, 2, unit="minute", support=5),
+        value(5, 2, unit="kilometer", support=6),
+    ],
+    'o2_sensor_wide': flags(8) + [
+        value(1 + (2 * bit), 2, unit="percent", scale=0.001526, support=bit) for bit in range(4)
+    ] + [
+        value(9 + (2 * bit), 2, unit="ratio", scale=0.000122, support=bit + 4) for bit in range(4)
+    ],
+    'pm_sensor_output': flags(4) + flags(2, 1) + flags(2, 4) + [
+        value(2, 2, unit="percent", scale=0.01, support=0, support_byte=1),
+        value(5, 2, unit="percent", scale=0.01, support=0, support_byte=4),
+    ],
+    'wwh_obd_system_info': [
+        bits(0, mask=3),
+        bits(0, shift=2, mask=15),
+        flag(6),
+        value(1, 2, unit="hour"),
+    ],
+    'wwh_obd_ecu_info': [
+        bits(0, mask=15),
+        value(1, 2, unit="hour"),
+        value(3, 2, unit="hour"),
+    ],
+    # control 2 support items repeat the control 1 support bits
+    'fuel_system_status': flags(4) + flags(4) + flags(8, 1),
+    'wwh_obd_vehicle_counters': [
+        flag(0),
+        value(1, 2, unit="hour", support=0),
+    ],
+    'nox_control_info': flags(6) + [
+        flag(0, 1),
+        bits(1, shift=1, mask=3),
+        bits(1, shift=3, mask=3),
+        bits(1, shift=5, mask=3),
+    ] + [
+        value(byte, 2, unit="hour") for byte in range(2, 12, 2)
+    ],
+    'scr_catalyst_storage': flags(4) + [
+        value(1 + (2 * bit), 2, unit="gram/liter", scale=0.0001, support=bit) for bit in range(4)
+    ],
+    'hydrocarbon_doser': flags(3) + [
+        value(1, 2, unit="gram/minute", scale=0.05, support=0),
+        value(3, unit="percent", scale=255.0, divisor=100.0, support=1),
+        value(4, 2, unit="kPa", scale=0.1, support=2),
+    ],
+    # every sensor uses support bit 0
+    'exhaust_gas_temp_bank': [flag(0)] * 4 + [
+        value(byte, 2, unit="celsius", scale=0.1, offset=-40, support=0) for byte in range(1, 9, 2)
+    ],
+    'def_sensor': flags(4) + [
+        bits(0, shift=4, mask=15, support=0),
+        value(1, unit="percent", scale=0.25, support=1),
+        value(2, unit="celsius", offset=-40, support=2),
+        value(3, unit="percent", scale=100.0/255.0, support=3),
+    ],
+    'o2_sensor_wide_range': flags(8) + [
+        value(1 + (2 * bit), 2, unit="percent", scale=0.001526, support=bit) for bit in range(4)
+    ] + [
+        value(9 + (2 * bit), 2, scale=0.000122, support=bit + 4) for bit in range(4)
+    ],
+    'fuel_system': flags(8) + [
+        value(byte, unit="percent", scale=100.0/256.0, support=byte - 1) for byte in range(1, 9)
+    ],
+    'nox_sensor_corrected': flags(8) + [
+        value(1 + (2 * bit), 2, unit="ppm", support=bit, unless=bit + 4) for bit in range(4)
+    ],
+    'evap_sys_vapor_pressure': flags(4) + [
+        value(1 + (2 * bit), 2, unit="Pa", scale=0.25, support=bit) for bit in range(4)
+    ],
+    'def_dosing': flags(2) + [
+        value(1, unit="percent", scale=0.5, support=0),
+        value(2, 2, unit="liter", scale=0.0005, support=1),
+    ],
+    'motorcycle_io_status': [
+        flag(0),
+        flag(0, 1, support=0),
+    ],
+    'speed_limiter': value(0, unit="kilometer/hour", float_raw=True),
+    'alternative_fuel': flags(5) + [
+        value(1, 2, unit="kPa", scale=0.03125, support=0),
+        value(3, unit="celsius", offset=-40, support=1),
+        value(4, 2, unit="kPa", scale=0.125, support=2),
+        value(6, 2, unit="kPa", support=3),
+        value(8, unit="celsius", scale=2, offset=-256, support=4),
+    ],
+    'max_def_rate': flags(2) + [
+        value(1, support=0),
+        value(2, 2, unit="gram/hour", scale=0.3, support=1),
+    ],
+    'crankcase_ventilation': flags(2) + [
+        value(1, 2, unit="Pa", scale=0.25, support=0),
+        value(3, 2, unit="rpm", support=1),
+    ],
+    'evap_purge_pressure': flags(2) + [
+        value(1, 2, unit="Pa", scale=0.25, support=0),
+        value(3, 2, unit="Pa", scale=2, support=1),
+    ],
+    # both flow rates use support bit 0
+    'egr_air_flow': [flag(0)] * 2 + [
+        value(1, 2, unit="kg/hour", scale=0.05, support=0),
+        value(3, 2, unit="kg/hour", scale=0.05, support=0),
+    ],
+}
+
+def get_layout_items(layout) -> list:
+    """Returns layout items as a list, single item layouts included."""
+    return layout if isinstance(layout, list) else [layout]
+
+def field_name(byte:int, width:int) -> str:
+    """Generated source variable name for an unpacked field."""
+    return f"f_{byte}_{width}"
+
+def get_layout_fields(layout) -> list:
+    """Returns sorted (byte, width) fields read by layout, support bytes included."""
+    fields = set()
+
+    for item in get_layout_items(layout):
+        fields.add((item['byte'], item['width'], ))
+        if item['support'] is not None or item['unless'] is not None:
+            fields.add((item['support_byte'], 1, ))
+
+    return sorted(fields)
+
+def get_struct_format(fields:list) -> str:
+    """
+    Returns big endian struct format string unpacking fields in one call
+    or None when fields overlap.
+    """
+    struct_format = ">"
+    position = 0
+
+    for byte, width in fields:
+        if byte < position:
+            return None
+        struct_format += "x" * (byte - position) + STRUCT_FORMATS[width]
+        position = byte + width
+
+    return struct_format
+
+def as_bits(bits_value) -> tuple:
+    """Support/unless bit or bits as a tuple."""
+    if bits_value is None:
+        return ()
+
+    if isinstance(bits_value, int):
+        return (bits_value, )
+
+    return tuple(bits_value)
+
+def gate_expression(item:dict) -> str:
+    """Returns source for item's support gate or None when ungated."""
+    support_field = field_name(item['support_byte'], 1)
+
+    conditions = [
+        f"{support_field} & {1 << bit}" for bit in as_bits(item['support'])
+    ] + [
+        f"not {support_field} & {1 << bit}" for bit in as_bits(item['unless'])
+    ]
+
+    if not conditions:
+        return None
+
+    return " and ".join(conditions)
+
+def item_expression(item:dict, index:int, namespace:dict, quantities:bool) -> str:
+    """
+    Returns source computing a layout item.  Units and lookup tables are
+    added to namespace as U<index>/T<index>.
+    """
+    field = field_name(item['byte'], item['width'])
+
+    if item['kind'] == 'flag':
+        expression = f"({field} & {1 << item['bit']})"
+
+    elif item['kind'] == 'bits':
+        expression = field
+        if item['shift']:
+            expression = f"({expression} >> {item['shift']})"
+        if item['mask'] is not None:
+            expression = f"({expression} & {item['mask']})"
+        if item['table'] is not None:
+            namespace[f"T{index}"] = item['table']
+            expression = f"T{index}[{expression}]"
+
+    else:
+        expression = field
+        if item['float_raw']:
+            expression = f"float({expression})"
+        if item['raw_offset'] is not None:
+            expression = f"({expression} + {item['raw_offset']!r})"
+        if item['scale'] is not None:
+            expression = f"({expression} * {item['scale']!r})"
+        if item['divisor'] is not None:
+            expression = f"({expression} / {item['divisor']!r})"
+        if item['offset'] is not None:
+            expression = f"({expression} + {item['offset']!r})"
+        if quantities and item['unit'] is not None:
+            namespace[f"U{index}"] = item['unit']
+            expression = f"Quantity({expression}, U{index})"
+
+    gate = gate_expression(item)
+    if gate:
+        expression = f"({expression} if {gate} else None)"
+
+    return expression
+
+def bind_quantity(namespace:dict):
+    """
+    Returns Quantity() stand-in for a compiled decoder namespace.  The first
+    call creates the pint UnitRegistry, replaces U<index> unit strings with
+    pint units and rebinds Quantity to the registry's Quantity class.
+    """
+    def first_quantity(magnitude, units):
+        unit_registry = add_commands.get_unit_registry()
+        for name, item in namespace.items():
+            if name.startswith("U") and isinstance(item, str):
+                namespace[name] = unit_registry.parse_units(item)
+        namespace['Quantity'] = unit_registry.Quantity
+        return unit_registry.Quantity(magnitude, units)
+
+    return first_quantity
+
+def get_byte_layout_source(name:str, layout, namespace:dict, quantities:bool=True) -> str:
+    """Returns Python source for decoder function name decoding layout."""
+    fields = get_layout_fields(layout)
+    struct_format = get_struct_format(fields)
+
+    lines = [
+        f"def {name}(messages):",
+        "    if no_data(messages):",
+        "        return None",
+        "    data = messages[0].data",
+    ]
+
+    if struct_format:
+        namespace['unpack_from'] = Struct(struct_format).unpack_from
+        names = ", ".join(field_name(byte, width) for byte, width in fields)
+        lines.append(f"    {names}, = unpack_from(data, 2)")
+    else:
+        for byte, width in fields:
+            unpack_name = f"unpack_{byte}_{width}"
+            namespace[unpack_name] = Struct(">" + STRUCT_FORMATS[width]).unpack_from
+            lines.append(f"    {field_name(byte, width)}, = {unpack_name}(data, {byte + 2})")
+
+    expressions = [
+        item_expression(item, index, namespace, quantities)
+        for index, item in enumerate(get_layout_items(layout))
+    ]
+
+    if isinstance(layout, list):
+        lines.append("    return [")
+        lines += [f"        {expression}," for expression in expressions]
+        lines.append("    ]")
+    else:
+        lines.append(f"    return {expressions[0]}")
+
+    return "\n".join(lines) + "\n"
+
+def compile_byte_layout(name:str, layout, quantities:bool=True):
+    """
+    Compile layout into decoder function name.  quantities False
+    returns plain numbers (units lite decoding).
+    """
+    namespace = {
+        '__name__': __name__,
+        'no_data': no_data,
+    }
+    if quantities:
+        namespace['Quantity'] = bind_quantity(namespace)
+
+    source = get_byte_layout_source(name, layout, namespace, quantities)
+    exec(compile(source, f"<byte layout {name}>", "exec"), namespace)
+
+    return namespace[name]
+
+compiled_decoders = {}
+
+def get_compiled_decoder(name:str, quantities:bool=True):
+    """Returns compiled decoder for BYTE_LAYOUTS entry name or None."""
+    if name not in BYTE_LAYOUTS:
+        return None
+
+    if (name, quantities, ) not in compiled_decoders:
+        compiled_decoders[(name, quantities, )] = compile_byte_layout(name, BYTE_LAYOUTS[name], quantities)
+
+    return compiled_decoders[(name, quantities, )]
+
+def get_compiled_command(command:obd.OBDCommand) -> obd.OBDCommand:
+    """
+    Returns a copy of command using the compiled decoder for its
+    add_commands.py decoder.  Commands without a byte layout are
+    returned unchanged.
+    """
+    decoder = get_compiled_decoder(getattr(command.decode, '__name__', None))
+
+    if not decoder:
+        return command
+
+    return obd.OBDCommand(
+        command.name,
+        command.desc,
+        command.command,
+        command.bytes,
+        decoder,
+        command.ecu,
+        command.fast,
+        command.header
+    )
+
+def value_signature(value):
+    """
+    Comparable form of decoder output: magnitude type, magnitude and
+    units of Quantity values, type and value of everything else.
+    """
+    if isinstance(value, list):
+        return [value_signature(item) for item in value]
+
+    if 'Quantity' in value.__class__.__name__:
+        return (
+            value.magnitude.__class__.__name__,
+            value.magnitude,
+            str(value.units),
+        )
+
+    return (value.__class__.__name__, value, )
+
+def plain_signature(value):
+    """value_signature() with Quantity values reduced to their magnitudes."""
+    if isinstance(value, list):
+        return [plain_signature(item) for item in value]
+
+    if 'Quantity' in value.__class__.__name__:
+        value = value.magnitude
+
+    return (value.__class__.__name__, value, )
+
+def decode_signature(decoder, messages:list, signature):
+    """Returns (signature, None) of decoder output or (None, exception name)."""
+    try:
+        return signature(decoder(messages)), None
+    except Exception as e:
+        return None, e.__class__.__name__
+
+def check_command(command:obd.OBDCommand, sample_messages:list) -> list:
+    """
+    Compare compiled decoders to command's add_commands.py decoder on
+    sample messages.  Returns list of mismatch descriptions.
+    """
+    name = command.decode.__name__
+    mismatches = []
+
+    for quantities, signature in ((True, value_signature, ), (False, plain_signature, ), ):
+        compiled_decoder = get_compiled_decoder(name, quantities)
+
+        for index, messages in enumerate(sample_messages):
+            expected = decode_signature(command.decode, messages, signature)
+            actual = decode_signature(compiled_decoder, messages, signature)
+
+            if expected != actual:
+                mismatches.append(
+                    f"{command.name}: {name}: sample {index} quantities {quantities}: expected {expected}, got {actual}"
+                )
+
+    return mismatches
+
+def check_byte_layouts() -> int:
+    """
+    Compare compiled decoders to add_commands.py decoders for every
+    NEW_COMMANDS command with a byte layout.  Returns mismatch count.
+    """
+    # imported here, obd_common_functions imports this module
+    from .obd_synthetic_responses import build_coverage_messages
+
+    mismatches = 0
+    checked_layouts = set()
+
+    for command in add_commands.NEW_COMMANDS:
+        name = getattr(command.decode, '__name__', None)
+        if name not in BYTE_LAYOUTS:
+            continue
+
+        checked_layouts.add(name)
+
+        sample_messages = [
+            messages
+            for seed in CHECK_SEEDS
+            for messages in build_coverage_messages(command, seed)
+        ]
+
+        for mismatch in check_command(command, sample_messages):
+            logging.error(mismatch)
+            mismatches += 1
+
+        logging.info(f"{command.name}: {name}: checked {len(sample_messages)} samples")
+
+    for name in sorted(set(BYTE_LAYOUTS) - checked_layouts):
+        logging.warning(f"{name}: byte layout isn't used by NEW_COMMANDS")
+
+    return mismatches
+
+def argument_parsing()-> dict:
+    """Argument parsing"""
+    parser = ArgumentParser(description="Telemetry OBD Byte Layout Decoders")
+    parser.add_argument(
+        "--check",
+        help="Check compiled byte layout decoders against add_commands.py decoders. Exit status is 1 on mismatch.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--source",
+        help="Print generated decoder source code.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--verbose",
+        help="Turn verbose output on. Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--version",
+        help="Print version number and exit.",
+        default=False,
+        action='store_true'
+    )
+    return vars(parser.parse_args())
+
+def main():
+    """Run main function."""
+
+    args = argument_parsing()
+
+    if args['version']:
+        print(f"Version {__version__}", file=stdout)
+        exit(0)
+
+    logging_level = logging.WARNING
+
+    if args['verbose']:
+        logging_level = logging.INFO
+
+    logging.basicConfig(stream=sys.stderr, level=logging_level)
+
+    if args['source']:
+        for name, layout in BYTE_LAYOUTS.items():
+            print(get_byte_layout_source(name, layout, {}), file=stdout)
+
+    if args['check']:
+        mismatches = check_byte_layouts()
+        print(f"{mismatches} byte layout decoder mismatches", file=stdout)
+        if mismatches:
+            exit(1)
+
+
+if __name__ == "__main__":
+    main()
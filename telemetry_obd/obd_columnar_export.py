@@ -0,0 +1,302 @@
+# OBD Columnar Export
+# telemetry-obd/telemetry_obd/obd_columnar_export.py
+"""
+Exports obd_logger output files to per command columnar NumPy arrays.
+
+Each command gets a directory holding one .npy file per column:
+
+    <output_dir>/<command_name>/timestamp.npy    iso_ts_pre as datetime64[us] (UTC)
+    <output_dir>/<command_name>/value.npy        single value responses
+    <output_dir>/<command_name>/value_<n>.npy    multi-value responses, one per item
+    <output_dir>/<command_name>/columns.json     row count, column dtypes and units
+
+Value columns are float64 with NaN where a response item isn't a number.
+Pint strings ("25 degC") are split into a number and a unit, --structured_values
+magnitudes get their units from UNIT records and True/False become 1.0/0.0.
+Responses without any number ("no response", VIN, ...) aren't exported.
+
+Records are streamed and column data is appended to the .npy files in
+blocks of FLUSH_ROWS rows so memory use doesn't grow with input size.
+The .npy files can be memory mapped: numpy.load(path, mmap_mode='r').
+
+    python3.11 -m telemetry_obd.obd_columnar_export data/FT8W4DT5HED00000 --output_dir columnar
+"""
+from argparse import ArgumentParser
+from datetime import datetime
+from pathlib import Path
+from sys import stdout
+from time import perf_counter
+import sys
+import json
+import logging
+import struct
+from .__init__ import __version__
+from .obd_common_functions import UNIT_COMMAND_NAME
+from .obd_log_reader import get_value_items, read_log_records
+
+try:
+    import numpy
+except ImportError as e:
+    raise ImportError(
+        "obd_columnar_export requires NumPy, install it with " +
+        "'python3.11 -m pip install --user numpy' or the telemetry-obd[columnar] extra"
+    ) from e
+
+logger = logging.getLogger(__name__)
+
+FLUSH_ROWS = 4096
+TIMESTAMP_COLUMN = "timestamp"
+COLUMNS_FILE_NAME = "columns.json"
+
+# fixed .npy header size so the header can be rewritten with the final
+# row count without moving the data
+NPY_HEADER_SIZE = 128
+
+TIMESTAMP_DTYPE = numpy.dtype('datetime64[us]')
+VALUE_DTYPE = numpy.dtype('float64')
+
+def get_npy_header(dtype:numpy.dtype, row_count:int) -> bytes:
+    """NPY_HEADER_SIZE byte .npy format version 1.0 header for a 1-D array."""
+    header = repr({
+        'descr': numpy.lib.format.dtype_to_descr(dtype),
+        'fortran_order': False,
+        'shape': (row_count, ),
+    })
+    # magic (6) + version (2) + header length (2) + header ending in newline
+    header = header.ljust(NPY_HEADER_SIZE - 11) + "\n"
+
+    return numpy.lib.format.MAGIC_PREFIX + bytes([1, 0]) + struct.pack("<H", len(header)) + header.encode('latin1')
+
+class ColumnWriter():
+    """
+    Appends values to a 1-D .npy file in blocks.  The header is rewritten
+    with the final row count by close().
+    """
+
+    def __init__(self, path:Path, dtype:numpy.dtype, backfill_rows:int=0, fill_value=numpy.nan):
+        """Init function.  backfill_rows rows of fill_value are written first."""
+        self.path = path
+        self.dtype = dtype
+        self.row_count = 0
+        self.buffer = []
+
+        with open(self.path, mode='xb') as npy_file:
+            npy_file.write(get_npy_header(self.dtype, 0))
+
+        for start in range(0, backfill_rows, FLUSH_ROWS):
+            self.buffer = [fill_value] * min(FLUSH_ROWS, backfill_rows - start)
+            self.flush()
+
+    def append(self, value):
+        """Append one value."""
+        self.buffer.append(value)
+        if len(self.buffer) >= FLUSH_ROWS:
+            self.flush()
+
+    def flush(self):
+        """Write buffered values to the end of the file."""
+        if not self.buffer:
+            return
+
+        with open(self.path, mode='ab') as npy_file:
+            npy_file.write(numpy.array(self.buffer, dtype=self.dtype).tobytes())
+
+        self.row_count += len(self.buffer)
+        self.buffer = []
+
+    def close(self):
+        """Flush and write the final row count into the header."""
+        self.flush()
+
+        with open(self.path, mode='r+b') as npy_file:
+            npy_file.write(get_npy_header(self.dtype, self.row_count))
+
+class CommandExporter():
+    """Writes one command's columns to a directory."""
+
+    def __init__(self, command_dir:Path, command_name:str):
+        """Init function."""
+        self.command_dir = command_dir
+        self.command_name = command_name
+        self.command_dir.mkdir(parents=True)
+        self.row_count = 0
+        self.timestamps = ColumnWriter(self.command_dir / f"{TIMESTAMP_COLUMN}.npy", TIMESTAMP_DTYPE)
+        self.columns = {}
+        self.units = {}
+
+    def add_row(self, timestamp:int, items:list):
+        """Add a row: timestamp (microseconds since epoch) and get_value_items() items."""
+        self.timestamps.append(timestamp)
+        numbers = {}
+
+        for column, number, unit in items:
+            if number is None:
+                continue
+
+            numbers[column] = number
+
+            if column not in self.columns:
+                # values from earlier rows are missing
+                self.columns[column] = ColumnWriter(
+                    self.command_dir / f"{column}.npy", VALUE_DTYPE, backfill_rows=self.row_count
+                )
+                self.units[column] = unit
+            elif unit != self.units[column]:
+                logging.warning(f"{self.command_name}: {column}: unit changed from {self.units[column]} to {unit}")
+                self.units[column] = unit
+
+        for column, column_writer in self.columns.items():
+            column_writer.append(numbers.get(column, numpy.nan))
+
+        self.row_count += 1
+
+    def close(self):
+        """Finish column files and write the column description."""
+        self.timestamps.close()
+        for column_writer in self.columns.values():
+            column_writer.close()
+
+        columns = {TIMESTAMP_COLUMN: {'dtype': str(TIMESTAMP_DTYPE), 'unit': None, }, }
+        for column in sorted(self.columns, key=lambda column: (len(column), column, )):
+            columns[column] = {'dtype': str(VALUE_DTYPE), 'unit': self.units[column], }
+
+        with open(self.command_dir / COLUMNS_FILE_NAME, mode='x', encoding='utf-8') as columns_file:
+            columns_file.write(json.dumps({
+                'command_name': self.command_name,
+                'rows': self.row_count,
+                'columns': columns,
+            }, indent=4) + "\n")
+
+def get_timestamp(iso_ts:str) -> int:
+    """iso_ts as microseconds since epoch."""
+    ts = datetime.fromisoformat(iso_ts)
+    return (int(ts.timestamp()) * 1000000) + ts.microsecond
+
+def export_columnar(paths:list, output_dir:Path, command_names:list=None) -> dict:
+    """
+    Export obd_logger output files and directories of output files to
+    per command columns in output_dir.  Returns {command_name: row count}.
+    """
+    output_dir = Path(output_dir)
+    if output_dir.exists() and any(output_dir.iterdir()):
+        raise FileExistsError(f"output directory {output_dir} isn't empty")
+
+    exporters = {}
+    unit_strings = {}
+    current_file_path = None
+
+    try:
+        for path in paths:
+            for log_record in read_log_records(path, command_names + [UNIT_COMMAND_NAME, ] if command_names else None):
+                if log_record.file_path != current_file_path:
+                    # --structured_values unit ids are per output file
+                    current_file_path = log_record.file_path
+                    unit_strings = {}
+
+                command_name = log_record.command_name
+                value = log_record.obd_response_value
+
+                if command_name == UNIT_COMMAND_NAME:
+                    unit_id, unit_string = value
+                    unit_strings[unit_id] = unit_string
+                    continue
+
+                if not log_record.iso_ts_pre:
+                    continue
+
+                items = get_value_items(value, log_record.obd_response_unit, unit_strings)
+                if all(number is None for _, number, _ in items):
+                    continue
+
+                if command_name not in exporters:
+                    exporters[command_name] = CommandExporter(output_dir / command_name, command_name)
+
+                exporters[command_name].add_row(get_timestamp(log_record.iso_ts_pre), items)
+
+    finally:
+        for exporter in exporters.values():
+            exporter.close()
+
+    return {command_name: exporter.row_count for command_name, exporter in exporters.items()}
+
+def load_columns(command_dir, mmap_mode:str='r') -> dict:
+    """Load an exported command's columns as {column name: memory mapped array}."""
+    command_dir = Path(command_dir)
+
+    with open(command_dir / COLUMNS_FILE_NAME, mode='r', encoding='utf-8') as columns_file:
+        description = json.load(columns_file)
+
+    return {
+        column: numpy.load(command_dir / f"{column}.npy", mmap_mode=mmap_mode)
+        for column in description['columns']
+    }
+
+def argument_parsing()-> dict:
+    """Argument parsing"""
+    parser = ArgumentParser(description="Telemetry OBD Columnar Export")
+    parser.add_argument(
+        "files",
+        nargs='+',
+        metavar="files",
+        help="obd_logger output files or directories of output files to export."
+    )
+    parser.add_argument(
+        "--output_dir",
+        help="Output directory, one subdirectory per command. Must be empty or not exist.",
+        required=True
+    )
+    parser.add_argument(
+        "--command_names",
+        help="Comma separated command names to export. Default is every command.",
+        default=None
+    )
+    parser.add_argument(
+        "--verbose",
+        help="Turn verbose output on. Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--version",
+        help="Print version number and exit.",
+        default=False,
+        action='store_true'
+    )
+    return vars(parser.parse_args())
+
+def main():
+    """Run main function."""
+
+    args = argument_parsing()
+
+    if args['version']:
+        print(f"Version {__version__}", file=stdout)
+        exit(0)
+
+    logging_level = logging.WARNING
+
+    if args['verbose']:
+        logging_level = logging.INFO
+
+    logging.basicConfig(stream=sys.stdout, level=logging_level)
+
+    command_names = None
+    if args['command_names']:
+        command_names = [command_name for command_name in args['command_names'].split(',') if command_name]
+
+    start_time = perf_counter()
+    try:
+        row_counts = export_columnar(args['files'], args['output_dir'], command_names)
+    except FileExistsError as e:
+        logging.error(f"FileExistsError: {e}")
+        exit(1)
+    elapsed_time = perf_counter() - start_time
+
+    for command_name, row_count in sorted(row_counts.items()):
+        logging.info(f"{command_name}: {row_count} rows")
+
+    logging.info(f"exported {sum(row_counts.values())} rows in {elapsed_time:.3f} seconds")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,36 @@
 """telemetry_obd/obd_common_functions.py: Common OBD functions."""
 
-from time import sleep
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from threading import Event
+from time import sleep, monotonic
 from typing import List
 from datetime import datetime, timezone
+import re
 import logging
 import configparser
 import obd
+import serial
 from pint import UnitRegistry
 from obd.utils import BitArray
 from obd.codes import BASE_TESTS
 from obd.OBDResponse import Status
+from obd.protocols import ECU
 from .add_commands import NEW_COMMANDS, ureg
+from .obd_byte_layouts import get_compiled_command
 
 logger = logging.getLogger(__name__)
 
 CONNECTION_WAIT_DELAY = 15.0
 CONNECTION_RETRY_COUNT = 5
+PROBE_DEADLINE = 10.0               # seconds
+PROBE_BAUDRATES = [38400, 9600, ]
+PROBE_READ_TIMEOUT = 0.1            # seconds
+# reads before giving up on a baud rate, chatty non ELM 327 devices never go quiet
+PROBE_BAUDRATE_READS = 10
 
+# NEW_COMMANDS with compiled byte layout decoders where available
 local_commands = {
-    new_command.name: new_command for new_command in NEW_COMMANDS
+    new_command.name: get_compiled_command(new_command) for new_command in NEW_COMMANDS
 }
 
 OBD_ERROR_MESSAGES = {
@@ -41,6 +53,15 @@ OBD_ERROR_MESSAGES = {
     "UNABLE TO CONNECT": "OBD adapter unable to detect supported vehicle OBD protocol.",
 }
 
+# Single regular expression matching any OBD_ERROR_MESSAGES key.  Longest keys
+# come first so that ">DATA ERROR" is matched instead of "DATA ERROR".
+OBD_ERROR_MESSAGE_PATTERN = re.compile(
+    "|".join(
+        re.escape(obd_error_message)
+        for obd_error_message in sorted(OBD_ERROR_MESSAGES, key=len, reverse=True)
+    )
+)
+
 class CommandNameGenerator():
     """Iterator for providing a never ending list of OBD commands."""
 
@@ -125,7 +146,7 @@ def get_elm_info(connection):
 def load_custom_commands(connection):
     """Load custom commands into a dictionary."""
     custom_commands = {}
-    for new_command in NEW_COMMANDS:
+    for new_command in local_commands.values():
         logging.info(f"load_custom_commands(): {new_command.name}")
         if connection:
             connection.supported_commands.add(new_command)
@@ -152,23 +173,255 @@ def tuple_to_list_converter(t:tuple)->list:
 
     return return_value
 
+def is_quantity(value)->bool:
+    """
+    True when value is a pint Quantity from any UnitRegistry
+    (python-obd and add_commands.py each have their own).
+    """
+    # class name check first, isinstance() would create the lazy add_commands.py UnitRegistry
+    return 'Quantity' in value.__class__.__name__ or isinstance(value, ureg.Quantity)
+
+# list item type to True when list_cleaner() converts the item to a string
+list_item_to_str_types = {}
+
 def list_cleaner(command_name:str, items:list)->list:
     return_value = []
     for item in items:
-        if (
-            isinstance(item, ureg.Quantity) or
-            isinstance(item, bytearray)
-        ):
-            return_value.append(str(item))
-        elif 'Quantity' in item.__class__.__name__:
+        item_type = type(item)
+        to_str = list_item_to_str_types.get(item_type)
+        if to_str is None:
+            to_str = is_quantity(item) or isinstance(item, bytearray)
+            list_item_to_str_types[item_type] = to_str
+
+        if to_str:
             return_value.append(str(item))
         else:
             return_value.append(item)
     return return_value
 
-def clean_obd_query_response(command_name:str, obd_response):
+def bytearray_normalizer(command_name:str, value:bytearray)->str:
+    return value.decode("utf-8")
+
+def bit_array_normalizer(command_name:str, value:BitArray)->list:
+    return list(value)
+
+def status_normalizer(command_name:str, value:Status)->list:
+    return [
+        str(value.__dict__[base_test])
+        for base_test in BASE_TESTS
+    ]
+
+def quantity_normalizer(command_name:str, value)->str:
+    return str(value)
+
+def tuple_normalizer(command_name:str, value:tuple)->list:
+    return tuple_to_list_converter(value)
+
+def identity_normalizer(command_name:str, value):
+    return value
+
+# obd_response.value type to normalizer function
+value_normalizers = {}
+
+def get_value_normalizer(value):
+    """
+    Returns the function converting values of the same type as value
+    to JSON serializable form.  Types are checked once and cached.
+    """
+    value_type = type(value)
+
+    if value_type not in value_normalizers:
+        if isinstance(value, bytearray):
+            value_normalizers[value_type] = bytearray_normalizer
+        elif isinstance(value, BitArray):
+            value_normalizers[value_type] = bit_array_normalizer
+        elif isinstance(value, Status):
+            value_normalizers[value_type] = status_normalizer
+        elif is_quantity(value):
+            value_normalizers[value_type] = quantity_normalizer
+        elif isinstance(value, list):
+            value_normalizers[value_type] = list_cleaner
+        elif isinstance(value, tuple):
+            value_normalizers[value_type] = tuple_normalizer
+        else:
+            value_normalizers[value_type] = identity_normalizer
+
+    return value_normalizers[value_type]
+
+# command name to (obd_response.value type, normalizer function)
+command_value_normalizers = {}
+
+def normalize_obd_response_value(command_name:str, value):
+    """
+    Convert obd_response.value to JSON serializable form.  A command returns
+    the same value type every time so the normalizer is looked up once per
+    command and dispatched to directly afterwards.
+    """
+    value_type, normalizer = command_value_normalizers.get(command_name, (None, None, ))
+
+    if value_type is not type(value):
+        normalizer = get_value_normalizer(value)
+        command_value_normalizers[command_name] = (type(value), normalizer, )
+
+    return normalizer(command_name, value)
+
+UNIT_COMMAND_NAME = "UNIT"
+
+class StructuredValueEncoder():
+    """
+    Encodes pint Quantity values as a magnitude and a unit id instead of
+    a pint formatted string ("25 degC").  Unit ids are interned per output
+    file.  The first time a unit is used, a UNIT record mapping the unit id
+    to the pint unit string is made available through get_unit_records().
+    Lists are encoded item by item with None as the unit id for items
+    that aren't Quantity values.
+
+    Use one encoder per output file.
+    """
+
+    def __init__(self):
+        """Init function."""
+        # pint UnitsContainer to unit id.  UnitsContainer is used instead of
+        # Unit because Unit objects from python-obd's and add_commands.py's
+        # UnitRegistry can't be compared with each other.
+        self.unit_ids = {}
+        self.unit_strings = {}
+        self.unit_records = []
+        self.unit = None
+
+    def get_unit_id(self, value) -> int:
+        """Returns the unit id for Quantity value's unit, interning new units."""
+        units_container = value._units
+        unit_id = self.unit_ids.get(units_container)
+
+        if unit_id is None:
+            unit_string = str(value.units)
+            if unit_string not in self.unit_strings:
+                self.unit_strings[unit_string] = len(self.unit_strings)
+
+                iso_ts = datetime.isoformat(datetime.now(tz=timezone.utc))
+                self.unit_records.append({
+                    'command_name': UNIT_COMMAND_NAME,
+                    'obd_response_value': [self.unit_strings[unit_string], unit_string],
+                    'iso_ts_pre': iso_ts,
+                    'iso_ts_post': iso_ts,
+                })
+
+            unit_id = self.unit_strings[unit_string]
+            self.unit_ids[units_container] = unit_id
+
+        return unit_id
+
+    def normalize(self, command_name:str, value):
+        """
+        Drop in replacement for normalize_obd_response_value().  Returns the
+        value with Quantity values replaced by their magnitude.  The matching
+        unit id(s) are picked up afterwards with pop_unit().
+        """
+        normalizer = get_value_normalizer(value)
+
+        if normalizer is quantity_normalizer:
+            self.unit = self.get_unit_id(value)
+            return value.magnitude
+
+        if normalizer is list_cleaner:
+            items = []
+            self.unit = []
+            for item in value:
+                if get_value_normalizer(item) is quantity_normalizer:
+                    items.append(item.magnitude)
+                    self.unit.append(self.get_unit_id(item))
+                else:
+                    items += list_cleaner(command_name, [item, ])
+                    self.unit.append(None)
+
+            if not any(unit_id is not None for unit_id in self.unit):
+                self.unit = None
+
+            return items
+
+        self.unit = None
+        return normalizer(command_name, value)
+
+    def pop_unit(self):
+        """Return and clear unit id(s) from the last normalize() call."""
+        unit, self.unit = self.unit, None
+        return unit
+
+    def get_unit_records(self) -> list:
+        """Return and clear pending UNIT records."""
+        records, self.unit_records = self.unit_records, []
+        return records
+
+def get_messages_obd_error_message(messages:list)->str:
+    """
+    returns the OBD adapter error message (key in OBD_ERROR_MESSAGES)
+    found in python-obd messages or None when there isn't one.
+    Each message is scanned once.
+    """
+    for message in messages:
+        match = OBD_ERROR_MESSAGE_PATTERN.search(message.raw())
+        if match:
+            return match.group(0)
+
+    return None
+
+def get_obd_error_message(obd_response)->str:
+    """
+    returns the OBD adapter error message (key in OBD_ERROR_MESSAGES)
+    found in obd_response messages or None when there isn't one.
+    Uses the message captured before ECU filtering by ErrorCaptureCommand
+    when there is one.
+    """
+    if hasattr(obd_response, 'obd_error_message'):
+        return obd_response.obd_error_message
+
+    return get_messages_obd_error_message(obd_response.messages)
+
+class ErrorCaptureCommand(obd.OBDCommand):
+    """
+    OBDCommand that keeps the OBD adapter error message found in the
+    messages it is called with as OBDResponse.obd_error_message.  Adapter
+    error lines ("NO DATA", "BUFFER FULL", "CAN ERROR", ...) are tagged
+    ECU.UNKNOWN, so OBDCommand.__call__() drops them when it filters
+    messages by ECU before building the response.
+    """
+
+    def __call__(self, messages):
+        obd_error_message = get_messages_obd_error_message(messages)
+        obd_response = super().__call__(messages)
+        obd_response.obd_error_message = obd_error_message
+        return obd_response
+
+error_capture_commands = {}
+
+def get_error_capture_command(command:obd.OBDCommand) -> ErrorCaptureCommand:
+    """
+    returns a copy of command keeping adapter error messages (see
+    ErrorCaptureCommand).  The copy has the same header and command string
+    as the original so python-obd fast mode frame counts are shared.
+    """
+    key = (command.name, command.decode, )
+
+    if key not in error_capture_commands:
+        error_capture_commands[key] = ErrorCaptureCommand(
+            command.name,
+            command.desc,
+            command.command,
+            command.bytes,
+            command.decode,
+            command.ecu,
+            command.fast,
+            command.header
+        )
+
+    return error_capture_commands[key]
+
+def clean_obd_query_response_value(command_name:str, obd_response, obd_error_message:str, normalizer=normalize_obd_response_value):
     """
     fixes problems in OBD connection.query responses.
+    obd_error_message comes from get_obd_error_message(obd_response).
+    normalizer converts the remaining response values (see StructuredValueEncoder).
     - is_null() True to "no response"
     - tuples to lists
     - byte arrays to strings
@@ -186,52 +439,139 @@ def clean_obd_query_response(command_name:str, obd_response):
         logging.debug(f"command_name {command_name}: obd_response.is_null or obd_response.value is None")
         return "no response"
 
-    for message in obd_response.messages:
-        for obd_error_message, obd_error_description in OBD_ERROR_MESSAGES.items():
-            raw_message = message.raw()
-            if obd_error_message in raw_message:
-                logging.error(f"command_name: {command_name}: OBD adapter message error: \"{obd_error_message}\": {obd_error_description}")
-                return "no response"
+    if obd_error_message:
+        logging.error(f"command_name: {command_name}: OBD adapter message error: \"{obd_error_message}\": {OBD_ERROR_MESSAGES[obd_error_message]}")
+        return "no response"
+
+    return normalizer(command_name, obd_response.value)
+
+def clean_obd_query_response_and_error(command_name:str, obd_response, normalizer=normalize_obd_response_value) -> tuple:
+    """
+    Returns (cleaned obd_response value, OBD adapter error message or None).
+    See clean_obd_query_response_value().
+    """
+    if not obd_response:
+        return clean_obd_query_response_value(command_name, obd_response, None, normalizer), None
+
+    obd_error_message = get_obd_error_message(obd_response)
+
+    return clean_obd_query_response_value(command_name, obd_response, obd_error_message, normalizer), obd_error_message
+
+def clean_obd_query_response(command_name:str, obd_response):
+    """
+    fixes problems in OBD connection.query responses.
+    See clean_obd_query_response_value().
+    """
+    return clean_obd_query_response_and_error(command_name, obd_response)[0]
+
+def probe_elm327_port(port:str, deadline:float, cancel:Event) -> int:
+    """
+    Lightweight ELM 327 identification handshake ("ATI") on port.
+    Returns the baud rate the adapter responded on or None.
+    Each baud rate is given up on when the port goes quiet or after
+    PROBE_BAUDRATE_READS reads.  Gives up at deadline (monotonic() time)
+    or when cancel is set.
+    """
+    for baudrate in PROBE_BAUDRATES:
+        if cancel.is_set() or monotonic() >= deadline:
+            return None
 
-    if isinstance(obd_response.value, bytearray):
-        return obd_response.value.decode("utf-8")
+        try:
+            with serial.Serial(
+                port,
+                baudrate=baudrate,
+                timeout=PROBE_READ_TIMEOUT,
+                write_timeout=PROBE_READ_TIMEOUT
+            ) as serial_port:
+                serial_port.reset_input_buffer()
+                # garbage characters clear any partial command in the adapter
+                serial_port.write(b"\x7F\x7F\rATI\r")
+                serial_port.flush()
+
+                response = b""
+                baudrate_deadline = min(deadline, monotonic() + PROBE_READ_TIMEOUT * PROBE_BAUDRATE_READS)
+                while b">" not in response:
+                    if cancel.is_set() or monotonic() >= deadline:
+                        return None
+                    if monotonic() >= baudrate_deadline:
+                        logging.info(f"probe {port} at {baudrate} baud: no prompt")
+                        break
+                    data = serial_port.read(64)
+                    if not data:
+                        # nothing answering at this baud rate
+                        break
+                    response += data
+
+                if b"ELM327" in response.upper():
+                    logging.info(f"ELM 327 found on {port} at {baudrate} baud: {response}")
+                    return baudrate
+
+        except (serial.SerialException, OSError) as e:
+            logging.info(f"probe {port} at {baudrate} baud: {e.__class__.__name__}: {e}")
+            return None
+
+    return None
+
+def probe_serial_ports(ports:list, deadline:float=PROBE_DEADLINE) -> tuple:
+    """
+    Probe ports in parallel for an ELM 327 adapter.  The first port to respond wins
+    and the remaining probes are cancelled.  Returns (port, baudrate) or (None, None).
+    Returns by the deadline without waiting for probes stuck opening a port.
+    """
+    if not ports:
+        return None, None
+
+    cancel = Event()
+    probe_deadline = monotonic() + deadline
 
-    if isinstance(obd_response.value, BitArray):
-        return list(obd_response.value)
+    # not a with block, leaving it waits for every probe thread
+    executor = ThreadPoolExecutor(max_workers=len(ports), thread_name_prefix="probe")
 
-    if isinstance(obd_response.value, Status):
-        return [
-            str(obd_response.value.__dict__[base_test])
-            for base_test in BASE_TESTS
-        ]
+    try:
+        futures = {
+            executor.submit(probe_elm327_port, port, probe_deadline, cancel): port
+            for port in ports
+        }
 
-    if isinstance(obd_response.value, ureg.Quantity) or 'Quantity' in obd_response.value.__class__.__name__:
-        return str(obd_response.value)
+        for future in as_completed(futures, timeout=deadline + PROBE_READ_TIMEOUT):
+            baudrate = future.result()
+            if baudrate:
+                return futures[future], baudrate
 
-    if isinstance(obd_response.value, list):
-        return list_cleaner(command_name, obd_response.value)
+    except FuturesTimeoutError:
+        logging.info(f"probe deadline of {deadline} seconds reached")
 
-    if isinstance(obd_response.value, tuple):
-        return tuple_to_list_converter(obd_response.value)
+    finally:
+        # probes check cancel between reads and close their ports on the way out
+        cancel.set()
+        executor.shutdown(wait=False, cancel_futures=True)
 
-    return obd_response.value
+    return None, None
 
 def get_obd_connection(fast:bool, timeout:float)->obd.OBD:
     """
     return an OBD connection instance that connects to the first ELM 327 compatible device
     connected to any of the local serial ports.  If no device found, exit program with error code 1.
+    Ports are probed in parallel and the first port with a responding ELM 327 is tried first.
     """
     ports = sorted(obd.scan_serial())
 
     logging.info(f"identified ports {ports}")
 
+    probe_port, probe_baudrate = probe_serial_ports(ports)
+
+    if probe_port:
+        ports = [probe_port, ] + [port for port in ports if port != probe_port]
+
     for port in ports:
         logging.info(f"connecting to port {port}")
 
+        baudrate = probe_baudrate if port == probe_port else None
+
         try:
 
             # OBD(portstr=None, baudrate=None, protocol=None, fast=True, timeout=0.1, check_voltage=True)
-            connection = obd.OBD(portstr=port, fast=fast, timeout=timeout)
+            connection = obd.OBD(portstr=port, baudrate=baudrate, fast=fast, timeout=timeout)
             for t in range(1, CONNECTION_RETRY_COUNT):
 
                 if connection.is_connected():
@@ -266,20 +606,101 @@ def recover_lost_connection(connection:obd.OBD, fast:bool, timeout:float)->obd.O
 
     return connection
 
+def get_obd_command(command_name:str) -> obd.OBDCommand:
+    """
+    returns python-obd or custom OBDCommand given command_name.
+    returns None when command_name is unknown.
+    """
+    if obd.commands.has_name(command_name):
+        return obd.commands[command_name]
+
+    if command_name in local_commands:
+        return local_commands[command_name]
+
+    return None
+
 def execute_obd_command(connection:obd.OBD, command_name:str):
     """
     executes OBD interface query given command_name on OBD connection.
     returns list or value
     """
-    if obd.commands.has_name(command_name):
-        obd_response = connection.query(obd.commands[command_name], force=True)
+    command = get_obd_command(command_name)
 
-    elif command_name in local_commands:
-        obd_response = connection.query(local_commands[command_name], force=True)
-    else:
+    if not command:
         # raise LookupError(f"command <{command_name}> missing from python-obd and custom commands")
         logging.warn(f"LookupError: config file has command name <{command_name}> that doesn't exist")
         return None
 
-    return obd_response
+    return connection.query(get_error_capture_command(command), force=True)
+
+def raw_messages(messages:list) -> list:
+    """
+    Decoder used in raw capture mode.  Returns messages undecoded so that
+    decoding can be done later (offline) by telemetry_obd.obd_raw_decoder.
+    """
+    return messages
+
+raw_capture_commands = {}
+
+def get_raw_capture_command(command:obd.OBDCommand) -> obd.OBDCommand:
+    """
+    returns a copy of command that skips decoding.
+    - decoder replaced by raw_messages()
+    - accepts messages from all ECUs, filtering is done when decoding
+    - no message data padding/trimming, done when decoding
+    The copy has the same header and command string as the original so
+    python-obd fast mode frame counts are shared between the two.
+    """
+    if command.name not in raw_capture_commands:
+        raw_capture_commands[command.name] = obd.OBDCommand(
+            command.name,
+            command.desc,
+            command.command,
+            0,
+            raw_messages,
+            ECU.ALL,
+            command.fast,
+            command.header
+        )
+
+    return raw_capture_commands[command.name]
+
+def execute_obd_raw_command(connection:obd.OBD, command_name:str):
+    """
+    executes OBD interface query given command_name on OBD connection
+    without decoding the response.
+    returns OBDResponse with undecoded messages
+    """
+    command = get_obd_command(command_name)
+
+    if not command:
+        logging.warn(f"LookupError: config file has command name <{command_name}> that doesn't exist")
+        return None
+
+    return connection.query(get_raw_capture_command(command), force=True)
+
+def raw_obd_query_response(command_name:str, obd_response)->list:
+    """
+    converts raw capture mode OBD connection.query responses into a
+    JSON serializable list of messages.  Each message is a dictionary
+    containing the ECU the message was tagged with and the raw frames
+    (lines) received from the OBD adapter.
+    - None to None
+    - no messages to "no response"
+    """
+    if not obd_response:
+        logging.debug(f"command_name {command_name}: obd_response is None")
+        return None
+
+    if not obd_response.messages:
+        logging.debug(f"command_name {command_name}: obd_response has no messages")
+        return "no response"
+
+    return [
+        {
+            'ecu': message.ecu,
+            'frames': [frame.raw for frame in message.frames],
+        }
+        for message in obd_response.messages
+    ]
 
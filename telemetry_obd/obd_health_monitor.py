@@ -0,0 +1,276 @@
+"""telemetry_obd/obd_health_monitor.py: Background OBD connection health monitor."""
+
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from threading import Condition, Event, Lock, RLock, Thread
+from time import sleep
+import logging
+import obd
+from .obd_common_functions import (
+    get_obd_connection,
+    CONNECTION_WAIT_DELAY,
+)
+
+logger = logging.getLogger(__name__)
+
+HEALTH_CHECK_INTERVAL = 5.0         # seconds
+STALL_TIMEOUT = 30.0                # seconds
+DEGRADED_TIMEOUT_COUNT = 3
+DISCONNECTED_TIMEOUT_COUNT = 10
+LOW_VOLTAGE = 11.0                  # volts
+
+LINK_STATE_COMMAND_NAME = "LINK_STATE"
+
+# link states
+CONNECTED = "connected"
+DEGRADED = "degraded"
+DISCONNECTED = "disconnected"
+RECONNECTING = "reconnecting"
+FAILED = "failed"
+
+# OBD adapter error messages indicating vehicle/adapter link trouble
+# as opposed to a vehicle not supporting an OBD command ("NO DATA").
+LINK_ERROR_MESSAGES = {
+    "BUS BUSY",
+    "BUS ERROR",
+    "CAN ERROR",
+    "FB ERROR",
+    "FC RX TIMEOUT",
+    "LP ALERT",
+    "LV RESET",
+    "RX ERROR",
+    "UART RX OVERFLOW",
+    "UNABLE TO CONNECT",
+}
+
+class ConnectionHealthMonitor():
+    """
+    Watches OBD connection health from a background thread.
+
+    The polling loop queries the vehicle through connection() and reports
+    each response with record_response() or record_exception().  The monitor
+    counts consecutive timeouts (no response from commands that responded
+    earlier in the session, exceptions) and adapter link errors.  The background thread periodically checks the
+    connection status and adapter voltage.  The link is marked degraded
+    before it is marked disconnected.  Reconnection is done by the background
+    thread while the polling loop waits in connection().
+
+    Link state transitions are kept as obd_logger style records available
+    through get_link_state_records().
+    """
+
+    def __init__(
+        self,
+        connection:obd.OBD,
+        fast:bool,
+        timeout:float,
+        health_check_interval:float=HEALTH_CHECK_INTERVAL,
+        stall_timeout:float=STALL_TIMEOUT,
+        degraded_timeout_count:int=DEGRADED_TIMEOUT_COUNT,
+        disconnected_timeout_count:int=DISCONNECTED_TIMEOUT_COUNT,
+        low_voltage:float=LOW_VOLTAGE
+    ):
+        """Init function."""
+        self.obd_connection = connection
+        self.fast = fast
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.stall_timeout = stall_timeout
+        self.degraded_timeout_count = degraded_timeout_count
+        self.disconnected_timeout_count = disconnected_timeout_count
+        self.low_voltage = low_voltage
+
+        self.state = CONNECTED
+        self.consecutive_timeouts = 0
+        self.voltage = None
+        self.responsive_commands = set()
+        self.link_state_records = deque()
+
+        # serializes access to the serial port between threads
+        self.lock = RLock()
+        # signals state changes to threads waiting in connection()
+        self.state_changed = Condition(self.lock)
+        # guards state and link_state_records, mark_stalled() can't take lock
+        self.state_lock = Lock()
+        self.wake = Event()
+        self.stop_event = Event()
+        self.thread = Thread(target=self.run, name="obd_health_monitor", daemon=True)
+
+    def start(self):
+        """Start background health monitor thread."""
+        self.thread.start()
+
+    def stop(self):
+        """Stop background health monitor thread."""
+        self.stop_event.set()
+        self.wake.set()
+        self.thread.join()
+
+    def failed(self) -> bool:
+        """Returns True when reconnecting has failed."""
+        return self.state == FAILED
+
+    def set_state(self, state:str, reason:str):
+        """Change link state and record the transition.  Caller holds lock."""
+        with self.state_lock:
+            if state == self.state:
+                return
+
+            self.change_state(state, reason)
+
+        self.state_changed.notify_all()
+
+    def change_state(self, state:str, reason:str):
+        """Change link state and record the transition.  Caller holds state_lock."""
+        logging.warning(f"OBD link state: {self.state} -> {state}: {reason}")
+
+        iso_ts = datetime.isoformat(datetime.now(tz=timezone.utc))
+        self.link_state_records.append({
+            'command_name': LINK_STATE_COMMAND_NAME,
+            'obd_response_value': [self.state, state, reason],
+            'iso_ts_pre': iso_ts,
+            'iso_ts_post': iso_ts,
+        })
+        self.state = state
+
+    def get_link_state_records(self) -> list:
+        """Return and clear pending link state transition records."""
+        with self.state_lock:
+            records = list(self.link_state_records)
+            self.link_state_records.clear()
+        return records
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager yielding the current OBD connection for exclusive use.
+        Waits while the background thread is reconnecting.
+        """
+        with self.state_changed:
+            while self.state in (DISCONNECTED, RECONNECTING):
+                self.state_changed.wait()
+
+            yield self.obd_connection
+
+    def record_response(self, command_name:str, obd_response, obd_error_message:str=None):
+        """
+        Update link health using a query response from the polling loop.
+        obd_error_message is the get_obd_error_message() result for obd_response.
+        """
+        if obd_response is None:
+            # unknown command name, says nothing about link health
+            return
+
+        with self.lock:
+            # before the no response check, the ECU filter leaves responses
+            # to adapter errors without messages
+            if obd_error_message in LINK_ERROR_MESSAGES:
+                self.record_timeout(f"{command_name}: adapter error \"{obd_error_message}\"")
+                return
+
+            if not obd_response.messages or obd_response.is_null():
+                # unsupported commands never respond, only count commands
+                # that responded earlier in this session as timed out.
+                if command_name in self.responsive_commands:
+                    self.record_timeout(f"{command_name}: no response")
+                return
+
+            self.responsive_commands.add(command_name)
+            self.consecutive_timeouts = 0
+            if self.state == DEGRADED:
+                self.set_state(CONNECTED, f"{command_name}: response received")
+
+    def record_exception(self, command_name:str, e:Exception):
+        """Update link health using a query exception from the polling loop."""
+        with self.lock:
+            self.record_timeout(f"{command_name}: {e.__class__.__name__}: {e}")
+
+    def record_timeout(self, reason:str):
+        """Count consecutive timeouts/errors and degrade link state.  Caller holds lock."""
+        self.consecutive_timeouts += 1
+
+        if self.consecutive_timeouts >= self.disconnected_timeout_count:
+            self.set_state(DISCONNECTED, f"{self.consecutive_timeouts} consecutive timeouts/errors, last {reason}")
+            self.wake.set()
+        elif self.consecutive_timeouts >= self.degraded_timeout_count:
+            self.set_state(DEGRADED, f"{self.consecutive_timeouts} consecutive timeouts/errors, last {reason}")
+
+    def check_health(self):
+        """Check connection status and adapter voltage.  Caller holds lock."""
+        if not self.obd_connection.is_connected():
+            self.set_state(DISCONNECTED, f"connection status {self.obd_connection.status()}")
+            return
+
+        voltage_response = self.obd_connection.query(obd.commands["ELM_VOLTAGE"])
+        if voltage_response.is_null():
+            self.record_timeout("ELM_VOLTAGE: no response")
+            return
+
+        self.voltage = voltage_response.value.magnitude
+        if self.voltage < self.low_voltage:
+            self.set_state(DEGRADED, f"adapter voltage {self.voltage} below {self.low_voltage}")
+        elif self.state == DEGRADED and self.consecutive_timeouts < self.degraded_timeout_count:
+            self.set_state(CONNECTED, f"adapter voltage {self.voltage}")
+
+    def mark_stalled(self):
+        """
+        Mark link degraded while the polling loop is stuck in a query.
+        Called without holding the lock, the stuck query holds it, so only
+        state_lock is taken.  Nothing waits on the state condition while the
+        polling loop holds the lock so no notify needed.
+        """
+        with self.state_lock:
+            if self.state != CONNECTED:
+                return
+
+            self.change_state(DEGRADED, f"query running for more than {self.stall_timeout} seconds")
+
+    def reconnect(self):
+        """Replace lost connection with a new one.  Caller holds lock."""
+        self.set_state(RECONNECTING, "reconnecting")
+
+        try:
+            self.obd_connection.close()
+        except Exception as e:
+            logging.exception(f"close(): Exception: {e}")
+
+        sleep(CONNECTION_WAIT_DELAY)
+
+        try:
+            self.obd_connection = get_obd_connection(fast=self.fast, timeout=self.timeout)
+        except SystemExit:
+            # get_obd_connection() exits when no ELM 327 device is found
+            self.set_state(FAILED, "ELM 327 type device not found")
+            return
+
+        self.consecutive_timeouts = 0
+        self.set_state(CONNECTED, f"reconnected to {self.obd_connection.port_name()}")
+
+    def run(self):
+        """Background thread main loop."""
+        while not self.stop_event.is_set() and self.state != FAILED:
+            self.wake.wait(self.health_check_interval)
+            self.wake.clear()
+
+            if self.stop_event.is_set():
+                break
+
+            if not self.lock.acquire(timeout=self.stall_timeout):
+                # polling loop query has held the serial port for too long
+                self.mark_stalled()
+                continue
+
+            try:
+                if self.state != DISCONNECTED:
+                    self.check_health()
+
+                if self.state == DISCONNECTED:
+                    self.reconnect()
+
+            except Exception as e:
+                logging.exception(f"health check: Exception: {e}")
+                self.record_timeout(f"health check: {e.__class__.__name__}: {e}")
+
+            finally:
+                self.lock.release()
@@ -0,0 +1,425 @@
+# OBD Log Check
+# telemetry-obd/telemetry_obd/obd_log_check.py
+"""
+Integrity checker and repairer for obd_logger output files.
+
+Power cuts leave truncated last lines and zero-length output files behind.
+Each file is checked for:
+
+- zero length
+- damaged tail: partial or invalid lines after the last good record
+- unterminated last record: a complete record missing its newline
+- invalid lines (not JSON, not a record) before the last good record
+- no records: content but no good record at all
+- out of order records: iso_ts_pre earlier than the previous record's
+  (system clock changes, see "Date/Time Accuracy During Data Collection")
+
+Only obd_logger output files are checked.  Directories are searched for
+files named after the directory's VIN with obd_logger's application id
+(FT8W4DT5HED00000-5-obd-2.json in FT8W4DT5HED00000), other loggers'
+files in a shared data directory are left alone.  --recursive searches
+subdirectories too.
+
+Files are checked in parallel, one file per worker process at a time.
+--quick only checks the end of each file (tail and unterminated last
+record, zero length), fast enough to run at every boot.
+
+--repair fixes the end of files in place: damaged tails are truncated to
+the last good record, unterminated last records get their newline and
+zero-length files are deleted.  Files with no good record, invalid lines
+before the last good record and out of order records are reported but
+left alone.  Don't repair files obd_logger is writing.
+
+    python3.11 -m telemetry_obd.obd_log_check data/FT8W4DT5HED00000 --quick --repair
+"""
+from argparse import ArgumentParser
+from datetime import datetime
+from multiprocessing import Pool, cpu_count
+from os import fsync
+from pathlib import Path
+from sys import stdout
+from time import perf_counter
+import sys
+import json
+import logging
+import mmap
+from rich.console import Console
+from rich.table import Table
+from .__init__ import __version__
+from .obd_log_reader import get_log_file_paths, is_obd_log_file
+
+logger = logging.getLogger(__name__)
+
+# --quick reads this much of the end of a file, more when there's no good record in it
+TAIL_BYTES = 64 * 1024
+
+# problems
+EMPTY = "empty"
+DAMAGED_TAIL = "damaged tail"
+UNTERMINATED = "unterminated last record"
+INVALID_LINES = "invalid lines"
+NO_RECORDS = "no records"
+OUT_OF_ORDER = "out of order"
+
+# problems --repair fixes
+REPAIRABLE = {EMPTY, DAMAGED_TAIL, UNTERMINATED, }
+
+def get_line_iso_ts_pre(line:bytes):
+    """
+    Returns (True, iso_ts_pre) for a good record line, (False, None) otherwise.
+    Good record lines are JSON objects with a command_name.
+    """
+    try:
+        record = json.loads(line.decode('utf-8'))
+    except (UnicodeDecodeError, json.JSONDecodeError, ):
+        return False, None
+
+    if not isinstance(record, dict) or 'command_name' not in record:
+        return False, None
+
+    return True, record.get('iso_ts_pre')
+
+def new_check_result(file_path, size:int) -> dict:
+    """Empty check result."""
+    return {
+        'file_path': str(file_path),
+        'size': size,
+        'records': 0,
+        'problems': [],
+        # end of the last good record line
+        'good_size': 0,
+        'tail_bytes': 0,
+        'invalid_lines': 0,
+        'first_invalid_line': None,
+        'out_of_order': 0,
+        'unterminated': False,
+        'repair': None,
+    }
+
+def scan_lines(buffer, start:int, result:dict, full:bool):
+    """
+    Check lines in buffer from byte offset start, updating result.
+    Invalid lines before the last good record and out of order records
+    are only counted when full.
+    """
+    buffer.seek(start)
+    offset = start
+    line_number = 0
+    # invalid lines since the last good record, part of the tail unless a good record follows
+    pending_invalid = []
+    last_iso_ts = None
+
+    for line in iter(buffer.readline, b""):
+        line_number += 1
+        line_end = offset + len(line)
+        offset = line_end
+
+        if line.isspace():
+            continue
+
+        good, iso_ts_pre = get_line_iso_ts_pre(line)
+
+        if not good:
+            pending_invalid.append(line_number)
+            continue
+
+        if pending_invalid and full:
+            result['invalid_lines'] += len(pending_invalid)
+            if result['first_invalid_line'] is None:
+                result['first_invalid_line'] = pending_invalid[0]
+        pending_invalid = []
+
+        result['records'] += 1
+        result['good_size'] = line_end
+        # only the last line can be missing its newline
+        result['unterminated'] = not line.endswith(b"\n")
+
+        if full and iso_ts_pre is not None:
+            # same format strings compare in time order, parse only to confirm
+            if (
+                last_iso_ts is not None and iso_ts_pre < last_iso_ts and
+                datetime.fromisoformat(iso_ts_pre) < datetime.fromisoformat(last_iso_ts)
+            ):
+                result['out_of_order'] += 1
+            last_iso_ts = iso_ts_pre
+
+def get_tail_start(buffer, size:int) -> int:
+    """Offset of the first complete line in the last TAIL_BYTES of buffer."""
+    if size <= TAIL_BYTES:
+        return 0
+
+    newline = buffer.rfind(b"\n", 0, size - TAIL_BYTES)
+    return newline + 1 if newline >= 0 else 0
+
+def check_log_file(file_path, full:bool=True) -> dict:
+    """
+    Check one output file, returning a check result dictionary.
+    Runs in worker processes.
+    """
+    size = file_path.stat().st_size
+    result = new_check_result(file_path, size)
+
+    if size == 0:
+        result['problems'].append(EMPTY)
+        return result
+
+    with open(file_path, mode='rb') as log_file:
+        with mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            if full:
+                scan_lines(buffer, 0, result, full)
+            else:
+                start = get_tail_start(buffer, size)
+                scan_lines(buffer, start, result, full)
+                if result['records'] == 0 and start > 0:
+                    # no good record near the end
+                    scan_lines(buffer, 0, result, full)
+                # only records near the end were counted
+                result['records'] = None
+
+            # whitespace after the last good record isn't damage
+            if buffer[result['good_size']:size].strip():
+                result['tail_bytes'] = size - result['good_size']
+
+    if result['good_size'] == 0 and result['tail_bytes']:
+        # nothing to truncate back to, not an obd_logger output file or badly damaged
+        result['problems'].append(NO_RECORDS)
+    elif result['tail_bytes']:
+        result['problems'].append(DAMAGED_TAIL)
+    if result['unterminated']:
+        result['problems'].append(UNTERMINATED)
+    if result['invalid_lines']:
+        result['problems'].append(INVALID_LINES)
+    if result['out_of_order']:
+        result['problems'].append(OUT_OF_ORDER)
+
+    return result
+
+def repair_log_file(file_path, result:dict) -> str:
+    """
+    Repair the end of an output file in place using its check result.
+    Returns the repair done or None.
+    """
+    problems = set(result['problems'])
+
+    if EMPTY in problems:
+        file_path.unlink()
+        return "deleted"
+
+    if not problems & {DAMAGED_TAIL, UNTERMINATED, }:
+        return None
+
+    with open(file_path, mode='r+b') as log_file:
+        log_file.truncate(result['good_size'])
+        if result['unterminated']:
+            log_file.seek(result['good_size'])
+            log_file.write(b"\n")
+        log_file.flush()
+        fsync(log_file.fileno())
+
+    if result['unterminated']:
+        return f"truncated to {result['good_size']} bytes, newline added"
+
+    return f"truncated to {result['good_size']} bytes"
+
+def check_and_repair_log_file(arguments:tuple) -> dict:
+    """check_log_file() and optional repair_log_file() for Pool.imap_unordered()."""
+    file_path, full, repair = arguments
+
+    result = check_log_file(file_path, full)
+    if repair:
+        result['repair'] = repair_log_file(file_path, result)
+
+    return result
+
+def is_vin_directory_file(file_path:Path) -> bool:
+    """
+    True when file_path is an obd_logger output file in its VIN directory,
+    the file name starting with the directory name.
+    """
+    return is_obd_log_file(file_path) and file_path.name.startswith(f"{file_path.parent.name}-")
+
+def get_check_file_paths(path, recursive:bool=False) -> list:
+    """
+    obd_logger output files to check for an output file or a directory
+    of output files.  Raw capture files are included.
+    """
+    path = Path(path)
+
+    if not path.exists():
+        logging.warning(f"{path}: not found, skipped")
+        return []
+
+    if not path.is_dir():
+        if not is_obd_log_file(path):
+            logging.warning(f"{path}: not an obd_logger output file, skipped")
+            return []
+        return [path, ]
+
+    return [
+        file_path for file_path in get_log_file_paths(path, recursive=recursive, raw_capture=True)
+        if is_vin_directory_file(file_path)
+    ]
+
+def check_log_files(paths:list, full:bool=True, repair:bool=False, processes:int=1, recursive:bool=False) -> list:
+    """
+    Check (and repair) output files and directories of output files
+    across a process pool, recursive includes subdirectories.  Returns
+    check results for every file in path order.
+    """
+    file_paths = []
+    for path in paths:
+        file_paths += get_check_file_paths(path, recursive)
+
+    results = []
+
+    with Pool(processes=processes) as pool:
+        for result in pool.imap_unordered(
+            check_and_repair_log_file,
+            [(file_path, full, repair, ) for file_path in file_paths],
+            chunksize=16
+        ):
+            if result['problems']:
+                logging.info(f"{result['file_path']}: {', '.join(result['problems'])}")
+            results.append(result)
+
+    order = {str(file_path): index for index, file_path in enumerate(file_paths)}
+    results.sort(key=lambda result: order[result['file_path']])
+
+    return results
+
+def needs_repair(result:dict) -> bool:
+    """True when result has repairable problems that weren't repaired."""
+    return bool(REPAIRABLE & set(result['problems'])) and not result['repair']
+
+def rich_print(results:list):
+    console = Console()
+
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("File", justify='left')
+    table.add_column("Bytes", justify='right')
+    table.add_column("Records", justify='right')
+    table.add_column("Problems", justify='left')
+    table.add_column("Tail Bytes", justify='right')
+    table.add_column("Invalid Lines", justify='right')
+    table.add_column("Out Of Order", justify='right')
+    table.add_column("Repair", justify='left')
+
+    for result in results:
+        if not result['problems']:
+            continue
+
+        invalid_lines = str(result['invalid_lines'])
+        if result['first_invalid_line'] is not None:
+            invalid_lines += f" (first line {result['first_invalid_line']})"
+
+        table.add_row(
+            result['file_path'],
+            str(result['size']),
+            "-" if result['records'] is None else str(result['records']),
+            ", ".join(result['problems']),
+            str(result['tail_bytes']),
+            invalid_lines,
+            str(result['out_of_order']),
+            result['repair'] or "-",
+        )
+
+    console.print(table)
+
+    damaged = sum(1 for result in results if result['problems'])
+    repaired = sum(1 for result in results if result['repair'])
+    console.print(f"{len(results)} files checked, {damaged} with problems, {repaired} repaired")
+
+def argument_parsing()-> dict:
+    """Argument parsing"""
+    parser = ArgumentParser(description="Telemetry OBD Log Check")
+    parser.add_argument(
+        "files",
+        nargs='+',
+        metavar="files",
+        help="obd_logger output files or VIN directories of output files to check."
+    )
+    parser.add_argument(
+        "--recursive",
+        help="Also check output files in subdirectories (e.g. every VIN directory in a data directory). Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--quick",
+        help="Only check the end of each file (damaged tail, unterminated last record, zero length). Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--repair",
+        help="Truncate damaged tails to the last good record, terminate unterminated last records " +
+        "and delete zero-length files. Files with no good record are only reported. Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=cpu_count(),
+        help=f"Number of worker processes. Defaults to the number of CPU cores ({cpu_count()})."
+    )
+    parser.add_argument(
+        "--json",
+        help="Print check results as JSON instead of a table. Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--verbose",
+        help="Turn verbose output on. Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--version",
+        help="Print version number and exit.",
+        default=False,
+        action='store_true'
+    )
+    return vars(parser.parse_args())
+
+def main():
+    """Run main function."""
+
+    args = argument_parsing()
+
+    if args['version']:
+        print(f"Version {__version__}", file=stdout)
+        exit(0)
+
+    logging_level = logging.WARNING
+
+    if args['verbose']:
+        logging_level = logging.INFO
+
+    logging.basicConfig(stream=sys.stderr, level=logging_level)
+
+    start_time = perf_counter()
+    results = check_log_files(
+        args['files'],
+        full=not args['quick'],
+        repair=args['repair'],
+        processes=max(1, args['processes']),
+        recursive=args['recursive']
+    )
+    elapsed_time = perf_counter() - start_time
+
+    if args['json']:
+        print(json.dumps([result for result in results if result['problems']], indent=4), file=stdout)
+    else:
+        rich_print(results)
+
+    logging.info(f"checked {len(results)} files in {elapsed_time:.3f} seconds")
+
+    # exit status 1 when files still need repairing
+    if any(needs_repair(result) for result in results):
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
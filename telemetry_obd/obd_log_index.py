@@ -0,0 +1,360 @@
+# OBD Log Index
+# telemetry-obd/telemetry_obd/obd_log_index.py
+"""
+Sidecar index files for obd_logger output files.
+
+An index file sits next to its output file ("<output file>.idx") and holds
+byte offsets of every record line by command name and the byte offset of
+the first record in each time bucket.  Readers seek directly to one
+command's records or to a time window instead of scanning every line.
+
+Index files are written by obd_logger --index when an output file is
+closed or built afterwards:
+
+    python3.11 -m telemetry_obd.obd_log_index data/FT8W4DT5HED00000
+
+Index file format (JSON):
+    'version': INDEX_VERSION
+    'indexed_size': output file bytes covered by the index.  Records
+                    appended later are found by scanning from there.
+    'bucket_seconds': time bucket size in seconds
+    'commands': {command_name: delta encoded record line byte offsets}
+    'buckets': [[bucket start (seconds since epoch), first record offset], ...]
+    'monotonic': false when the clock went backwards while logging.  Time
+                 windows then scan the whole file.
+"""
+from argparse import ArgumentParser
+from datetime import datetime
+from pathlib import Path
+from sys import stdout
+from time import perf_counter
+import sys
+import json
+import logging
+import mmap
+from .__init__ import __version__
+from .obd_log_reader import (
+    get_line_command_name,
+    get_log_file_paths,
+    read_log_file,
+    read_log_lines,
+)
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 2
+INDEX_FILE_SUFFIX = ".idx"
+BUCKET_SECONDS = 60
+
+ISO_TS_PRE_PREFIX = b'"iso_ts_pre": "'
+
+def get_index_file_path(file_path) -> Path:
+    """Index file path for an output file."""
+    file_path = Path(file_path)
+    return file_path.parent / f"{file_path.name}{INDEX_FILE_SUFFIX}"
+
+def get_bucket(iso_ts:str, bucket_seconds:int=BUCKET_SECONDS) -> int:
+    """Start of iso_ts's time bucket in seconds since epoch."""
+    timestamp = int(datetime.fromisoformat(iso_ts).timestamp())
+    return timestamp - (timestamp % bucket_seconds)
+
+def get_line_iso_ts_pre(line:bytes) -> str:
+    """
+    iso_ts_pre from an obd_logger output line without JSON decoding or None.
+    iso_ts_pre comes after obd_response_value so the last match is the key.
+    """
+    start = line.rfind(ISO_TS_PRE_PREFIX)
+    if start < 0:
+        return None
+
+    start += len(ISO_TS_PRE_PREFIX)
+    end = line.find(b'"', start)
+    if end < 0:
+        return None
+
+    return line[start:end].decode('ascii')
+
+class LogIndexBuilder():
+    """
+    Builds an output file index one record line at a time, in file order.
+    """
+
+    def __init__(self, bucket_seconds:int=BUCKET_SECONDS):
+        """Init function."""
+        self.bucket_seconds = bucket_seconds
+        self.offset = 0
+        self.commands = {}
+        self.last_offsets = {}
+        self.buckets = []
+        self.last_iso_ts = None
+        self.monotonic = True
+
+    def add(self, command_name:str, iso_ts_pre:str, line_length:int):
+        """Add the record line at the current offset, line_length bytes long."""
+        if command_name is not None:
+            offsets = self.commands.setdefault(command_name, [])
+            offsets.append(self.offset - self.last_offsets.get(command_name, 0))
+            self.last_offsets[command_name] = self.offset
+
+        if iso_ts_pre is not None and iso_ts_pre != self.last_iso_ts:
+            self.last_iso_ts = iso_ts_pre
+            bucket = get_bucket(iso_ts_pre, self.bucket_seconds)
+            if not self.buckets or bucket > self.buckets[-1][0]:
+                self.buckets.append([bucket, self.offset])
+            elif bucket < self.buckets[-1][0]:
+                # clock went backwards, buckets no longer bound the records
+                self.monotonic = False
+
+        self.offset += line_length
+
+    def add_record(self, record:dict, line_length:int):
+        """Add a record dictionary written as a line_length bytes long line."""
+        self.add(record.get('command_name'), record.get('iso_ts_pre'), line_length)
+
+    def add_line(self, line:bytes):
+        """Add an output file line."""
+        command_name = get_line_command_name(line)
+        self.add(
+            command_name.decode('utf-8') if command_name is not None else None,
+            get_line_iso_ts_pre(line),
+            len(line)
+        )
+
+    def get_index(self) -> dict:
+        """Index as a dictionary."""
+        return {
+            'version': INDEX_VERSION,
+            'indexed_size': self.offset,
+            'bucket_seconds': self.bucket_seconds,
+            'commands': self.commands,
+            'buckets': self.buckets,
+            'monotonic': self.monotonic,
+        }
+
+    def save(self, index_file_path:Path):
+        """Write index file, replacing an existing one."""
+        with open(index_file_path, mode='w', encoding='utf-8') as index_file:
+            index_file.write(json.dumps(self.get_index(), separators=(',', ':', )))
+
+def build_log_index(file_path, bucket_seconds:int=BUCKET_SECONDS) -> LogIndexBuilder:
+    """
+    Index an existing output file.  A truncated last line isn't indexed so
+    that it gets rescanned once complete.
+    """
+    builder = LogIndexBuilder(bucket_seconds)
+
+    with open(file_path, mode='rb') as log_file:
+        if log_file.seek(0, 2) == 0:
+            return builder
+
+        with mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            for line in iter(buffer.readline, b""):
+                if not line.endswith(b"\n"):
+                    break
+                builder.add_line(line)
+
+    return builder
+
+def load_log_index(file_path) -> dict:
+    """
+    Returns the index for an output file with offsets decoded or None
+    when there is no usable index file.
+    """
+    index_file_path = get_index_file_path(file_path)
+    if not index_file_path.exists():
+        return None
+
+    try:
+        with open(index_file_path, mode='r', encoding='utf-8') as index_file:
+            index = json.load(index_file)
+    except (OSError, json.JSONDecodeError, ) as e:
+        logging.warning(f"{index_file_path}: unusable index file {e.__class__.__name__}: {e}")
+        return None
+
+    if index.get('version') != INDEX_VERSION or index['indexed_size'] > Path(file_path).stat().st_size:
+        logging.warning(f"{index_file_path}: stale index file")
+        return None
+
+    for command_name, deltas in index['commands'].items():
+        offset = 0
+        offsets = []
+        for delta in deltas:
+            offset += delta
+            offsets.append(offset)
+        index['commands'][command_name] = offsets
+
+    return index
+
+def get_window_range(index:dict, start_time:datetime=None, end_time:datetime=None) -> tuple:
+    """
+    Returns the (start, end) byte range of an indexed output file holding
+    every record between start_time and end_time.  end is None when the
+    range runs to the end of the file.  Records are normally written in
+    time order so buckets are in time order.  Otherwise, the whole file
+    is the range.
+    """
+    if not index['monotonic']:
+        return 0, None
+
+    start = None
+    end = None
+
+    for bucket, offset in index['buckets']:
+        if start is None and (start_time is None or bucket + index['bucket_seconds'] > start_time.timestamp()):
+            start = offset
+        if end_time is not None and bucket > end_time.timestamp():
+            end = offset
+            break
+
+    if start is None:
+        # every indexed record is before start_time
+        start = index['indexed_size'] if index['buckets'] else 0
+
+    return start, end
+
+def in_window(log_record, start_time:datetime=None, end_time:datetime=None) -> bool:
+    """True when log_record's iso_ts_pre is between start_time and end_time."""
+    if start_time is None and end_time is None:
+        return True
+
+    ts_pre = log_record.ts_pre
+    if ts_pre is None:
+        return False
+
+    return (start_time is None or ts_pre >= start_time) and (end_time is None or ts_pre <= end_time)
+
+def read_indexed_file(file_path, command_names:list=None, start_time:datetime=None, end_time:datetime=None):
+    """
+    Generator returning LogRecord objects from one output file limited to
+    command_names and/or a start_time to end_time window (timezone aware).
+    Uses the file's index when available, otherwise scans the file.
+    Records appended after the index was written are scanned.
+    """
+    index = load_log_index(file_path)
+
+    if index is None:
+        logging.info(f"{file_path}: no index, scanning")
+        for log_record in read_log_file(file_path, command_names):
+            if in_window(log_record, start_time, end_time):
+                yield log_record
+        return
+
+    start, end = get_window_range(index, start_time, end_time)
+    indexed_size = index['indexed_size']
+    window_end = indexed_size if end is None else end
+
+    if command_names is None:
+        for log_record in read_log_file(file_path, None, start=start, end=window_end):
+            if in_window(log_record, start_time, end_time):
+                yield log_record
+    else:
+        offsets = sorted(
+            offset
+            for command_name in command_names
+            for offset in index['commands'].get(command_name, [])
+            if start <= offset < window_end
+        )
+
+        with open(file_path, mode='rb') as log_file:
+            for offset in offsets:
+                log_file.seek(offset)
+                for log_record in read_log_lines([log_file.readline(), ], file_path, None, offset):
+                    if in_window(log_record, start_time, end_time):
+                        yield log_record
+
+    if end is None:
+        # not indexed yet
+        for log_record in read_log_file(file_path, command_names, start=indexed_size):
+            if in_window(log_record, start_time, end_time):
+                yield log_record
+
+def read_indexed_records(path, command_names:list=None, start_time:datetime=None, end_time:datetime=None):
+    """
+    Generator returning LogRecord objects from an output file or a
+    directory of output files using index files.  See read_indexed_file().
+    """
+    for file_path in get_log_file_paths(path):
+        yield from read_indexed_file(file_path, command_names, start_time, end_time)
+
+def index_log_files(paths:list, bucket_seconds:int=BUCKET_SECONDS, force:bool=False) -> int:
+    """
+    Build index files for output files and directories of output files.
+    Output files with an up to date index are skipped unless force is True.
+    Returns the number of index files written.
+    """
+    index_count = 0
+
+    for path in paths:
+        for file_path in get_log_file_paths(path):
+            index = None if force else load_log_index(file_path)
+            if index and index['indexed_size'] == file_path.stat().st_size:
+                logging.info(f"{file_path}: index up to date")
+                continue
+
+            builder = build_log_index(file_path, bucket_seconds)
+            builder.save(get_index_file_path(file_path))
+            logging.info(f"{file_path}: indexed {builder.offset} bytes")
+            index_count += 1
+
+    return index_count
+
+def argument_parsing()-> dict:
+    """Argument parsing"""
+    parser = ArgumentParser(description="Telemetry OBD Log Index")
+    parser.add_argument(
+        "files",
+        nargs='+',
+        metavar="files",
+        help="obd_logger output files or directories of output files to index."
+    )
+    parser.add_argument(
+        "--bucket_seconds",
+        type=int,
+        default=BUCKET_SECONDS,
+        help=f"Time bucket size in seconds. Default is {BUCKET_SECONDS}."
+    )
+    parser.add_argument(
+        "--force",
+        help="Rebuild index files that are up to date. Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--verbose",
+        help="Turn verbose output on. Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--version",
+        help="Print version number and exit.",
+        default=False,
+        action='store_true'
+    )
+    return vars(parser.parse_args())
+
+def main():
+    """Run main function."""
+
+    args = argument_parsing()
+
+    if args['version']:
+        print(f"Version {__version__}", file=stdout)
+        exit(0)
+
+    logging_level = logging.WARNING
+
+    if args['verbose']:
+        logging_level = logging.INFO
+
+    logging.basicConfig(stream=sys.stdout, level=logging_level)
+
+    start_time = perf_counter()
+    index_count = index_log_files(args['files'], args['bucket_seconds'], args['force'])
+    elapsed_time = perf_counter() - start_time
+
+    logging.info(f"wrote {index_count} index files in {elapsed_time:.3f} seconds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+# OBD Log Merge
+# telemetry-obd/telemetry_obd/obd_log_merge.py
+"""
+Merges obd_logger output files into one time ordered record stream.
+
+A drive is split across many output files by --full_cycles rollover,
+application and boot counters and restarts.  merge_log_records() heap
+merges records from every output file in time (iso_ts_pre) order:
+
+- Files are opened when the merge reaches their first record and closed
+  when exhausted, so only files overlapping in time are open together.
+- Memory use is one record per open file plus the records sharing the
+  current timestamp.
+- Records duplicated across files (crash recovery copies) are dropped.
+  Duplicates have the same command name, iso_ts_pre and iso_ts_post.
+  Decoded records are kept over raw capture copies of the same record.
+- Directories are merged without their raw capture files (see
+  get_log_file_paths()).
+- --structured_values unit ids are interned per output file.  Merged
+  records get unit ids from one merged UNIT table, a UNIT record is
+  output the first time a unit is seen.
+
+    python3.11 -m telemetry_obd.obd_log_merge data/FT8W4DT5HED00000 --output_file merged.json
+"""
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from pathlib import Path
+from sys import stdout
+from time import perf_counter
+import sys
+import heapq
+import json
+import logging
+from .__init__ import __version__
+from .obd_common_functions import UNIT_COMMAND_NAME
+from .obd_log_reader import LogRecord, get_log_file_paths, read_log_file
+
+logger = logging.getLogger(__name__)
+
+# records without iso_ts_pre sort first
+MISSING_TS = datetime.min.replace(tzinfo=timezone.utc)
+
+def get_merge_key(log_record) -> datetime:
+    """Merge sort key: iso_ts_pre as datetime."""
+    return log_record.ts_pre or MISSING_TS
+
+def get_raw_rank(log_record) -> int:
+    """Orders decoded records before raw capture records with the same merge key."""
+    return 1 if log_record.is_raw_capture else 0
+
+def get_duplicate_key(log_record) -> tuple:
+    """Records with the same duplicate key are the same record."""
+    return (log_record.command_name, log_record.iso_ts_pre, log_record.iso_ts_post, )
+
+class MergedUnits():
+    """
+    One UNIT table for records merged from --structured_values output
+    files.  Each file's unit ids are mapped to merged unit ids through
+    the file's UNIT records.
+    """
+
+    def __init__(self):
+        """Init function."""
+        # file number to {file unit id: unit string}
+        self.file_unit_strings = {}
+        # unit string to merged unit id
+        self.unit_ids = {}
+
+    def add_unit_record(self, file_number:int, log_record:LogRecord) -> LogRecord:
+        """
+        Learn a file's UNIT record.  Returns the merged UNIT record when the
+        unit is new to the merged table, otherwise None.
+        """
+        unit_id, unit_string = log_record.obd_response_value
+        self.file_unit_strings.setdefault(file_number, {})[unit_id] = unit_string
+
+        if unit_string in self.unit_ids:
+            return None
+
+        self.unit_ids[unit_string] = len(self.unit_ids)
+        return LogRecord(
+            {**log_record.record, 'obd_response_value': [self.unit_ids[unit_string], unit_string], },
+            log_record.file_path,
+            log_record.offset
+        )
+
+    def get_unit_id(self, file_number:int, unit_id):
+        """Merged unit id(s) for a file's unit id(s)."""
+        if isinstance(unit_id, list):
+            return [self.get_unit_id(file_number, item) for item in unit_id]
+
+        if unit_id is None:
+            return None
+
+        unit_string = self.file_unit_strings.get(file_number, {}).get(unit_id)
+        if unit_string is None:
+            logging.warning(f"file number {file_number}: unit id {unit_id} without a UNIT record")
+            return None
+
+        return self.unit_ids[unit_string]
+
+    def merge_record(self, file_number:int, log_record:LogRecord) -> LogRecord:
+        """log_record with merged unit ids."""
+        if log_record.obd_response_unit is None:
+            return log_record
+
+        return LogRecord(
+            {**log_record.record, 'obd_response_unit': self.get_unit_id(file_number, log_record.obd_response_unit), },
+            log_record.file_path,
+            log_record.offset
+        )
+
+def get_merge_file_paths(paths:list) -> list:
+    """Output file paths from output files and directories of output files."""
+    file_paths = []
+    for path in paths:
+        file_paths += get_log_file_paths(path)
+    return file_paths
+
+def get_first_key(file_path:Path, command_names:list=None) -> datetime:
+    """Merge key of a file's first record or None for files without records."""
+    for log_record in read_log_file(file_path, command_names):
+        return get_merge_key(log_record)
+
+    return None
+
+def merge_log_records(paths:list, command_names:list=None, deduplicate:bool=True, statistics:dict=None):
+    """
+    Generator returning LogRecord objects from output files and directories
+    of output files in iso_ts_pre order.  command_names limits records to
+    those commands, UNIT records included.  statistics, when given, is
+    updated with 'files', 'records' and 'duplicates' counts.
+    """
+    if statistics is None:
+        statistics = {}
+    statistics.update({'files': 0, 'records': 0, 'duplicates': 0, })
+
+    if command_names is not None:
+        # unit ids need their UNIT records
+        command_names = list(command_names) + [UNIT_COMMAND_NAME, ]
+
+    merged_units = MergedUnits()
+
+    # (first key, file number, file path) in first key order
+    pending_files = []
+    for file_number, file_path in enumerate(get_merge_file_paths(paths)):
+        first_key = get_first_key(file_path, command_names)
+        if first_key is not None:
+            pending_files.append((first_key, file_number, file_path, ))
+    pending_files.sort(reverse=True)
+
+    # (key, raw rank, file number, sequence, log_record, records iterator)
+    heap = []
+    sequence = 0
+
+    current_key = None
+    current_duplicate_keys = set()
+
+    while heap or pending_files:
+        # open files starting before or at the current merge front
+        while pending_files and (not heap or pending_files[-1][0] <= heap[0][0]):
+            first_key, file_number, file_path = pending_files.pop()
+            logging.info(f"merging {file_path}")
+            statistics['files'] += 1
+
+            records = read_log_file(file_path, command_names)
+            for log_record in records:
+                heapq.heappush(
+                    heap, (get_merge_key(log_record), get_raw_rank(log_record), file_number, sequence, log_record, records, )
+                )
+                sequence += 1
+                break
+
+        key, _, file_number, _, log_record, records = heapq.heappop(heap)
+
+        for next_record in records:
+            heapq.heappush(
+                heap, (get_merge_key(next_record), get_raw_rank(next_record), file_number, sequence, next_record, records, )
+            )
+            sequence += 1
+            break
+
+        if log_record.command_name == UNIT_COMMAND_NAME:
+            log_record = merged_units.add_unit_record(file_number, log_record)
+            if log_record is None:
+                # unit already in the merged UNIT table
+                continue
+            statistics['records'] += 1
+            yield log_record
+            continue
+
+        log_record = merged_units.merge_record(file_number, log_record)
+
+        if deduplicate:
+            if key != current_key:
+                current_key = key
+                current_duplicate_keys = set()
+
+            duplicate_key = get_duplicate_key(log_record)
+            if duplicate_key in current_duplicate_keys:
+                statistics['duplicates'] += 1
+                continue
+            current_duplicate_keys.add(duplicate_key)
+
+        statistics['records'] += 1
+        yield log_record
+
+def argument_parsing()-> dict:
+    """Argument parsing"""
+    parser = ArgumentParser(description="Telemetry OBD Log Merge")
+    parser.add_argument(
+        "files",
+        nargs='+',
+        metavar="files",
+        help="obd_logger output files or directories of output files (e.g. a VIN directory) to merge."
+    )
+    parser.add_argument(
+        "--output_file",
+        help="Merged output file. Must not exist. Default is standard output.",
+        default=None
+    )
+    parser.add_argument(
+        "--command_names",
+        help="Comma separated command names to merge. Default is every command.",
+        default=None
+    )
+    parser.add_argument(
+        "--keep_duplicates",
+        help="Keep records duplicated across files. Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--verbose",
+        help="Turn verbose output on. Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--version",
+        help="Print version number and exit.",
+        default=False,
+        action='store_true'
+    )
+    return vars(parser.parse_args())
+
+def main():
+    """Run main function."""
+
+    args = argument_parsing()
+
+    if args['version']:
+        print(f"Version {__version__}", file=stdout)
+        exit(0)
+
+    logging_level = logging.WARNING
+
+    if args['verbose']:
+        logging_level = logging.INFO
+
+    # records may go to standard output
+    logging.basicConfig(stream=sys.stderr, level=logging_level)
+
+    command_names = None
+    if args['command_names']:
+        command_names = [command_name for command_name in args['command_names'].split(',') if command_name]
+
+    start_time = perf_counter()
+    statistics = {}
+
+    out_file = open(args['output_file'], mode='x', encoding='utf-8') if args['output_file'] else stdout
+
+    try:
+        for log_record in merge_log_records(
+            args['files'], command_names, deduplicate=not args['keep_duplicates'], statistics=statistics
+        ):
+            out_file.write(json.dumps(log_record.record) + "\n")
+    finally:
+        if out_file is not stdout:
+            out_file.close()
+
+    elapsed_time = perf_counter() - start_time
+    logging.info(
+        f"merged {statistics['records']} records from {statistics['files']} files, " +
+        f"dropped {statistics['duplicates']} duplicates in {elapsed_time:.3f} seconds"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+# OBD Log Query
+# telemetry-obd/telemetry_obd/obd_log_query.py
+"""
+Command and time range queries over an obd_logger data directory.
+
+Answers "all values of COMMAND between T1 and T2 for VIN X".  Output
+files are searched in parallel, one file per worker process at a time.
+Files with index files (obd_logger --index, obd_log_index) are read by
+seeking to the matching records.  Other files are scanned, skipping
+lines for other commands before JSON decoding.
+
+Records are written in file order as JSON lines or CSV.  --count prints
+per command record, value and "no response" counts instead.
+
+    python3.11 -m telemetry_obd.obd_log_query data --vin FT8W4DT5HED00000 --command_names FUEL_RATE \\
+        --start 2021-09-10T20:00:00 --end 2021-09-10T21:00:00
+"""
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from multiprocessing import Pool, cpu_count
+from pathlib import Path
+from sys import stdout
+from time import perf_counter
+import sys
+import csv
+import json
+import logging
+from rich.console import Console
+from rich.table import Table
+from .__init__ import __version__
+from .obd_log_index import read_indexed_file
+from .obd_log_reader import get_log_file_paths, read_log_file
+
+logger = logging.getLogger(__name__)
+
+BASE_PATH = "data"
+
+JSON_FORMAT = "json"
+CSV_FORMAT = "csv"
+OUTPUT_FORMATS = [JSON_FORMAT, CSV_FORMAT, ]
+
+CSV_COLUMNS = [
+    'file_name',
+    'command_name',
+    'obd_response_value',
+    'obd_response_unit',
+    'obd_error_message',
+    'iso_ts_pre',
+    'iso_ts_post',
+]
+
+def parse_time(iso_ts:str) -> datetime:
+    """ISO format date/time, UTC when no time zone is given, or None."""
+    if not iso_ts:
+        return None
+
+    ts = datetime.fromisoformat(iso_ts)
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+
+    return ts
+
+def get_query_file_paths(base_path, vin:str=None, raw_capture:bool=False) -> list:
+    """
+    Output file paths for one VIN directory in base_path or for every VIN
+    directory when vin is None.  base_path can also be an output file.
+    raw_capture includes raw capture files.
+    """
+    base_path = Path(base_path)
+
+    if vin:
+        return get_log_file_paths(base_path / vin, raw_capture=raw_capture)
+
+    return get_log_file_paths(base_path, recursive=True, raw_capture=raw_capture)
+
+def query_log_file(arguments:tuple) -> list:
+    """
+    Records (dictionaries) in one output file matching command_names and
+    the start_time to end_time window.  Raw capture records are left out
+    unless raw_capture.  Runs in worker processes.
+    """
+    file_path, command_names, start_time, end_time, raw_capture = arguments
+
+    if end_time is not None:
+        # output files are in time order, skip files starting after the window
+        for log_record in read_log_file(file_path):
+            if log_record.ts_pre is not None and log_record.ts_pre > end_time:
+                return []
+            break
+
+    return [
+        log_record.record
+        for log_record in read_indexed_file(file_path, command_names, start_time, end_time)
+        if raw_capture or not log_record.is_raw_capture
+    ]
+
+def query_log_files(
+    file_paths:list,
+    command_names:list=None,
+    start_time:datetime=None,
+    end_time:datetime=None,
+    processes:int=1,
+    raw_capture:bool=False
+):
+    """
+    Generator returning (file path, record) for matching records in file
+    path order, searching files across a process pool.
+    """
+    with Pool(processes=processes) as pool:
+        for file_path, records in zip(file_paths, pool.imap(
+            query_log_file,
+            [(file_path, command_names, start_time, end_time, raw_capture, ) for file_path in file_paths]
+        )):
+            logging.info(f"{file_path}: {len(records)} records")
+            for record in records:
+                yield file_path, record
+
+def get_csv_row(file_path:Path, record:dict) -> list:
+    """CSV row for a record, lists and dictionaries as JSON."""
+    row = []
+    for column in CSV_COLUMNS:
+        if column == 'file_name':
+            value = file_path.name
+        else:
+            value = record.get(column)
+
+        if isinstance(value, (list, dict, )):
+            value = json.dumps(value)
+
+        row.append("" if value is None else value)
+
+    return row
+
+def count_records(results) -> dict:
+    """Per command {'records', 'values', 'no_responses'} counts from query_log_files() results."""
+    counts = {}
+
+    for _, record in results:
+        command_counts = counts.setdefault(record['command_name'], {'records': 0, 'values': 0, 'no_responses': 0, })
+        command_counts['records'] += 1
+
+        value = record.get('obd_response_value', record.get('raw_messages'))
+        if value is None or value == "no response":
+            command_counts['no_responses'] += 1
+        else:
+            command_counts['values'] += 1
+
+    return counts
+
+def rich_print(counts:dict):
+    console = Console()
+
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("Command", justify='left')
+    table.add_column("Records", justify='right')
+    table.add_column("Values", justify='right')
+    table.add_column("No Response", justify='right')
+
+    for command_name in sorted(counts):
+        command_counts = counts[command_name]
+        table.add_row(
+            command_name,
+            str(command_counts['records']),
+            str(command_counts['values']),
+            str(command_counts['no_responses']),
+        )
+
+    console.print(table)
+
+def argument_parsing()-> dict:
+    """Argument parsing"""
+    parser = ArgumentParser(description="Telemetry OBD Log Query")
+    parser.add_argument(
+        "base_path",
+        nargs='?',
+        metavar="base_path",
+        default=BASE_PATH,
+        help=f"Data directory holding VIN directories, a VIN directory or an output file. Defaults to '{BASE_PATH}'."
+    )
+    parser.add_argument(
+        "--vin",
+        help="Vehicle VIN directory to query. Default is every VIN directory in base_path.",
+        default=None
+    )
+    parser.add_argument(
+        "--command_names",
+        help="Comma separated command names to query. Default is every command.",
+        default=None
+    )
+    parser.add_argument(
+        "--start",
+        help="Start date/time in ISO format (e.g. 2021-09-10T20:44:43), UTC unless a time zone is given. " +
+        "Default is the first record.",
+        default=None
+    )
+    parser.add_argument(
+        "--end",
+        help="End date/time in ISO format, UTC unless a time zone is given. Default is the last record.",
+        default=None
+    )
+    parser.add_argument(
+        "--raw_capture",
+        help="Include raw capture files and records (undecoded raw_messages). Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--format",
+        choices=OUTPUT_FORMATS,
+        default=JSON_FORMAT,
+        help=f"Output format. Default is {JSON_FORMAT} (JSON lines)."
+    )
+    parser.add_argument(
+        "--count",
+        help="Print per command record, value and \"no response\" counts instead of records. Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--output_file",
+        help="Output file. Must not exist. Default is standard output.",
+        default=None
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=cpu_count(),
+        help=f"Number of worker processes. Defaults to the number of CPU cores ({cpu_count()})."
+    )
+    parser.add_argument(
+        "--verbose",
+        help="Turn verbose output on. Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--version",
+        help="Print version number and exit.",
+        default=False,
+        action='store_true'
+    )
+    return vars(parser.parse_args())
+
+def main():
+    """Run main function."""
+
+    args = argument_parsing()
+
+    if args['version']:
+        print(f"Version {__version__}", file=stdout)
+        exit(0)
+
+    logging_level = logging.WARNING
+
+    if args['verbose']:
+        logging_level = logging.INFO
+
+    # records may go to standard output
+    logging.basicConfig(stream=sys.stderr, level=logging_level)
+
+    command_names = None
+    if args['command_names']:
+        command_names = [command_name for command_name in args['command_names'].split(',') if command_name]
+
+    try:
+        start_time = parse_time(args['start'])
+        end_time = parse_time(args['end'])
+    except ValueError as e:
+        logging.error(f"ValueError: {e}")
+        exit(1)
+
+    file_paths = get_query_file_paths(args['base_path'], args['vin'], args['raw_capture'])
+    if not file_paths:
+        logging.error(f"no output files found in {args['base_path']}")
+        exit(1)
+
+    query_start_time = perf_counter()
+    results = query_log_files(
+        file_paths, command_names, start_time, end_time, max(1, args['processes']), args['raw_capture']
+    )
+
+    if args['count']:
+        rich_print(count_records(results))
+        logging.info(f"queried {len(file_paths)} files in {perf_counter() - query_start_time:.3f} seconds")
+        return
+
+    out_file = open(args['output_file'], mode='x', encoding='utf-8', newline='') if args['output_file'] else stdout
+    record_count = 0
+
+    try:
+        if args['format'] == CSV_FORMAT:
+            writer = csv.writer(out_file)
+            writer.writerow(CSV_COLUMNS)
+            for file_path, record in results:
+                writer.writerow(get_csv_row(file_path, record))
+                record_count += 1
+        else:
+            for _, record in results:
+                out_file.write(json.dumps(record) + "\n")
+                record_count += 1
+    finally:
+        if out_file is not stdout:
+            out_file.close()
+
+    logging.info(
+        f"{record_count} records from {len(file_paths)} files in {perf_counter() - query_start_time:.3f} seconds"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+# OBD Log Reader
+# telemetry-obd/telemetry_obd/obd_log_reader.py
+"""
+Streams records from obd_logger output files.
+
+read_log_records() is a generator over one output file or a directory of
+output files (in file name order) returning LogRecord objects.
+Directories are searched for obd_logger output files, leaving out other
+loggers' files and raw capture files (see get_log_file_paths()).
+
+- Large files are memory mapped instead of being read into memory.
+- Timestamps are parsed into datetime objects only when used.
+- A truncated last line (logger killed mid write) is skipped.
+- With command_names, lines for other commands are skipped before JSON
+  decoding by looking at the command name at the start of each line.
+
+    from telemetry_obd.obd_log_reader import read_log_records
+
+    for record in read_log_records("data/FT8W4DT5HED00000", command_names=["RPM"]):
+        print(record.ts_pre, record.obd_response_value)
+"""
+from datetime import datetime
+from pathlib import Path
+import json
+import logging
+import mmap
+import re
+
+logger = logging.getLogger(__name__)
+
+LOG_FILE_PATTERN = "*.json"
+
+# obd_logger output file names end with the application id, "obd" or
+# "obd-raw" (--raw_capture), and the application counter.  obd_raw_decoder
+# adds DECODED_FILE_SUFFIX to the names of the regular output files it makes
+# from raw capture files.  obd_command_tester's "obd-cmd-test" files don't match.
+OBD_FILE_NAME_PATTERN = re.compile(r"-obd(?P<raw>-raw)?(?:-\d+)?(?:-decoded)?\.json$")
+DECODED_FILE_SUFFIX = "-decoded"
+MMAP_THRESHOLD = 1024 * 1024        # bytes
+
+VALUE_COLUMN = "value"
+
+# obd_logger writes command_name first (json.dumps keeps dictionary order)
+COMMAND_NAME_PREFIX = b'{"command_name": "'
+
+class LogRecord():
+    """
+    One obd_logger output record.  record is the decoded JSON dictionary,
+    file_path and offset locate the record's line in its output file.
+    """
+    __slots__ = ('record', 'file_path', 'offset', '_ts_pre', '_ts_post', )
+
+    def __init__(self, record:dict, file_path:Path=None, offset:int=None):
+        """Init function."""
+        self.record = record
+        self.file_path = file_path
+        self.offset = offset
+        self._ts_pre = None
+        self._ts_post = None
+
+    def __repr__(self):
+        return f"LogRecord({self.record!r}, {self.file_path!r}, {self.offset!r})"
+
+    @property
+    def command_name(self) -> str:
+        return self.record['command_name']
+
+    @property
+    def obd_response_value(self):
+        return self.record.get('obd_response_value')
+
+    @property
+    def obd_response_unit(self):
+        return self.record.get('obd_response_unit')
+
+    @property
+    def obd_error_message(self) -> str:
+        return self.record.get('obd_error_message')
+
+    @property
+    def is_raw_capture(self) -> bool:
+        """True for obd_logger --raw_capture records (undecoded raw_messages)."""
+        return 'raw_messages' in self.record
+
+    @property
+    def iso_ts_pre(self) -> str:
+        return self.record.get('iso_ts_pre')
+
+    @property
+    def iso_ts_post(self) -> str:
+        return self.record.get('iso_ts_post')
+
+    @property
+    def ts_pre(self) -> datetime:
+        """iso_ts_pre as a timezone aware datetime, parsed on first use."""
+        if self._ts_pre is None and self.iso_ts_pre:
+            self._ts_pre = datetime.fromisoformat(self.iso_ts_pre)
+        return self._ts_pre
+
+    @property
+    def ts_post(self) -> datetime:
+        """iso_ts_post as a timezone aware datetime, parsed on first use."""
+        if self._ts_post is None and self.iso_ts_post:
+            self._ts_post = datetime.fromisoformat(self.iso_ts_post)
+        return self._ts_post
+
+def parse_number(item) -> tuple:
+    """
+    Returns (number, unit) for one response item.  number is None when
+    item isn't numeric.
+    """
+    if isinstance(item, bool):
+        return (1.0 if item else 0.0), None
+
+    if isinstance(item, (int, float, )):
+        return float(item), None
+
+    if isinstance(item, str):
+        magnitude, _, unit = item.partition(" ")
+        try:
+            return float(magnitude), (unit or None)
+        except ValueError:
+            return None, None
+
+    return None, None
+
+def get_value_items(value, obd_response_unit, unit_strings:dict) -> list:
+    """
+    Returns [(column name, number, unit), ...] for an obd_response_value
+    and --structured_values unit id(s).
+    """
+    if isinstance(value, list):
+        unit_ids = obd_response_unit if isinstance(obd_response_unit, list) else [None] * len(value)
+        columns = [f"{VALUE_COLUMN}_{index}" for index in range(len(value))]
+    else:
+        value = [value, ]
+        unit_ids = [obd_response_unit, ]
+        columns = [VALUE_COLUMN, ]
+
+    items = []
+    for column, item, unit_id in zip(columns, value, unit_ids):
+        number, unit = parse_number(item)
+        if unit_id is not None:
+            unit = unit_strings.get(unit_id, unit)
+        items.append((column, number, unit, ))
+
+    return items
+
+def natural_sort_key(path:Path) -> list:
+    """Sort key ordering file names with embedded numbers numerically."""
+    return [
+        int(part) if part.isdigit() else part
+        for part in re.split(r"(\d+)", Path(path).name)
+    ]
+
+def is_obd_log_file(path) -> bool:
+    """True when path is named like an obd_logger output file."""
+    return OBD_FILE_NAME_PATTERN.search(Path(path).name) is not None
+
+def is_raw_capture_file(path) -> bool:
+    """
+    True when path is named like an obd_logger --raw_capture output file.
+    Decoded raw capture files aren't raw capture files.
+    """
+    path = Path(path)
+    match = OBD_FILE_NAME_PATTERN.search(path.name)
+
+    return bool(match and match.group('raw')) and not path.stem.endswith(DECODED_FILE_SUFFIX)
+
+def get_log_file_paths(path, recursive:bool=False, raw_capture:bool=False) -> list:
+    """
+    Returns output file paths for an output file or a directory of
+    output files, sorted by file name.  recursive includes output files
+    in subdirectories (e.g. every VIN directory in a data directory).
+
+    Directories are searched for obd_logger output files only, leaving
+    out other loggers' files.  Raw capture files, which hold
+    undecoded responses also found in their decoded files, are left out
+    unless raw_capture is True.  A file path is always returned as is.
+    """
+    path = Path(path)
+
+    if not path.is_dir():
+        return [path, ]
+
+    file_paths = path.rglob(LOG_FILE_PATTERN) if recursive else path.glob(LOG_FILE_PATTERN)
+
+    return sorted(
+        (
+            file_path for file_path in file_paths
+            if is_obd_log_file(file_path) and (raw_capture or not is_raw_capture_file(file_path))
+        ),
+        key=natural_sort_key
+    )
+
+def get_line_command_name(line:bytes) -> bytes:
+    """
+    Command name at the start of an obd_logger output line or None when
+    the line doesn't start with the command name.
+    """
+    if not line.startswith(COMMAND_NAME_PREFIX):
+        return None
+
+    end = line.find(b'"', len(COMMAND_NAME_PREFIX))
+    if end < 0:
+        return None
+
+    return line[len(COMMAND_NAME_PREFIX):end]
+
+def read_log_lines(lines, file_path:Path=None, command_names:set=None, start:int=0, end:int=None):
+    """
+    Generator returning LogRecord objects from obd_logger output lines
+    (bytes) read starting at byte offset start.  Stops at byte offset end.
+    command_names is a set of command names as bytes or None for every command.
+    """
+    offset = start
+
+    for line in lines:
+        if end is not None and offset >= end:
+            break
+
+        line_offset = offset
+        offset += len(line)
+
+        if command_names is not None:
+            command_name = get_line_command_name(line)
+            if command_name is not None and command_name not in command_names:
+                continue
+
+        if line.isspace():
+            continue
+
+        try:
+            # decoding first skips json.loads() byte encoding detection
+            record = json.loads(line.decode('utf-8'))
+        except (json.JSONDecodeError, UnicodeDecodeError, ) as e:
+            if not line.endswith(b"\n"):
+                logging.info(f"{file_path}: offset {line_offset}: skipping truncated last line")
+            else:
+                logging.error(f"{file_path}: offset {line_offset}: {e.__class__.__name__}: {e}")
+            continue
+
+        if not isinstance(record, dict):
+            logging.error(f"{file_path}: offset {line_offset}: not a record")
+            continue
+
+        if command_names is not None and record.get('command_name', '').encode() not in command_names:
+            # line didn't start with the command name
+            continue
+
+        yield LogRecord(record, file_path, line_offset)
+
+def read_log_file(file_path, command_names:list=None, mmap_threshold:int=MMAP_THRESHOLD, start:int=0, end:int=None):
+    """
+    Generator returning LogRecord objects from one obd_logger output file,
+    optionally limited to byte range start to end (line boundaries).
+    Files larger than mmap_threshold bytes are memory mapped.
+    """
+    file_path = Path(file_path)
+    if command_names is not None:
+        command_names = {command_name.encode() for command_name in command_names}
+
+    with open(file_path, mode='rb') as log_file:
+        file_size = log_file.seek(0, 2)
+        if file_size == 0:
+            return
+
+        if file_size > mmap_threshold:
+            with mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                buffer.seek(start)
+                yield from read_log_lines(iter(buffer.readline, b""), file_path, command_names, start, end)
+        else:
+            log_file.seek(start)
+            yield from read_log_lines(log_file, file_path, command_names, start, end)
+
+def read_log_records(path, command_names:list=None, mmap_threshold:int=MMAP_THRESHOLD, raw_capture:bool=False):
+    """
+    Generator returning LogRecord objects from an obd_logger output file
+    or from every output file in a directory in file name order.
+    command_names limits records to those commands.  raw_capture includes
+    raw capture files found in directories (see get_log_file_paths()).
+    """
+    for file_path in get_log_file_paths(path, raw_capture=raw_capture):
+        yield from read_log_file(file_path, command_names, mmap_threshold)
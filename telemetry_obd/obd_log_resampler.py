@@ -0,0 +1,280 @@
+# OBD Log Resampler
+# telemetry-obd/telemetry_obd/obd_log_resampler.py
+"""
+Resamples asynchronous command samples from obd_logger output files onto
+a fixed time grid, producing a wide table with one column per command.
+
+Each column is filled with one of two methods:
+    - "previous": last value carried forward
+    - "linear": linear interpolation between the samples around each grid time
+Samples older than max_age seconds (or, for "linear", a next sample more
+than max_age seconds away) leave the grid cell empty.  Grid times with
+every cell empty, e.g. gaps between drives, are skipped.
+
+Records are read in time order (merge_log_records()) in a single pass.
+Raw capture records hold no values and are skipped, resample their
+decoded files (obd_raw_decoder) instead.
+Only samples still within max_age of pending grid times are kept, so
+memory use doesn't depend on drive length.
+
+    python3.11 -m telemetry_obd.obd_log_resampler data/FT8W4DT5HED00000 --columns RPM,SPEED,MAF --linear RPM,MAF
+"""
+from argparse import ArgumentParser
+from bisect import insort
+from collections import deque
+from datetime import datetime, timezone
+from sys import stdout
+import sys
+import csv
+import logging
+from .__init__ import __version__
+from .obd_log_merge import merge_log_records
+from .obd_log_reader import VALUE_COLUMN, get_value_items
+
+logger = logging.getLogger(__name__)
+
+PERIOD = 1.0                        # seconds
+MAX_AGE = 5.0                       # seconds
+PREVIOUS = "previous"
+LINEAR = "linear"
+METHODS = [PREVIOUS, LINEAR, ]
+
+class ResampleColumn():
+    """
+    One resampled column: a command's value, or one item of a command
+    returning a list ("FUEL_STATUS[0]").
+    """
+
+    def __init__(self, name:str, method:str=PREVIOUS, max_age:float=MAX_AGE):
+        """Init function."""
+        if method not in METHODS:
+            raise ValueError(f"unknown resample method {method}, choose from {', '.join(METHODS)}")
+
+        self.name = name
+        self.method = method
+        self.max_age = max_age
+
+        command_name, _, index = name.partition("[")
+        self.command_name = command_name
+        self.item_column = f"{VALUE_COLUMN}_{index.rstrip(']')}" if index else VALUE_COLUMN
+
+        # (seconds since epoch, value) in time order
+        self.samples = deque()
+
+    def add_sample(self, timestamp:float, items:list):
+        """Add a sample from get_value_items() items when it has this column's item."""
+        for column, number, _ in items:
+            if column == self.item_column and number is not None:
+                if self.samples and timestamp < self.samples[-1][0]:
+                    # slightly out of order record
+                    samples = list(self.samples)
+                    insort(samples, (timestamp, number, ))
+                    self.samples = deque(samples)
+                else:
+                    self.samples.append((timestamp, number, ))
+                return
+
+    def get_value(self, grid_time:float) -> float:
+        """Column value at grid_time or None."""
+        previous = None
+        following = None
+
+        for sample in self.samples:
+            if sample[0] <= grid_time:
+                previous = sample
+            else:
+                following = sample
+                break
+
+        if previous is None or grid_time - previous[0] > self.max_age:
+            previous = None
+
+        if self.method == PREVIOUS or (previous is not None and previous[0] == grid_time):
+            return previous[1] if previous else None
+
+        if previous is None or following is None or following[0] - grid_time > self.max_age:
+            return None
+
+        return previous[1] + (following[1] - previous[1]) * (grid_time - previous[0]) / (following[0] - previous[0])
+
+    def get_stale_time(self) -> float:
+        """Time after which cells are empty until the next sample or None without samples."""
+        return self.samples[-1][0] + self.max_age if self.samples else None
+
+    def trim(self, grid_time:float):
+        """Drop samples no longer needed for grid times from grid_time on."""
+        while len(self.samples) > 1 and self.samples[1][0] <= grid_time:
+            self.samples.popleft()
+
+def get_stale_time(columns:list) -> float:
+    """Time after which every column's cells are empty until the next sample."""
+    return max(
+        [stale_time for stale_time in (column.get_stale_time() for column in columns) if stale_time is not None],
+        default=float('-inf')
+    )
+
+def resample_log_records(log_records, columns:list, period:float=PERIOD):
+    """
+    Generator returning (grid time as datetime, [column values]) rows from
+    time ordered LogRecord objects.  Grid times are multiples of period
+    seconds since epoch from the first to the last record.  Grid times
+    with no column values are skipped.
+    """
+    columns_by_command = {}
+    for column in columns:
+        columns_by_command.setdefault(column.command_name, []).append(column)
+
+    # a grid time is complete once records are this far past it
+    horizon = max([column.max_age for column in columns if column.method == LINEAR] + [0.0, ])
+
+    grid_number = None
+    timestamp = None
+
+    for log_record in log_records:
+        ts_pre = log_record.ts_pre
+        if ts_pre is None:
+            continue
+
+        timestamp = ts_pre.timestamp()
+
+        if grid_number is None:
+            # grid times as multiples of period don't accumulate rounding errors
+            grid_number = int(timestamp // period)
+
+        while timestamp > grid_number * period + horizon:
+            grid_time = grid_number * period
+            values = [column.get_value(grid_time) for column in columns]
+            if any(value is not None for value in values):
+                yield datetime.fromtimestamp(grid_time, tz=timezone.utc), values
+            grid_number += 1
+            for column in columns:
+                column.trim(grid_number * period)
+
+            if grid_number * period > get_stale_time(columns):
+                # every column is stale until this record, skip the gap
+                grid_number = max(grid_number, int(timestamp // period))
+
+        command_columns = columns_by_command.get(log_record.command_name)
+        if command_columns and not log_record.is_raw_capture:
+            # raw capture records have no value, decode raw capture files first
+            items = get_value_items(log_record.obd_response_value, None, {})
+            for column in command_columns:
+                column.add_sample(timestamp, items)
+
+    if grid_number is None:
+        return
+
+    while grid_number * period <= timestamp:
+        grid_time = grid_number * period
+        values = [column.get_value(grid_time) for column in columns]
+        if any(value is not None for value in values):
+            yield datetime.fromtimestamp(grid_time, tz=timezone.utc), values
+        grid_number += 1
+
+def parse_column_settings(settings:str) -> dict:
+    """'RPM=1.0,SPEED=2.5' to {'RPM': 1.0, 'SPEED': 2.5}."""
+    parsed = {}
+    for setting in settings.split(','):
+        if setting:
+            name, _, value = setting.partition('=')
+            parsed[name] = float(value)
+    return parsed
+
+def argument_parsing()-> dict:
+    """Argument parsing"""
+    parser = ArgumentParser(description="Telemetry OBD Log Resampler")
+    parser.add_argument(
+        "files",
+        nargs='+',
+        metavar="files",
+        help="obd_logger output files or directories of output files."
+    )
+    parser.add_argument(
+        "--columns",
+        help="Comma separated column names: command names, or command names with a list item index (FUEL_STATUS[0]).",
+        required=True
+    )
+    parser.add_argument(
+        "--linear",
+        help="Comma separated column names using linear interpolation. Other columns carry the last value forward.",
+        default=""
+    )
+    parser.add_argument(
+        "--period",
+        type=float,
+        default=PERIOD,
+        help=f"Time grid period in seconds. Default is {PERIOD}."
+    )
+    parser.add_argument(
+        "--max_age",
+        type=float,
+        default=MAX_AGE,
+        help=f"Samples older than this many seconds are stale, leaving cells empty. Default is {MAX_AGE}."
+    )
+    parser.add_argument(
+        "--max_ages",
+        help="Comma separated per column max age overrides, e.g. 'RPM=1.0,SPEED=2.5'.",
+        default=""
+    )
+    parser.add_argument(
+        "--output_file",
+        help="CSV output file. Must not exist. Default is standard output.",
+        default=None
+    )
+    parser.add_argument(
+        "--verbose",
+        help="Turn verbose output on. Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--version",
+        help="Print version number and exit.",
+        default=False,
+        action='store_true'
+    )
+    return vars(parser.parse_args())
+
+def main():
+    """Run main function."""
+
+    args = argument_parsing()
+
+    if args['version']:
+        print(f"Version {__version__}", file=stdout)
+        exit(0)
+
+    logging_level = logging.WARNING
+
+    if args['verbose']:
+        logging_level = logging.INFO
+
+    # rows may go to standard output
+    logging.basicConfig(stream=sys.stderr, level=logging_level)
+
+    linear = {name for name in args['linear'].split(',') if name}
+    max_ages = parse_column_settings(args['max_ages'])
+
+    columns = [
+        ResampleColumn(name, LINEAR if name in linear else PREVIOUS, max_ages.get(name, args['max_age']))
+        for name in args['columns'].split(',') if name
+    ]
+    command_names = sorted({column.command_name for column in columns})
+
+    out_file = open(args['output_file'], mode='x', encoding='utf-8', newline='') if args['output_file'] else stdout
+
+    try:
+        writer = csv.writer(out_file)
+        writer.writerow(["timestamp", ] + [column.name for column in columns])
+
+        for grid_time, values in resample_log_records(
+            merge_log_records(args['files'], command_names), columns, args['period']
+        ):
+            writer.writerow([grid_time.isoformat(), ] + ["" if value is None else value for value in values])
+    finally:
+        if out_file is not stdout:
+            out_file.close()
+
+
+if __name__ == "__main__":
+    main()
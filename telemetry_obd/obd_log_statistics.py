@@ -0,0 +1,293 @@
+# OBD Log Statistics
+# telemetry-obd/telemetry_obd/obd_log_statistics.py
+"""
+Per command response quality and latency statistics over obd_logger output files.
+
+Output files are processed in parallel, one file per worker process at a
+time (map), and per file statistics are combined afterwards (reduce).
+For each command:
+
+- success rate: responses with a value
+- no response rate: "no response" values (includes OBD adapter errors)
+  Raw capture records count as successes when they hold frames without
+  an OBD adapter error.
+- latency percentiles: iso_ts_post - iso_ts_pre, millisecond resolution,
+  responses reused by --static_cache excluded
+- sample rate: successful responses per second of output file time
+  (first to last record) in files containing the command
+- change rate: share of successful responses whose value differs from the
+  command's previous successful response in the same file
+
+    python3.11 -m telemetry_obd.obd_log_statistics data/FT8W4DT5HED00000
+"""
+from argparse import ArgumentParser
+from multiprocessing import Pool, cpu_count
+from sys import stdout
+from time import perf_counter
+import sys
+import json
+import logging
+from rich.console import Console
+from rich.table import Table
+from .__init__ import __version__
+from .obd_common_functions import UNIT_COMMAND_NAME
+from .obd_health_monitor import LINK_STATE_COMMAND_NAME
+from .obd_log_reader import get_log_file_paths, read_log_file
+
+logger = logging.getLogger(__name__)
+
+# bookkeeping records, not OBD commands
+SKIP_COMMAND_NAMES = {UNIT_COMMAND_NAME, LINK_STATE_COMMAND_NAME, }
+
+PERCENTILES = [50, 90, 99, ]
+
+def new_command_statistics() -> dict:
+    """Empty per command statistics."""
+    return {
+        'responses': 0,
+        'successes': 0,
+        'no_responses': 0,
+        'cached': 0,
+        # latency in milliseconds to count
+        'latencies': {},
+        'seconds': 0.0,
+        'changes': 0,
+        'comparisons': 0,
+    }
+
+def get_file_statistics(file_path) -> dict:
+    """
+    Statistics for one output file: {command_name: statistics}.
+    Runs in worker processes.
+    """
+    statistics = {}
+    last_values = {}
+    first_ts = None
+    last_ts = None
+
+    for log_record in read_log_file(file_path):
+        command_name = log_record.command_name
+        ts_pre = log_record.ts_pre
+
+        if ts_pre is not None:
+            first_ts = first_ts or ts_pre
+            last_ts = ts_pre
+
+        if command_name in SKIP_COMMAND_NAMES:
+            continue
+
+        command_statistics = statistics.get(command_name)
+        if command_statistics is None:
+            command_statistics = statistics[command_name] = new_command_statistics()
+
+        command_statistics['responses'] += 1
+
+        if log_record.is_raw_capture:
+            # undecoded frames, adapter error lines are responses too
+            value = log_record.record['raw_messages']
+            if log_record.obd_error_message:
+                value = "no response"
+        else:
+            value = log_record.obd_response_value
+
+        if value is None or value == "no response":
+            command_statistics['no_responses'] += 1
+            continue
+
+        command_statistics['successes'] += 1
+
+        if command_name in last_values:
+            command_statistics['comparisons'] += 1
+            if value != last_values[command_name]:
+                command_statistics['changes'] += 1
+        last_values[command_name] = value
+
+        if log_record.record.get('obd_response_cached'):
+            command_statistics['cached'] += 1
+            continue
+
+        if ts_pre is not None and log_record.ts_post is not None:
+            latency = round((log_record.ts_post - ts_pre).total_seconds() * 1000.0)
+            command_statistics['latencies'][latency] = command_statistics['latencies'].get(latency, 0) + 1
+
+    seconds = (last_ts - first_ts).total_seconds() if first_ts is not None else 0.0
+    for command_statistics in statistics.values():
+        command_statistics['seconds'] = seconds
+
+    return statistics
+
+def combine_statistics(total:dict, statistics:dict):
+    """Add one file's statistics to total statistics."""
+    for command_name, command_statistics in statistics.items():
+        total_statistics = total.get(command_name)
+        if total_statistics is None:
+            total_statistics = total[command_name] = new_command_statistics()
+
+        for key in ('responses', 'successes', 'no_responses', 'cached', 'seconds', 'changes', 'comparisons', ):
+            total_statistics[key] += command_statistics[key]
+
+        latencies = total_statistics['latencies']
+        for latency, count in command_statistics['latencies'].items():
+            latencies[latency] = latencies.get(latency, 0) + count
+
+def get_percentile(latencies:dict, percentile:float) -> int:
+    """Latency percentile in milliseconds from a latency histogram, None when empty."""
+    count = sum(latencies.values())
+    if count == 0:
+        return None
+
+    rank = percentile / 100.0 * count
+    seen = 0
+    for latency in sorted(latencies):
+        seen += latencies[latency]
+        if seen >= rank:
+            return latency
+
+    return max(latencies)
+
+def get_report(total:dict) -> dict:
+    """Rates and percentiles from combined statistics, by command name."""
+    report = {}
+
+    for command_name in sorted(total):
+        command_statistics = total[command_name]
+        responses = command_statistics['responses']
+        latencies = command_statistics['latencies']
+
+        command_report = {
+            'responses': responses,
+            'success_rate': command_statistics['successes'] / responses,
+            'no_response_rate': command_statistics['no_responses'] / responses,
+            'cached': command_statistics['cached'],
+        }
+        for percentile in PERCENTILES:
+            command_report[f"latency_p{percentile}_ms"] = get_percentile(latencies, percentile)
+        command_report['latency_max_ms'] = max(latencies) if latencies else None
+        command_report['sample_rate_hz'] = (
+            command_statistics['successes'] / command_statistics['seconds']
+            if command_statistics['seconds'] > 0 else None
+        )
+        command_report['change_rate'] = (
+            command_statistics['changes'] / command_statistics['comparisons']
+            if command_statistics['comparisons'] else None
+        )
+
+        report[command_name] = command_report
+
+    return report
+
+def get_log_statistics(paths:list, processes:int=1) -> dict:
+    """
+    Per command statistics report for output files and directories of
+    output files, processing files across a process pool.
+    """
+    file_paths = []
+    for path in paths:
+        file_paths += get_log_file_paths(path)
+
+    total = {}
+
+    with Pool(processes=processes) as pool:
+        for file_path, statistics in zip(file_paths, pool.imap(get_file_statistics, file_paths)):
+            logging.info(f"{file_path}: {len(statistics)} commands")
+            combine_statistics(total, statistics)
+
+    return get_report(total)
+
+def format_value(value, format_string:str) -> str:
+    """Table cell text, "-" for None."""
+    return "-" if value is None else format(value, format_string)
+
+def rich_print(report:dict):
+    console = Console()
+
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("Command", justify='left')
+    table.add_column("Responses", justify='right')
+    table.add_column("Success", justify='right')
+    table.add_column("No Response", justify='right')
+    for percentile in PERCENTILES:
+        table.add_column(f"p{percentile} ms", justify='right')
+    table.add_column("Max ms", justify='right')
+    table.add_column("Rate Hz", justify='right')
+    table.add_column("Change", justify='right')
+
+    for command_name, command_report in report.items():
+        table.add_row(
+            command_name,
+            str(command_report['responses']),
+            format_value(command_report['success_rate'], ".1%"),
+            format_value(command_report['no_response_rate'], ".1%"),
+            *[format_value(command_report[f"latency_p{percentile}_ms"], "d") for percentile in PERCENTILES],
+            format_value(command_report['latency_max_ms'], "d"),
+            format_value(command_report['sample_rate_hz'], ".3f"),
+            format_value(command_report['change_rate'], ".1%"),
+        )
+
+    console.print(table)
+
+def argument_parsing()-> dict:
+    """Argument parsing"""
+    parser = ArgumentParser(description="Telemetry OBD Log Statistics")
+    parser.add_argument(
+        "files",
+        nargs='+',
+        metavar="files",
+        help="obd_logger output files or directories of output files."
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=cpu_count(),
+        help=f"Number of worker processes. Defaults to the number of CPU cores ({cpu_count()})."
+    )
+    parser.add_argument(
+        "--json",
+        help="Print statistics as JSON instead of a table. Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--verbose",
+        help="Turn verbose output on. Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--version",
+        help="Print version number and exit.",
+        default=False,
+        action='store_true'
+    )
+    return vars(parser.parse_args())
+
+def main():
+    """Run main function."""
+
+    args = argument_parsing()
+
+    if args['version']:
+        print(f"Version {__version__}", file=stdout)
+        exit(0)
+
+    logging_level = logging.WARNING
+
+    if args['verbose']:
+        logging_level = logging.INFO
+
+    logging.basicConfig(stream=sys.stderr, level=logging_level)
+
+    start_time = perf_counter()
+    report = get_log_statistics(args['files'], processes=max(1, args['processes']))
+    elapsed_time = perf_counter() - start_time
+
+    if args['json']:
+        print(json.dumps(report, indent=4), file=stdout)
+    else:
+        rich_print(report)
+
+    logging.info(f"statistics for {len(report)} commands in {elapsed_time:.3f} seconds")
+
+
+if __name__ == "__main__":
+    main()
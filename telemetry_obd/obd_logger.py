@@ -5,14 +5,10 @@ telemetry_obd/obd_logger.py: Onboard Diagnostic Data Logger.
 from sys import stdout, stderr
 from os import fsync
 from time import sleep
-from datetime import datetime, timezone
 from pathlib import Path
 from argparse import ArgumentParser
-from pint import OffsetUnitCalculusError
 import sys
-import json
 import logging
-from traceback import print_exc
 import obd
 from .__init__ import __version__
 
@@ -27,10 +23,25 @@ from .obd_common_functions import (
     get_vin_from_vehicle,
     get_elm_info,
     CommandNameGenerator,
-    clean_obd_query_response,
     get_obd_connection,
-    recover_lost_connection,
-    execute_obd_command,
+)
+from .obd_pipeline import CommandPipeline, write_record
+from .obd_memo_decoder import MemoizedDecoder, MEMO_CACHE_SIZE
+from .obd_log_index import LogIndexBuilder, get_index_file_path
+from .obd_sqlite_sink import (
+    SQLiteSink,
+    SQLITE_BATCH_SIZE,
+    SQLITE_BATCH_SECONDS,
+)
+from .obd_shared_values import SharedValuesWriter
+from .obd_static_cache import (
+    StaticValueCache,
+    STATIC_CACHE_POLICIES,
+    STATIC_COMMANDS,
+)
+from .obd_health_monitor import (
+    ConnectionHealthMonitor,
+    HEALTH_CHECK_INTERVAL,
 )
 
 logger = logging.getLogger("obd_logger")
@@ -107,6 +118,114 @@ def argument_parsing()-> dict:
         type=float,
     )
 
+    parser.add_argument(
+        "--health_check_interval",
+        help=(
+            "Seconds between background OBD connection health checks (connection status and adapter voltage)." +
+            f"  Default is {HEALTH_CHECK_INTERVAL}."
+        ),
+        default=HEALTH_CHECK_INTERVAL,
+        type=float,
+    )
+
+    parser.add_argument(
+        "--raw_capture",
+        help="Record raw OBD adapter response frames without decoding. " +
+        "Raw capture files are converted to regular output files by telemetry_obd.obd_raw_decoder. " +
+        "Default is off.",
+        default=False,
+        action='store_true'
+    )
+
+    parser.add_argument(
+        "--structured_values",
+        help="Write Pint values as a magnitude and a unit id (obd_response_unit) " +
+        "instead of Pint formatted strings.  Unit ids are defined by UNIT records in each output file. " +
+        "Default is off.",
+        default=False,
+        action='store_true'
+    )
+
+    parser.add_argument(
+        "--units_lite",
+        help="Decode add_commands.py commands without Pint using static per command units. " +
+        "Output is the same as with Pint decoding (python -m telemetry_obd.units_lite --check). " +
+        "Default is off.",
+        default=False,
+        action='store_true'
+    )
+
+    parser.add_argument(
+        "--memo_decode",
+        help="Cache cleaned response values by raw response frames and skip decoding repeated responses. " +
+        "Speeds up slow changing commands (PID bitmaps, FUEL_TYPE, ECU_NAME, ...). " +
+        "Ignored with --raw_capture.  Default is off.",
+        default=False,
+        action='store_true'
+    )
+
+    parser.add_argument(
+        "--memo_cache_size",
+        type=int,
+        default=MEMO_CACHE_SIZE,
+        help=f"Maximum number of responses cached by --memo_decode.  Default is {MEMO_CACHE_SIZE}."
+    )
+
+    parser.add_argument(
+        "--static_cache",
+        choices=STATIC_CACHE_POLICIES,
+        default=None,
+        help="Query static commands (see --static_commands) once per OBD connection ('connection') " +
+        "or once per output file ('file') and reuse the response afterwards. " +
+        "Reused responses are marked with obd_response_cached.  Default is off."
+    )
+
+    parser.add_argument(
+        "--static_commands",
+        default=",".join(STATIC_COMMANDS),
+        help=f"Comma separated command names cached by --static_cache.  Default is '{','.join(STATIC_COMMANDS)}'."
+    )
+
+    parser.add_argument(
+        "--index",
+        help="Write a sidecar index file (output file name plus '.idx') when each output file is closed. " +
+        "Index files hold record byte offsets by command name and by time. " +
+        "Default is off.",
+        default=False,
+        action='store_true'
+    )
+
+    parser.add_argument(
+        "--sqlite_file",
+        help="Also write records to this SQLite database file (WAL mode), created when missing. " +
+        "Records are inserted in batched transactions. " +
+        "Default is off.",
+        default=None
+    )
+
+    parser.add_argument(
+        "--sqlite_batch_size",
+        type=int,
+        default=SQLITE_BATCH_SIZE,
+        help=f"Records per --sqlite_file transaction. Default is {SQLITE_BATCH_SIZE}."
+    )
+
+    parser.add_argument(
+        "--sqlite_batch_seconds",
+        type=float,
+        default=SQLITE_BATCH_SECONDS,
+        help=f"Maximum seconds records wait for a --sqlite_file transaction. Default is {SQLITE_BATCH_SECONDS}."
+    )
+
+    parser.add_argument(
+        "--shared_values",
+        metavar="NAME",
+        help="Publish the latest value and timestamps of every command into the shared memory " +
+        "latest value table NAME for other processes (see obd_shared_values). " +
+        "Default is off.",
+        default=None
+    )
+
     parser.add_argument(
         "--verbose",
         help="Turn verbose output on. Default is off.",
@@ -140,6 +259,19 @@ def main():
     debug = args['logging']
     full_cycles = args['full_cycles']
     start_cycle_delay = args['start_cycle_delay']
+    raw_capture = args['raw_capture']
+    health_check_interval = args['health_check_interval']
+    structured_values = args['structured_values']
+    units_lite = args['units_lite']
+    memo_decode = args['memo_decode'] and not raw_capture
+    memo_cache_size = args['memo_cache_size']
+    static_cache_policy = args['static_cache']
+    static_commands = [command_name for command_name in args['static_commands'].split(',') if command_name]
+    index = args['index']
+    sqlite_file = args['sqlite_file']
+    sqlite_batch_size = args['sqlite_batch_size']
+    sqlite_batch_seconds = args['sqlite_batch_seconds']
+    shared_values_name = args['shared_values']
 
     logging_level = logging.WARNING
 
@@ -158,6 +290,19 @@ def main():
     logging.info(f"argument --full_cycles: {full_cycles}")
     logging.info(f"argument --logging: {args['logging']} ")
     logging.info(f"argument --start_cycle_delay: {start_cycle_delay}")
+    logging.info(f"argument --raw_capture: {raw_capture}")
+    logging.info(f"argument --health_check_interval: {health_check_interval}")
+    logging.info(f"argument --structured_values: {structured_values}")
+    logging.info(f"argument --units_lite: {units_lite}")
+    logging.info(f"argument --memo_decode: {memo_decode}")
+    logging.info(f"argument --memo_cache_size: {memo_cache_size}")
+    logging.info(f"argument --static_cache: {static_cache_policy}")
+    logging.info(f"argument --static_commands: {static_commands}")
+    logging.info(f"argument --index: {index}")
+    logging.info(f"argument --sqlite_file: {sqlite_file}")
+    logging.info(f"argument --sqlite_batch_size: {sqlite_batch_size}")
+    logging.info(f"argument --sqlite_batch_seconds: {sqlite_batch_seconds}")
+    logging.info(f"argument --shared_values: {shared_values_name}")
     logging.debug("debug logging enabled")
 
     # OBD(portstr=None, baudrate=None, protocol=None, fast=True, timeout=0.1, check_voltage=True)
@@ -185,80 +330,113 @@ def main():
     logging.info(f"first_command_name: {first_command_name}")
     logging.info(f"last_command_name: {last_command_name}")
 
+    app_id = 'obd-raw' if raw_capture else 'obd'
+
+    health_monitor = ConnectionHealthMonitor(
+        connection,
+        fast=fast,
+        timeout=timeout,
+        health_check_interval=health_check_interval
+    )
+    health_monitor.start()
+
+    memo_decoder = MemoizedDecoder(cache_size=memo_cache_size, units_lite=units_lite) if memo_decode else None
+
+    static_cache = StaticValueCache(static_cache_policy, static_commands) if static_cache_policy else None
+
+    sqlite_sink = SQLiteSink(sqlite_file, sqlite_batch_size, sqlite_batch_seconds) if sqlite_file else None
+
+    # readers stay attached across obd_logger restarts, the table isn't removed on exit
+    shared_values = SharedValuesWriter(shared_values_name) if shared_values_name else None
+
+    pipeline = CommandPipeline(
+        health_monitor=health_monitor,
+        raw_capture=raw_capture,
+        structured_values=structured_values,
+        units_lite=units_lite,
+        memo_decoder=memo_decoder,
+        static_cache=static_cache
+    )
+
     while command_name_generator:
-        output_file_path = get_output_file_name('obd', vin=vin)
+        output_file_path = get_output_file_name(app_id, vin=vin)
         logging.info(f"output file: {output_file_path}")
 
         try:
             # x - open for exclusive creation, failing if the file already exists
             with open(output_file_path, mode='x', encoding='utf-8') as out_file:
 
-                for command_name in command_name_generator:
-                    if first_command_name == command_name:
-                        # insert delay here
-                        if start_cycle_delay > 0:
-                            sleep(start_cycle_delay)
+                pipeline.start_file()
+
+                log_index = LogIndexBuilder() if index else None
 
-                    logging.info(f"command_name: {command_name}")
+                try:
+                    if sqlite_sink:
+                        sqlite_sink.start_file()
 
-                    if '-' in command_name:
-                        logging.error(f"skipping malformed command_name: {command_name}")
-                        continue
+                    if shared_values:
+                        shared_values.start_file()
 
-                    iso_ts_pre = datetime.isoformat(
-                        datetime.now(tz=timezone.utc)
-                    )
+                    for command_name in command_name_generator:
+                        if first_command_name == command_name:
+                            # insert delay here
+                            if start_cycle_delay > 0:
+                                sleep(start_cycle_delay)
 
-                    try:
+                        logging.info(f"command_name: {command_name}")
 
-                        obd_response = execute_obd_command(connection, command_name)
+                        if '-' in command_name:
+                            logging.error(f"skipping malformed command_name: {command_name}")
+                            continue
 
-                    except OffsetUnitCalculusError as e:
-                        logging.exception(f"Exception: {e.__class__.__name__}: {e}")
-                        logging.exception(f"OffsetUnitCalculusError on {command_name}, decoder must be fixed")
-                        print_exc()
+                        for record in pipeline.run(command_name):
+                            write_record(out_file, record, log_index, sqlite_sink)
+                            if shared_values:
+                                shared_values.publish(record)
 
-                    except Exception as e:
-                        logging.exception(f"Exception: {e}")
-                        print_exc()
-                        if not connection.is_connected():
-                            logging.info(f"connection failure on {command_name}, reconnecting")
-                            connection.close()
-                            connection = get_obd_connection(fast=fast, timeout=timeout)
+                        out_file.flush()
+                        fsync(out_file.fileno())
 
-                    iso_ts_post = datetime.isoformat(
-                        datetime.now(tz=timezone.utc)
-                    )
+                        if health_monitor.failed():
+                            logging.error(f"connection lost and not recovered after {command_name}, exiting...")
+                            if sqlite_sink:
+                                sqlite_sink.close()
+                            if shared_values:
+                                shared_values.close(unlink=False)
+                            exit(1)
 
-                    obd_response_value = clean_obd_query_response(command_name, obd_response)
+                        if (
+                            command_name_generator.full_cycles_count >
+                            full_cycles
+                        ):
+                            command_name_generator.full_cycles_count = 0
+                            break
 
-                    logging.info(f"saving: {command_name}, {obd_response_value}, {iso_ts_pre}, {iso_ts_post}")
+                    if memo_decoder:
+                        memo_decoder.log_statistics()
 
-                    out_file.write(json.dumps({
-                                'command_name': command_name,
-                                'obd_response_value': obd_response_value,
-                                'iso_ts_pre': iso_ts_pre,
-                                'iso_ts_post': iso_ts_post,
-                            }) + "\n"
-                    )
-                    out_file.flush()
-                    fsync(out_file.fileno())
+                    if static_cache:
+                        static_cache.log_statistics()
 
-                    if not connection.is_connected():
-                        logging.error(f"connection lost, retrying after {command_name}")
-                        connection = recover_lost_connection(connection, fast=fast, timeout=timeout)
+                finally:
+                    if log_index:
+                        # also written on exit(1) and exceptions, after a power loss
+                        # python3.11 -m telemetry_obd.obd_log_index rebuilds it
+                        log_index.save(get_index_file_path(output_file_path))
 
-                    if (
-                        command_name_generator.full_cycles_count >
-                        full_cycles
-                    ):
-                        command_name_generator.full_cycles_count = 0
-                        break
+                if sqlite_sink:
+                    sqlite_sink.commit()
 
         except FileExistsError:
             logger.error(f"open(): FileExistsError: {output_file_path}")
-            imu_counter = get_next_application_counter_value('obd')
-            logger.error(f"get_log_file_handle(): Incremented 'obd' counter to {imu_counter}")
+            imu_counter = get_next_application_counter_value(app_id)
+            logger.error(f"get_log_file_handle(): Incremented '{app_id}' counter to {imu_counter}")
+
+    if sqlite_sink:
+        sqlite_sink.close()
+
+    if shared_values:
+        shared_values.close(unlink=False)
 
 if __name__ == "__main__":
     main()
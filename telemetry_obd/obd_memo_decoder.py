@@ -0,0 +1,138 @@
+# OBD Memoized Decoder
+# telemetry-obd/telemetry_obd/obd_memo_decoder.py
+"""
+Memoized OBD response decoding for obd_logger --memo_decode.
+
+Slow changing commands (FUEL_TYPE, OBD_COMPLIANCE, AUXILIARY_IN_OUT_STATUS,
+PID support bitmaps, ECU_NAME, ...) return the same response frames
+thousands of times.  Responses are queried without decoding (see
+get_raw_capture_command()) and looked up in a bounded LRU cache keyed by
+command name and raw response frames.  On a hit, the cleaned response
+value is returned without decoding or normalizing.  On a miss, the
+response is decoded and cleaned the usual way and the result is cached.
+
+Responses with OBD adapter errors or without a value are never cached so
+that they are logged every time.
+"""
+from collections import OrderedDict
+import logging
+from .obd_common_functions import (
+    clean_obd_query_response_and_error,
+    get_error_capture_command,
+    get_obd_command,
+    normalize_obd_response_value,
+)
+from .units_lite import get_lite_command
+
+MEMO_CACHE_SIZE = 1024
+
+def get_memo_key(command_name:str, obd_response) -> tuple:
+    """Cache key: command name and every message's ECU and raw frames."""
+    return (
+        command_name,
+        tuple((message.ecu, message.raw(), ) for message in obd_response.messages),
+    )
+
+class MemoizedDecoder():
+    """
+    Decodes and cleans undecoded (raw capture command) query responses
+    through a bounded LRU cache of cleaned response values.
+
+    With a StructuredValueEncoder, unit ids are cached alongside values.
+    Unit ids are interned per output file so the cache is cleared whenever
+    a different encoder is passed in.
+    """
+
+    def __init__(self, cache_size:int=MEMO_CACHE_SIZE, units_lite:bool=False):
+        """Init function."""
+        self.cache_size = cache_size
+        self.units_lite = units_lite
+        # memo key to (cleaned value, unit id(s))
+        self.cache = OrderedDict()
+        self.value_encoder = None
+        self.hits = {}
+        self.misses = {}
+
+    def get_command(self, command_name:str):
+        """
+        Decoding command for command_name, None when unknown.  Adapter
+        error messages are kept through the command's ECU filter.
+        """
+        command = get_obd_command(command_name)
+
+        if command and self.units_lite:
+            command = get_lite_command(command)
+
+        return get_error_capture_command(command) if command else None
+
+    def decode(self, command_name:str, obd_response, value_encoder=None) -> tuple:
+        """
+        Returns (cleaned obd_response value, OBD adapter error message or None)
+        for an undecoded obd_response, the same as clean_obd_query_response_and_error()
+        on a decoded response.  With value_encoder, unit id(s) are left for
+        value_encoder.pop_unit().
+        """
+        if value_encoder is not self.value_encoder:
+            self.cache.clear()
+            self.value_encoder = value_encoder
+
+        normalizer = value_encoder.normalize if value_encoder else normalize_obd_response_value
+
+        if not obd_response or not obd_response.messages:
+            return clean_obd_query_response_and_error(command_name, obd_response, normalizer)
+
+        key = get_memo_key(command_name, obd_response)
+        entry = self.cache.get(key)
+
+        if entry is not None:
+            self.cache.move_to_end(key)
+            self.hits[command_name] = self.hits.get(command_name, 0) + 1
+
+            obd_response_value, unit = entry
+            if value_encoder:
+                value_encoder.unit = unit
+
+            return obd_response_value, None
+
+        self.misses[command_name] = self.misses.get(command_name, 0) + 1
+
+        command = self.get_command(command_name)
+        decoded_response = command(obd_response.messages) if command else None
+
+        obd_response_value, obd_error_message = clean_obd_query_response_and_error(
+            command_name, decoded_response, normalizer
+        )
+
+        unit = value_encoder.pop_unit() if value_encoder else None
+        if value_encoder:
+            value_encoder.unit = unit
+
+        if obd_error_message is None and obd_response_value not in (None, "no response", ):
+            self.cache[key] = (obd_response_value, unit, )
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+        return obd_response_value, obd_error_message
+
+    def get_statistics(self) -> dict:
+        """Returns {command_name: {'hits', 'misses', 'hit_rate'}}."""
+        statistics = {}
+
+        for command_name in sorted(set(self.hits) | set(self.misses)):
+            hits = self.hits.get(command_name, 0)
+            misses = self.misses.get(command_name, 0)
+            statistics[command_name] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': hits / (hits + misses),
+            }
+
+        return statistics
+
+    def log_statistics(self):
+        """Log cache hit rate per command."""
+        for command_name, statistics in self.get_statistics().items():
+            logging.info(
+                f"memo decode {command_name}: hits {statistics['hits']} misses {statistics['misses']} " +
+                f"hit rate {statistics['hit_rate']:.1%}"
+            )
@@ -0,0 +1,216 @@
+# OBD Pipeline
+# telemetry-obd/telemetry_obd/obd_pipeline.py
+"""
+obd_logger's per command processing: query a command on the OBD
+connection, decode and clean the response and build output records.
+
+Shared by obd_logger (vehicle connections) and obd_replay (recorded
+responses) so that replays run the same code as logging.
+"""
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from time import monotonic
+from traceback import print_exc
+from pint import OffsetUnitCalculusError
+import json
+import logging
+from .obd_common_functions import (
+    clean_obd_query_response_and_error,
+    execute_obd_command,
+    execute_obd_raw_command,
+    get_obd_error_message,
+    raw_obd_query_response,
+    StructuredValueEncoder,
+)
+from .units_lite import execute_obd_lite_command
+
+logger = logging.getLogger(__name__)
+
+def write_record(out_file, record:dict, log_index=None, sqlite_sink=None):
+    """
+    Write record as a JSON line, adding it to log_index (LogIndexBuilder)
+    and sqlite_sink (SQLiteSink).  json.dumps() escapes non-ASCII
+    characters so line length in characters is the length in bytes.
+    """
+    line = json.dumps(record) + "\n"
+
+    if log_index:
+        log_index.add_record(record, len(line))
+
+    out_file.write(line)
+
+    if sqlite_sink:
+        sqlite_sink.add_record(record)
+
+class CommandPipeline():
+    """
+    Runs OBD commands and returns output records.
+
+    With a health_monitor (ConnectionHealthMonitor), queries go through the
+    monitor's connection and responses are reported to it.  Without one,
+    queries go directly to connection.
+    """
+
+    def __init__(
+        self,
+        connection=None,
+        health_monitor=None,
+        raw_capture:bool=False,
+        structured_values:bool=False,
+        units_lite:bool=False,
+        memo_decoder=None,
+        static_cache=None
+    ):
+        """Init function."""
+        self.obd_connection = connection
+        self.health_monitor = health_monitor
+        self.raw_capture = raw_capture
+        self.structured_values = structured_values
+        self.memo_decoder = memo_decoder if not raw_capture else None
+        self.static_cache = static_cache
+        self.value_encoder = None
+
+        if raw_capture or self.memo_decoder:
+            self.execute = execute_obd_raw_command
+        elif units_lite:
+            self.execute = execute_obd_lite_command
+        else:
+            self.execute = execute_obd_command
+
+    def start_file(self):
+        """New output file started."""
+        # units are interned per output file
+        self.value_encoder = StructuredValueEncoder() if self.structured_values else None
+
+        if self.static_cache:
+            self.static_cache.start_file()
+
+    def connection(self):
+        """Context manager yielding the OBD connection for exclusive use."""
+        if self.health_monitor:
+            return self.health_monitor.connection()
+        return nullcontext(self.obd_connection)
+
+    def run(self, command_name:str) -> list:
+        """
+        Query command_name and return the records to write in order:
+        UNIT records, the command's record and LINK_STATE records.
+        """
+        records = []
+
+        iso_ts_pre = datetime.isoformat(
+            datetime.now(tz=timezone.utc)
+        )
+
+        obd_response = None
+        protocol_id = None
+        query_connection = None
+        query_seconds = 0.0
+        # output record reused from static_cache
+        cached_record = None
+        # (cleaned value, error message) from memo_decoder
+        memo_value = (None, None, )
+
+        try:
+
+            with self.connection() as connection:
+                query_connection = connection
+
+                if self.static_cache:
+                    cached_record = self.static_cache.get(command_name, connection, self.value_encoder)
+
+                if cached_record is None:
+                    if self.raw_capture:
+                        protocol_id = connection.protocol_id()
+
+                    query_start = monotonic()
+                    obd_response = self.execute(connection, command_name)
+                    query_seconds = monotonic() - query_start
+
+            if self.memo_decoder and cached_record is None:
+                memo_value = self.memo_decoder.decode(command_name, obd_response, self.value_encoder)
+
+        except OffsetUnitCalculusError as e:
+            logging.exception(f"Exception: {e.__class__.__name__}: {e}")
+            logging.exception(f"OffsetUnitCalculusError on {command_name}, decoder must be fixed")
+            print_exc()
+
+        except Exception as e:
+            logging.exception(f"Exception: {e}")
+            print_exc()
+            if self.health_monitor:
+                self.health_monitor.record_exception(command_name, e)
+
+        iso_ts_post = datetime.isoformat(
+            datetime.now(tz=timezone.utc)
+        )
+
+        obd_error_message = None
+
+        if cached_record is not None:
+            logging.info(f"saving: {command_name}, cached, {iso_ts_pre}, {iso_ts_post}")
+
+            record = {
+                **cached_record,
+                'iso_ts_pre': iso_ts_pre,
+                'iso_ts_post': iso_ts_post,
+                'obd_response_cached': True,
+            }
+
+        else:
+            if self.raw_capture:
+                raw_messages = raw_obd_query_response(command_name, obd_response)
+                obd_error_message = get_obd_error_message(obd_response) if obd_response else None
+
+                logging.info(f"saving: {command_name}, {raw_messages}, {iso_ts_pre}, {iso_ts_post}")
+
+                record = {
+                    'command_name': command_name,
+                    'protocol_id': protocol_id,
+                    'raw_messages': raw_messages,
+                    'iso_ts_pre': iso_ts_pre,
+                    'iso_ts_post': iso_ts_post,
+                }
+            else:
+                if self.memo_decoder:
+                    obd_response_value, obd_error_message = memo_value
+                elif self.value_encoder:
+                    obd_response_value, obd_error_message = clean_obd_query_response_and_error(
+                        command_name, obd_response, normalizer=self.value_encoder.normalize
+                    )
+                else:
+                    obd_response_value, obd_error_message = clean_obd_query_response_and_error(command_name, obd_response)
+
+                logging.info(f"saving: {command_name}, {obd_response_value}, {iso_ts_pre}, {iso_ts_post}")
+
+                record = {
+                    'command_name': command_name,
+                    'obd_response_value': obd_response_value,
+                    'iso_ts_pre': iso_ts_pre,
+                    'iso_ts_post': iso_ts_post,
+                }
+
+                if self.value_encoder:
+                    obd_response_unit = self.value_encoder.pop_unit()
+                    if obd_response_unit is not None:
+                        record['obd_response_unit'] = obd_response_unit
+
+                    records += self.value_encoder.get_unit_records()
+
+            if obd_error_message:
+                # lets downstream tell "BUFFER FULL" from "NO DATA"
+                record['obd_error_message'] = obd_error_message
+
+            if self.static_cache and query_connection is not None:
+                self.static_cache.add(record, query_connection, query_seconds, self.value_encoder)
+
+        records.append(record)
+
+        if self.health_monitor:
+            if cached_record is None:
+                # cached responses say nothing about link health
+                self.health_monitor.record_response(command_name, obd_response, obd_error_message)
+
+            records += self.health_monitor.get_link_state_records()
+
+        return records
@@ -0,0 +1,306 @@
+# OBD Raw Capture Decoder
+# telemetry-obd/telemetry_obd/obd_raw_decoder.py
+"""
+Converts obd_logger --raw_capture output files into regular obd_logger output files.
+"""
+from argparse import ArgumentParser
+from functools import lru_cache
+from multiprocessing import Pool, cpu_count
+from pathlib import Path
+from sys import stdout
+from time import perf_counter
+from pint import OffsetUnitCalculusError
+import sys
+import json
+import logging
+from obd.elm327 import ELM327
+from obd.protocols import UnknownProtocol
+from .__init__ import __version__
+from .obd_common_functions import (
+    get_obd_command,
+    get_messages_obd_error_message,
+    clean_obd_query_response_value,
+)
+from .obd_log_reader import DECODED_FILE_SUFFIX
+
+logger = logging.getLogger(__name__)
+CHUNK_SIZE = 4 * 1024 * 1024        # bytes
+
+@lru_cache(maxsize=None)
+def get_protocol(protocol_id:str):
+    """
+    Return python-obd protocol object used to turn raw frames into messages.
+    Protocol objects are created without an ECU map because each captured
+    message already carries the ECU it was tagged with when captured.
+    """
+    if protocol_id in ELM327._SUPPORTED_PROTOCOLS:
+        return ELM327._SUPPORTED_PROTOCOLS[protocol_id]([])
+
+    logging.warning(f"unknown protocol_id {protocol_id}, using UnknownProtocol")
+    return UnknownProtocol([])
+
+def raw_record_to_messages(record:dict) -> list:
+    """
+    Rebuild python-obd Message objects from a raw capture record.
+    """
+    protocol = get_protocol(record['protocol_id'])
+
+    messages = []
+    for raw_message in record['raw_messages']:
+        for message in protocol(raw_message['frames']):
+            message.ecu = raw_message['ecu']
+            messages.append(message)
+
+    return messages
+
+@lru_cache(maxsize=None)
+def get_command(command_name:str):
+    """get_obd_command() logging unknown command names once per process."""
+    command = get_obd_command(command_name)
+    if command is None:
+        logging.warning(f"unknown command {command_name}, raw capture records passed through undecoded")
+
+    return command
+
+def decode_raw_record(record:dict) -> dict:
+    """
+    Decode a raw capture record into a regular obd_logger output record.
+    Records that aren't raw capture records (UNIT, LINK_STATE, ...) and
+    records for unknown commands are returned unchanged.  Records the
+    decoder raises on get "no response" with the exception as error message.
+    """
+    command_name = record.get('command_name')
+
+    if 'raw_messages' not in record:
+        logging.info(f"{command_name} record isn't a raw capture record, passed through")
+        return record
+
+    raw_messages = record['raw_messages']
+    obd_error_message = record.get('obd_error_message')
+
+    if raw_messages is None or raw_messages == "no response":
+        obd_response_value = raw_messages
+    else:
+        command = get_command(command_name)
+        if command is None:
+            return record
+
+        try:
+            messages = raw_record_to_messages(record)
+            if not obd_error_message:
+                # scan before command ECU filtering drops adapter error messages
+                obd_error_message = get_messages_obd_error_message(messages)
+
+            obd_response = command(messages)
+            obd_response_value = clean_obd_query_response_value(command_name, obd_response, obd_error_message)
+
+        except OffsetUnitCalculusError as e:
+            logging.exception(f"OffsetUnitCalculusError on {command_name}, decoder must be fixed: {e}")
+            obd_response_value = "no response"
+
+        except Exception as e:
+            # one undecodable record mustn't abort the whole file
+            logging.exception(f"{command_name}: decoder exception {e.__class__.__name__}: {e}")
+            obd_response_value = "no response"
+            obd_error_message = f"{e.__class__.__name__}: {e}"
+
+    decoded_record = {
+        'command_name': command_name,
+        'obd_response_value': obd_response_value,
+        'iso_ts_pre': record['iso_ts_pre'],
+        'iso_ts_post': record['iso_ts_post'],
+    }
+
+    if obd_error_message:
+        decoded_record['obd_error_message'] = obd_error_message
+
+    return decoded_record
+
+def decode_raw_lines(lines):
+    """
+    Generator decoding raw capture JSON lines into regular obd_logger JSON lines.
+    Lines that can't be parsed (e.g. truncated last line) are skipped.
+    """
+    for line_number, line in enumerate(lines, start=1):
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            logging.error(f"line {line_number}: JSONDecodeError: {e}")
+            continue
+
+        yield json.dumps(decode_raw_record(record)) + "\n"
+
+def get_decoded_file_path(raw_file_path:Path, output_dir:Path=None) -> Path:
+    """
+    Return output file path for decoded raw capture file.
+    """
+    if not output_dir:
+        output_dir = raw_file_path.parent
+
+    return Path(output_dir) / f"{raw_file_path.stem}{DECODED_FILE_SUFFIX}{raw_file_path.suffix}"
+
+def get_file_chunks(raw_file_path:Path, chunk_size:int=CHUNK_SIZE) -> list:
+    """
+    Split raw capture file into (raw_file_path, start, end) byte ranges of
+    about chunk_size bytes.  Ranges always start and end on line boundaries.
+    """
+    file_size = Path(raw_file_path).stat().st_size
+    chunks = []
+    start = 0
+
+    with open(raw_file_path, mode='rb') as raw_file:
+        while start < file_size:
+            raw_file.seek(min(start + chunk_size, file_size))
+            raw_file.readline()
+            end = min(raw_file.tell(), file_size)
+            chunks.append((raw_file_path, start, end, ))
+            start = end
+
+    return chunks
+
+def decode_raw_chunk(chunk:tuple) -> tuple:
+    """
+    Decode a (raw_file_path, start, end) byte range of a raw capture file.
+    Returns (decoded text, record count).  Runs in worker processes.
+    """
+    raw_file_path, start, end = chunk
+
+    with open(raw_file_path, mode='rb') as raw_file:
+        raw_file.seek(start)
+        lines = raw_file.read(end - start).decode('utf-8').splitlines()
+
+    decoded_lines = list(decode_raw_lines(lines))
+
+    return "".join(decoded_lines), len(decoded_lines)
+
+def decode_raw_files(file_paths:list, output_dir:Path=None, processes:int=1, chunk_size:int=CHUNK_SIZE) -> int:
+    """
+    Decode raw capture files sharding file chunks across a process pool.
+    Chunk results are written in order so that record order within each
+    decoded file matches the raw capture file.  Files given more than once
+    are decoded once.  Empty raw capture files get empty decoded files.
+    Returns record count.
+    """
+    chunks = []
+    decoded_file_paths = {}
+
+    for raw_file_path in file_paths:
+        raw_file_path = Path(raw_file_path)
+        decoded_file_path = get_decoded_file_path(raw_file_path, output_dir)
+
+        if raw_file_path.resolve() in decoded_file_paths or decoded_file_path in decoded_file_paths.values():
+            logging.warning(f"{raw_file_path} given more than once, decoded once")
+            continue
+
+        try:
+            # created up front so raw capture files without records get decoded files too
+            with open(decoded_file_path, mode='x', encoding='utf-8'):
+                pass
+        except FileExistsError:
+            logger.error(f"open(): FileExistsError: {decoded_file_path}")
+            continue
+
+        decoded_file_paths[raw_file_path.resolve()] = decoded_file_path
+        chunks += get_file_chunks(raw_file_path.resolve(), chunk_size)
+
+    record_count = 0
+    decoded_file = None
+    current_raw_file_path = None
+
+    with Pool(processes=processes) as pool:
+        for chunk, (decoded_text, chunk_record_count) in zip(chunks, pool.imap(decode_raw_chunk, chunks)):
+            raw_file_path = chunk[0]
+
+            if raw_file_path != current_raw_file_path:
+                if decoded_file:
+                    decoded_file.close()
+                logging.info(f"decoding {raw_file_path} to {decoded_file_paths[raw_file_path]}")
+                decoded_file = open(decoded_file_paths[raw_file_path], mode='a', encoding='utf-8')
+                current_raw_file_path = raw_file_path
+
+            decoded_file.write(decoded_text)
+            record_count += chunk_record_count
+
+    if decoded_file:
+        decoded_file.close()
+
+    return record_count
+
+def argument_parsing()-> dict:
+    """Argument parsing"""
+    parser = ArgumentParser(description="Telemetry OBD Raw Capture Decoder")
+    parser.add_argument(
+        "files",
+        nargs='+',
+        metavar="files",
+        help="obd_logger --raw_capture output files to decode."
+    )
+    parser.add_argument(
+        "--output_dir",
+        help="Decoded output file directory. Defaults to the raw capture file's directory.",
+        default=None
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=cpu_count(),
+        help=f"Number of decoder processes. Defaults to the number of CPU cores ({cpu_count()})."
+    )
+    parser.add_argument(
+        "--chunk_size",
+        type=int,
+        default=CHUNK_SIZE,
+        help=f"Large files are split into chunks of about this many bytes. Default is {CHUNK_SIZE}."
+    )
+    parser.add_argument(
+        "--verbose",
+        help="Turn verbose output on. Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--version",
+        help="Print version number and exit.",
+        default=False,
+        action='store_true'
+    )
+    return vars(parser.parse_args())
+
+def main():
+    """Run main function."""
+
+    args = argument_parsing()
+
+    if args['version']:
+        print(f"Version {__version__}", file=stdout)
+        exit(0)
+
+    logging_level = logging.WARNING
+
+    if args['verbose']:
+        logging_level = logging.INFO
+
+    logging.basicConfig(stream=sys.stdout, level=logging_level)
+
+    processes = max(1, args['processes'])
+
+    start_time = perf_counter()
+    record_count = decode_raw_files(
+        args['files'],
+        output_dir=args['output_dir'],
+        processes=processes,
+        chunk_size=args['chunk_size']
+    )
+    elapsed_time = perf_counter() - start_time
+
+    records_per_second = record_count / elapsed_time if elapsed_time else 0.0
+
+    print(
+        f"decoded {record_count} records in {elapsed_time:.3f} seconds using {processes} processes: " +
+        f"{records_per_second:.1f} records/second, {records_per_second / processes:.1f} records/second/core",
+        file=stdout
+    )
+
+
+if __name__ == "__main__":
+    main()
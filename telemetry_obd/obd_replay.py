@@ -0,0 +1,362 @@
+# OBD Log Replay
+# telemetry-obd/telemetry_obd/obd_replay.py
+"""
+Replays recorded drives through obd_logger's processing pipeline
+(CommandPipeline) to measure decode, serialization and output changes
+against the same data every time, no vehicle required.
+
+ReplayOBD stands in for the obd.OBD connection.  Each recorded record is
+queried in file order and the connection answers with the recorded
+response at its recorded time (iso_ts_post) relative to the first record,
+divided by --speed, so both query latency and the time between records
+are replayed.  --speed 0 doesn't wait (as fast as possible).  Gaps longer
+than MAX_GAP_SECONDS (between drives) and clock jumps backwards restart
+the schedule from the next record instead of waiting.
+
+- Raw capture records (obd_logger --raw_capture) are rebuilt into python-obd
+  messages and decoded by the queried command, same as a vehicle response.
+- Decoded records return their recorded obd_response_value without
+  decoding.  Replaying them with --raw_capture or --memo_decode isn't
+  possible since there are no messages to capture or decode.
+
+UNIT and LINK_STATE records are produced by the pipeline and aren't replayed.
+
+    python3.11 -m telemetry_obd.obd_replay data/FT8W4DT5HED00000/FT8W4DT5HED00000-1-obd-raw.json --speed 0
+"""
+from argparse import ArgumentParser
+from os import devnull
+from sys import stdout
+from time import perf_counter, sleep
+import sys
+import logging
+from obd import OBDStatus
+from obd.OBDResponse import OBDResponse
+from obd.protocols.protocol import Frame, Message
+from rich.console import Console
+from rich.table import Table
+from .__init__ import __version__
+from .obd_common_functions import UNIT_COMMAND_NAME
+from .obd_health_monitor import LINK_STATE_COMMAND_NAME
+from .obd_log_reader import read_log_records
+from .obd_memo_decoder import MemoizedDecoder, MEMO_CACHE_SIZE
+from .obd_pipeline import CommandPipeline, write_record
+from .obd_raw_decoder import raw_record_to_messages
+from .obd_static_cache import (
+    StaticValueCache,
+    STATIC_CACHE_POLICIES,
+    STATIC_COMMANDS,
+)
+from .obd_synthetic_responses import CAN_11_500
+
+logger = logging.getLogger(__name__)
+
+SPEED = 1.0
+MAX_GAP_SECONDS = 60.0
+
+# records the pipeline writes itself
+SKIP_COMMAND_NAMES = {UNIT_COMMAND_NAME, LINK_STATE_COMMAND_NAME, }
+
+def is_raw_record(record:dict) -> bool:
+    """True for obd_logger --raw_capture records."""
+    return 'raw_messages' in record
+
+class ReplayOBD():
+    """
+    obd.OBD stand-in answering queries with the current recorded record.
+    """
+
+    def __init__(self, speed:float=SPEED):
+        """Init function.  speed 0 skips waits."""
+        self.speed = speed
+        self.log_record = None
+        self.waited_seconds = 0.0
+        # recorded time and perf_counter() time the schedule started at
+        self.first_ts = None
+        self.start_time = None
+        self.last_ts = None
+
+    def set_log_record(self, log_record):
+        """Set the LogRecord the next query answers with."""
+        self.log_record = log_record
+
+    def is_connected(self) -> bool:
+        return True
+
+    def status(self) -> str:
+        return OBDStatus.CAR_CONNECTED
+
+    def protocol_id(self) -> str:
+        """Recorded protocol id for raw capture records."""
+        return self.log_record.record.get('protocol_id') or CAN_11_500
+
+    def close(self):
+        pass
+
+    def wait(self):
+        """Wait until the recorded response time adjusted for speed."""
+        if self.speed <= 0:
+            return
+
+        ts_pre = self.log_record.ts_pre
+        ts_post = self.log_record.ts_post
+        if ts_pre is None or ts_post is None:
+            return
+
+        if (
+            self.first_ts is None or
+            ts_pre < self.last_ts or
+            (ts_pre - self.last_ts).total_seconds() > MAX_GAP_SECONDS
+        ):
+            # first record, clock jump or gap between drives
+            self.first_ts = ts_pre
+            self.start_time = perf_counter()
+        self.last_ts = ts_post
+
+        # pipeline time since the last response counts against the wait
+        seconds = (
+            self.start_time + (ts_post - self.first_ts).total_seconds() / self.speed -
+            perf_counter()
+        )
+        if seconds > 0:
+            # sleep() overshoot counts as waiting, not pipeline time
+            start_time = perf_counter()
+            sleep(seconds)
+            self.waited_seconds += perf_counter() - start_time
+
+    def query(self, cmd, force:bool=False) -> OBDResponse:
+        """Recorded response for cmd, same as obd.OBD.query()."""
+        if self.log_record is None or self.log_record.command_name != cmd.name:
+            logging.warning(f"replay: no recorded response for {cmd.name}")
+            return OBDResponse()
+
+        self.wait()
+        record = self.log_record.record
+
+        if is_raw_record(record):
+            if not isinstance(record['raw_messages'], list):
+                # None or "no response"
+                return OBDResponse()
+            return cmd(raw_record_to_messages(record))
+
+        obd_error_message = record.get('obd_error_message')
+        if obd_error_message:
+            # adapter error text in a frame, found by get_obd_error_message()
+            return OBDResponse(cmd, [Message([Frame(obd_error_message), ]), ])
+
+        value = record.get('obd_response_value')
+        if value is None or value == "no response":
+            return OBDResponse()
+
+        obd_response = OBDResponse(cmd, [Message([Frame(""), ]), ])
+        obd_response.value = value
+        return obd_response
+
+def replay_log_records(log_records, pipeline:CommandPipeline, connection:ReplayOBD, out_file) -> dict:
+    """
+    Run LogRecord objects through pipeline answering queries from
+    connection, writing output records to out_file.  Returns statistics.
+    """
+    statistics = {
+        'files': 0,
+        'commands': 0,
+        'records': 0,
+        'recorded_seconds': 0.0,
+        'elapsed_seconds': 0.0,
+        'waited_seconds': 0.0,
+    }
+    file_path = None
+    first_ts = None
+    last_ts = None
+
+    start_time = perf_counter()
+
+    for log_record in log_records:
+        if log_record.command_name in SKIP_COMMAND_NAMES:
+            continue
+
+        if not is_raw_record(log_record.record) and (pipeline.raw_capture or pipeline.memo_decoder):
+            raise ValueError(
+                f"{log_record.file_path}: decoded records can't be replayed with --raw_capture or --memo_decode"
+            )
+
+        if log_record.file_path != file_path:
+            file_path = log_record.file_path
+            statistics['files'] += 1
+            logging.info(f"replaying {file_path}")
+            pipeline.start_file()
+
+        if log_record.ts_pre is not None:
+            first_ts = first_ts or log_record.ts_pre
+            last_ts = log_record.ts_pre
+
+        connection.set_log_record(log_record)
+
+        for record in pipeline.run(log_record.command_name):
+            write_record(out_file, record)
+            statistics['records'] += 1
+
+        statistics['commands'] += 1
+
+    statistics['elapsed_seconds'] = perf_counter() - start_time
+    statistics['waited_seconds'] = connection.waited_seconds
+    statistics['recorded_seconds'] = (last_ts - first_ts).total_seconds() if first_ts is not None else 0.0
+
+    return statistics
+
+def rich_print(statistics:dict):
+    console = Console()
+
+    commands = statistics['commands']
+    elapsed_seconds = statistics['elapsed_seconds']
+    pipeline_seconds = elapsed_seconds - statistics['waited_seconds']
+
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("Replay", justify='left')
+    table.add_column("Value", justify='right')
+
+    table.add_row("Files", str(statistics['files']))
+    table.add_row("Commands", str(commands))
+    table.add_row("Output records", str(statistics['records']))
+    table.add_row("Recorded seconds", f"{statistics['recorded_seconds']:.3f}")
+    table.add_row("Replay seconds", f"{elapsed_seconds:.3f}")
+    table.add_row("Latency wait seconds", f"{statistics['waited_seconds']:.3f}")
+    table.add_row("Commands per second", f"{commands / elapsed_seconds:.1f}" if elapsed_seconds > 0 else "-")
+    table.add_row(
+        "Records per second",
+        f"{statistics['records'] / elapsed_seconds:.1f}" if elapsed_seconds > 0 else "-"
+    )
+    table.add_row("Pipeline µs per command", f"{pipeline_seconds / commands * 1000000:.1f}" if commands else "-")
+
+    console.print(table)
+
+def argument_parsing()-> dict:
+    """Argument parsing"""
+    parser = ArgumentParser(description="Telemetry OBD Log Replay")
+    parser.add_argument(
+        "files",
+        nargs='+',
+        metavar="files",
+        help="obd_logger output files, raw capture files or directories of them to replay."
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=SPEED,
+        help=f"Replay speed multiplier for recorded times, 0 for as fast as possible. Default is {SPEED}."
+    )
+    parser.add_argument(
+        "--raw_capture",
+        help="Replay with obd_logger --raw_capture. Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--structured_values",
+        help="Replay with obd_logger --structured_values. Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--units_lite",
+        help="Replay with obd_logger --units_lite. Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--memo_decode",
+        help="Replay with obd_logger --memo_decode. Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--memo_cache_size",
+        type=int,
+        default=MEMO_CACHE_SIZE,
+        help=f"Maximum number of responses cached by --memo_decode.  Default is {MEMO_CACHE_SIZE}."
+    )
+    parser.add_argument(
+        "--static_cache",
+        choices=STATIC_CACHE_POLICIES,
+        default=None,
+        help="Replay with obd_logger --static_cache. Default is off."
+    )
+    parser.add_argument(
+        "--static_commands",
+        default=",".join(STATIC_COMMANDS),
+        help=f"Comma separated command names cached by --static_cache.  Default is '{','.join(STATIC_COMMANDS)}'."
+    )
+    parser.add_argument(
+        "--output_file",
+        help="Replay output file. Must not exist. Default is to discard output.",
+        default=None
+    )
+    parser.add_argument(
+        "--verbose",
+        help="Turn verbose output on. Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--version",
+        help="Print version number and exit.",
+        default=False,
+        action='store_true'
+    )
+    return vars(parser.parse_args())
+
+def main():
+    """Run main function."""
+
+    args = argument_parsing()
+
+    if args['version']:
+        print(f"Version {__version__}", file=stdout)
+        exit(0)
+
+    logging_level = logging.WARNING
+
+    if args['verbose']:
+        logging_level = logging.INFO
+
+    logging.basicConfig(stream=sys.stdout, level=logging_level)
+
+    raw_capture = args['raw_capture']
+    memo_decoder = (
+        MemoizedDecoder(cache_size=args['memo_cache_size'], units_lite=args['units_lite'])
+        if args['memo_decode'] and not raw_capture else None
+    )
+    static_commands = [command_name for command_name in args['static_commands'].split(',') if command_name]
+    static_cache = StaticValueCache(args['static_cache'], static_commands) if args['static_cache'] else None
+
+    connection = ReplayOBD(speed=args['speed'])
+    pipeline = CommandPipeline(
+        connection=connection,
+        raw_capture=raw_capture,
+        structured_values=args['structured_values'],
+        units_lite=args['units_lite'],
+        memo_decoder=memo_decoder,
+        static_cache=static_cache
+    )
+
+    def log_records():
+        for path in args['files']:
+            yield from read_log_records(path)
+
+    with open(args['output_file'] or devnull, mode='x' if args['output_file'] else 'w', encoding='utf-8') as out_file:
+        try:
+            statistics = replay_log_records(log_records(), pipeline, connection, out_file)
+        except ValueError as e:
+            logging.error(f"ValueError: {e}")
+            exit(1)
+
+    if memo_decoder:
+        memo_decoder.log_statistics()
+
+    if static_cache:
+        static_cache.log_statistics()
+
+    rich_print(statistics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+# OBD Shared Values
+# telemetry-obd/telemetry_obd/obd_shared_values.py
+"""
+Latest value table in shared memory (obd_logger --shared_values NAME).
+
+obd_logger publishes the latest cleaned value and timestamps of every
+command into a fixed layout multiprocessing.shared_memory block so that
+processes running alongside it (GPS, weather and IMU loggers, dashboards)
+can read current values without serialization or system calls.
+
+Layout (little endian):
+    header (HEADER_SIZE bytes): magic, layout version, slot count, slot size
+    slot_count slots of slot size bytes, one per command:
+        sequence      uint64, odd while the slot is being written
+        command_name  32 bytes UTF-8, NUL padded
+        ts_pre        float64 seconds since epoch (iso_ts_pre)
+        ts_post       float64 seconds since epoch (iso_ts_post)
+        kind          uint8, NO_VALUE, NUMBER or TEXT
+        magnitude     float64, NUMBER values
+        unit          24 bytes UTF-8, NUL padded, NUMBER values
+        text_length   uint16
+        text          TEXT_SIZE bytes, TEXT values as JSON, truncated to fit
+
+Slots are written by one writer using a sequence lock: the sequence is
+incremented before and after writing.  Readers copy a slot and retry
+when the sequence was odd or changed during the copy.
+
+Commands get slots as they are first published.  The block outlives
+obd_logger restarts that use the same name: a restarted writer reuses
+existing slots, so readers stay attached.
+
+    from telemetry_obd.obd_shared_values import SharedValuesReader
+
+    reader = SharedValuesReader("TELEMETRY_OBD")
+    print(reader.get("RPM"))
+"""
+from argparse import ArgumentParser
+from datetime import datetime
+from math import isnan
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from sys import stdout
+from time import time
+import sys
+import json
+import logging
+import struct
+from rich.console import Console
+from rich.markup import escape
+from rich.table import Table
+from .__init__ import __version__
+from .obd_common_functions import UNIT_COMMAND_NAME
+from .obd_health_monitor import LINK_STATE_COMMAND_NAME
+from .obd_log_reader import get_value_items
+
+logger = logging.getLogger(__name__)
+
+SHARED_VALUES_NAME = "TELEMETRY_OBD"
+SHARED_VALUES_SLOTS = 256
+LAYOUT_VERSION = 1
+MAGIC = b"OBDV"
+
+COMMAND_NAME_SIZE = 32
+UNIT_SIZE = 24
+TEXT_SIZE = 192
+READ_RETRIES = 100
+
+# value kinds
+NO_VALUE = 0
+NUMBER = 1
+TEXT = 2
+
+HEADER = struct.Struct("<4sHHI")
+HEADER_SIZE = 16
+SEQUENCE = struct.Struct("<Q")
+SLOT = struct.Struct(f"<{COMMAND_NAME_SIZE}sddBd{UNIT_SIZE}sH{TEXT_SIZE}s")
+# 8 byte aligned slots keep every sequence counter 8 byte aligned
+SLOT_SIZE = (SEQUENCE.size + SLOT.size + 7) // 8 * 8
+
+# records that aren't command values
+SKIP_COMMAND_NAMES = {UNIT_COMMAND_NAME, LINK_STATE_COMMAND_NAME, }
+
+def get_shared_values_size(slot_count:int) -> int:
+    """Shared memory block size in bytes for slot_count slots."""
+    return HEADER_SIZE + slot_count * SLOT_SIZE
+
+def get_timestamp(iso_ts:str) -> float:
+    """iso_ts as seconds since epoch, NaN when missing."""
+    return datetime.fromisoformat(iso_ts).timestamp() if iso_ts else float('nan')
+
+def decode_name(name:bytes) -> str:
+    """NUL padded UTF-8 bytes to str."""
+    return name.rstrip(b"\0").decode('utf-8')
+
+class SharedValuesWriter():
+    """
+    Publishes obd_logger records into the shared memory latest value table.
+    Only one writer per table.
+    """
+
+    def __init__(self, name:str=SHARED_VALUES_NAME, slot_count:int=SHARED_VALUES_SLOTS):
+        """Init function.  Creates the shared memory block or reuses a compatible one."""
+        self.name = name
+        self.slot_count = slot_count
+        self.size = get_shared_values_size(slot_count)
+        # command name to slot number
+        self.slots = {}
+        # slot number to sequence
+        self.sequences = {}
+        # --structured_values unit ids are per output file
+        self.unit_strings = {}
+
+        try:
+            self.shared_memory = SharedMemory(name=name, create=True, size=self.size)
+            HEADER.pack_into(self.shared_memory.buf, 0, MAGIC, LAYOUT_VERSION, slot_count, SLOT_SIZE)
+        except FileExistsError:
+            self.shared_memory = SharedMemory(name=name)
+            magic, version, existing_slot_count, slot_size = HEADER.unpack_from(self.shared_memory.buf, 0)
+            if (magic, version, existing_slot_count, slot_size, ) != (MAGIC, LAYOUT_VERSION, slot_count, SLOT_SIZE, ):
+                raise ValueError(f"shared memory {name} exists with a different layout")
+            logging.info(f"shared values: reusing shared memory {name}")
+            self.load_slots()
+
+        # the table outlives the writer unless close() unlinks it
+        resource_tracker.unregister(self.shared_memory._name, "shared_memory")
+        self.buffer = self.shared_memory.buf
+
+    def load_slots(self):
+        """Pick up slots from an existing table."""
+        buffer = self.shared_memory.buf
+        for slot in range(self.slot_count):
+            offset = HEADER_SIZE + slot * SLOT_SIZE
+            sequence = SEQUENCE.unpack_from(buffer, offset)[0]
+            command_name = decode_name(SLOT.unpack_from(buffer, offset + SEQUENCE.size)[0])
+            if command_name:
+                self.slots[command_name] = slot
+            # even so readers don't wait on a writer that died mid write
+            self.sequences[slot] = sequence + (sequence & 1)
+
+    def start_file(self):
+        """New output file started, forget --structured_values unit ids."""
+        self.unit_strings = {}
+
+    def get_slot(self, command_name:str) -> int:
+        """Slot number for command_name, assigned on first use.  None when the table is full."""
+        slot = self.slots.get(command_name)
+        if slot is None:
+            if len(self.slots) >= self.slot_count:
+                logging.warning(f"shared values: no free slot for {command_name}")
+                return None
+            slot = self.slots[command_name] = len(self.slots)
+        return slot
+
+    def publish(self, record:dict):
+        """Publish an obd_logger record's value and timestamps."""
+        command_name = record['command_name']
+
+        if command_name in SKIP_COMMAND_NAMES:
+            if command_name == UNIT_COMMAND_NAME:
+                unit_id, unit_string = record['obd_response_value']
+                self.unit_strings[unit_id] = unit_string
+            return
+
+        slot = self.get_slot(command_name)
+        if slot is None:
+            return
+
+        value = record.get('obd_response_value')
+        kind = NO_VALUE
+        magnitude = float('nan')
+        unit = None
+        text = b""
+
+        if value is not None and value != "no response":
+            if not isinstance(value, (list, dict, )):
+                _, number, unit = get_value_items(value, record.get('obd_response_unit'), self.unit_strings)[0]
+                if number is not None:
+                    kind = NUMBER
+                    magnitude = number
+
+            if kind == NO_VALUE:
+                kind = TEXT
+                text = json.dumps(value).encode('utf-8')[:TEXT_SIZE]
+
+        offset = HEADER_SIZE + slot * SLOT_SIZE
+        sequence = self.sequences.get(slot, 0)
+
+        SEQUENCE.pack_into(self.buffer, offset, sequence + 1)
+        SLOT.pack_into(
+            self.buffer,
+            offset + SEQUENCE.size,
+            command_name.encode('utf-8')[:COMMAND_NAME_SIZE],
+            get_timestamp(record.get('iso_ts_pre')),
+            get_timestamp(record.get('iso_ts_post')),
+            kind,
+            magnitude,
+            (unit or "").encode('utf-8')[:UNIT_SIZE],
+            len(text),
+            text
+        )
+        SEQUENCE.pack_into(self.buffer, offset, sequence + 2)
+
+        self.sequences[slot] = sequence + 2
+
+    def close(self, unlink:bool=True):
+        """Detach and, by default, remove the shared memory block."""
+        self.buffer = None
+        self.shared_memory.close()
+        if unlink:
+            # unlink() unregisters from the resource tracker
+            resource_tracker.register(self.shared_memory._name, "shared_memory")
+            self.shared_memory.unlink()
+
+class SharedValuesReader():
+    """
+    Reads the latest values published by SharedValuesWriter from another
+    process.
+    """
+
+    def __init__(self, name:str=SHARED_VALUES_NAME):
+        """Init function.  Raises FileNotFoundError when there's no table."""
+        self.name = name
+        self.shared_memory = SharedMemory(name=name)
+        # readers don't own the block, keep the resource tracker from removing it at exit
+        resource_tracker.unregister(self.shared_memory._name, "shared_memory")
+
+        magic, version, self.slot_count, slot_size = HEADER.unpack_from(self.shared_memory.buf, 0)
+        if magic != MAGIC or version != LAYOUT_VERSION or slot_size != SLOT_SIZE:
+            self.shared_memory.close()
+            raise ValueError(f"shared memory {name} isn't a version {LAYOUT_VERSION} shared values table")
+
+        self.buffer = self.shared_memory.buf
+        # command name to slot number
+        self.slots = {}
+
+    def read_slot(self, slot:int) -> tuple:
+        """Consistent copy of a slot's fields or None when the writer kept changing it."""
+        offset = HEADER_SIZE + slot * SLOT_SIZE
+
+        for _ in range(READ_RETRIES):
+            sequence = SEQUENCE.unpack_from(self.buffer, offset)[0]
+            if sequence & 1:
+                continue
+            fields = SLOT.unpack_from(self.buffer, offset + SEQUENCE.size)
+            if SEQUENCE.unpack_from(self.buffer, offset)[0] == sequence:
+                return fields
+
+        return None
+
+    def find_slots(self):
+        """Map command names to slots, picking up newly published commands."""
+        for slot in range(len(self.slots), self.slot_count):
+            fields = self.read_slot(slot)
+            if fields is None:
+                continue
+            command_name = decode_name(fields[0])
+            if not command_name:
+                break
+            self.slots[command_name] = slot
+
+    def command_names(self) -> list:
+        """Published command names."""
+        self.find_slots()
+        return list(self.slots)
+
+    def get(self, command_name:str) -> dict:
+        """
+        Latest value of command_name or None when it hasn't been published:
+        {'command_name', 'value', 'unit', 'ts_pre', 'ts_post'}.  value is a
+        float, the cleaned value as JSON text or None for "no response".
+        """
+        slot = self.slots.get(command_name)
+        if slot is None:
+            self.find_slots()
+            slot = self.slots.get(command_name)
+            if slot is None:
+                return None
+
+        fields = self.read_slot(slot)
+        if fields is None:
+            return None
+
+        _, ts_pre, ts_post, kind, magnitude, unit, text_length, text = fields
+
+        if kind == NUMBER:
+            value = magnitude
+        elif kind == TEXT:
+            value = text[:text_length].decode('utf-8', errors='replace')
+        else:
+            value = None
+
+        return {
+            'command_name': command_name,
+            'value': value,
+            'unit': decode_name(unit) or None,
+            'ts_pre': ts_pre,
+            'ts_post': ts_post,
+        }
+
+    def close(self):
+        """Detach from the shared memory block."""
+        self.buffer = None
+        self.shared_memory.close()
+
+def rich_print(reader:SharedValuesReader, command_names:list=None):
+    console = Console()
+    now = time()
+
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("Command", justify='left')
+    table.add_column("Value", justify='right')
+    table.add_column("Unit", justify='left')
+    table.add_column("Age Seconds", justify='right')
+
+    for command_name in command_names or sorted(reader.command_names()):
+        shared_value = reader.get(command_name)
+        if shared_value is None:
+            table.add_row(command_name, "-", "-", "-")
+            continue
+
+        table.add_row(
+            command_name,
+            "no response" if shared_value['value'] is None else escape(str(shared_value['value'])),
+            shared_value['unit'] or "",
+            "-" if isnan(shared_value['ts_post']) else f"{now - shared_value['ts_post']:.3f}",
+        )
+
+    console.print(table)
+
+def argument_parsing()-> dict:
+    """Argument parsing"""
+    parser = ArgumentParser(description="Telemetry OBD Shared Values")
+    parser.add_argument(
+        "name",
+        nargs='?',
+        metavar="name",
+        default=SHARED_VALUES_NAME,
+        help=f"Shared values table name (obd_logger --shared_values). Defaults to '{SHARED_VALUES_NAME}'."
+    )
+    parser.add_argument(
+        "--command_names",
+        help="Comma separated command names to show. Default is every published command.",
+        default=None
+    )
+    parser.add_argument(
+        "--verbose",
+        help="Turn verbose output on. Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--version",
+        help="Print version number and exit.",
+        default=False,
+        action='store_true'
+    )
+    return vars(parser.parse_args())
+
+def main():
+    """Run main function."""
+
+    args = argument_parsing()
+
+    if args['version']:
+        print(f"Version {__version__}", file=stdout)
+        exit(0)
+
+    logging_level = logging.WARNING
+
+    if args['verbose']:
+        logging_level = logging.INFO
+
+    logging.basicConfig(stream=sys.stdout, level=logging_level)
+
+    command_names = None
+    if args['command_names']:
+        command_names = [command_name for command_name in args['command_names'].split(',') if command_name]
+
+    try:
+        reader = SharedValuesReader(args['name'])
+    except (FileNotFoundError, ValueError, ) as e:
+        logging.error(f"{e.__class__.__name__}: {e}")
+        exit(1)
+
+    rich_print(reader, command_names)
+    reader.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+# OBD SQLite Sink
+# telemetry-obd/telemetry_obd/obd_sqlite_sink.py
+"""
+Writes obd_logger records to a SQLite database (obd_logger --sqlite_file)
+so that data can be queried on the vehicle.
+
+The database runs in WAL mode so readers don't block the logger.  Records
+are buffered and inserted in one transaction per batch: every batch_size
+records, after batch_seconds or when an output file is closed.  JSON output
+files are fsync'ed after every record and remain the record of truth.
+synchronous=FULL makes each committed batch durable, so at most one
+uncommitted batch is missing from the database after a power loss.
+New command and unit ids are inserted in the batch transaction.
+
+The database is secondary output.  A database error (full storage,
+locked or corrupt database) is logged and disables the sink, logging
+to JSON output files continues.
+
+Tables:
+    commands(command_id, command_name)
+    units(unit_id, unit)
+    records(record_id, command_id, iso_ts_pre, iso_ts_post, value,
+            magnitude, unit_id, error_message, cached, extra)
+
+value is obd_response_value as JSON.  magnitude and unit_id are set for
+single number responses ("25 degC", --structured_values magnitudes with
+their UNIT record units).  extra holds any other record fields
+(raw_messages, protocol_id, ...) as JSON.  UNIT records aren't stored,
+their units are in the units table.  Records are indexed by
+(command_id, iso_ts_pre) and the record_values view joins in names:
+
+    sqlite3 obd.db "SELECT iso_ts_pre, magnitude, unit FROM record_values WHERE command_name = 'RPM'"
+"""
+from time import monotonic
+import json
+import logging
+import sqlite3
+from .obd_common_functions import UNIT_COMMAND_NAME
+from .obd_log_reader import get_value_items
+
+logger = logging.getLogger(__name__)
+
+SQLITE_BATCH_SIZE = 100             # records
+SQLITE_BATCH_SECONDS = 5.0          # seconds
+
+# record fields with their own records table column
+RECORD_COLUMNS = {
+    'command_name',
+    'obd_response_value',
+    'obd_response_unit',
+    'iso_ts_pre',
+    'iso_ts_post',
+    'obd_error_message',
+    'obd_response_cached',
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS commands (
+    command_id INTEGER PRIMARY KEY,
+    command_name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS units (
+    unit_id INTEGER PRIMARY KEY,
+    unit TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS records (
+    record_id INTEGER PRIMARY KEY,
+    command_id INTEGER NOT NULL REFERENCES commands (command_id),
+    iso_ts_pre TEXT,
+    iso_ts_post TEXT,
+    value TEXT,
+    magnitude REAL,
+    unit_id INTEGER REFERENCES units (unit_id),
+    error_message TEXT,
+    cached INTEGER NOT NULL DEFAULT 0,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS records_command_ts ON records (command_id, iso_ts_pre);
+CREATE VIEW IF NOT EXISTS record_values AS
+    SELECT
+        records.record_id, commands.command_name, records.iso_ts_pre, records.iso_ts_post,
+        records.value, records.magnitude, units.unit, records.error_message, records.cached, records.extra
+    FROM records
+    JOIN commands USING (command_id)
+    LEFT JOIN units USING (unit_id);
+"""
+
+INSERT_RECORD = """
+INSERT INTO records (command_id, iso_ts_pre, iso_ts_post, value, magnitude, unit_id, error_message, cached, extra)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+class SQLiteSink():
+    """
+    Batched record inserts into a SQLite database.  Not thread safe, use
+    from the logging thread only.
+    """
+
+    def __init__(
+        self,
+        database_path,
+        batch_size:int=SQLITE_BATCH_SIZE,
+        batch_seconds:float=SQLITE_BATCH_SECONDS
+    ):
+        """Init function."""
+        self.database_path = database_path
+        self.batch_size = max(1, batch_size)
+        self.batch_seconds = batch_seconds
+
+        # transactions are started explicitly
+        self.connection = sqlite3.connect(database_path, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=FULL")
+        self.connection.executescript(SCHEMA)
+
+        self.command_ids = dict(
+            (command_name, command_id, )
+            for command_id, command_name in self.connection.execute("SELECT command_id, command_name FROM commands")
+        )
+        self.unit_ids = dict(
+            (unit, unit_id, )
+            for unit_id, unit in self.connection.execute("SELECT unit_id, unit FROM units")
+        )
+
+        # --structured_values unit ids are per output file
+        self.unit_strings = {}
+
+        # (command name, unit, ...) rows, ids are looked up in the batch transaction
+        self.rows = []
+        self.batch_start = monotonic()
+        self.records = 0
+        self.commits = 0
+        self.disabled = False
+
+    def get_id(self, ids:dict, table:str, id_column:str, name_column:str, name:str) -> int:
+        """Normalized table id for name, added when new."""
+        row_id = ids.get(name)
+        if row_id is None:
+            self.connection.execute(f"INSERT OR IGNORE INTO {table} ({name_column}) VALUES (?)", (name, ))
+            row_id = self.connection.execute(
+                f"SELECT {id_column} FROM {table} WHERE {name_column} = ?", (name, )
+            ).fetchone()[0]
+            ids[name] = row_id
+        return row_id
+
+    def get_command_id(self, command_name:str) -> int:
+        """commands table id for command_name."""
+        return self.get_id(self.command_ids, "commands", "command_id", "command_name", command_name)
+
+    def get_unit_id(self, unit:str) -> int:
+        """units table id for unit or None."""
+        if unit is None:
+            return None
+        return self.get_id(self.unit_ids, "units", "unit_id", "unit", unit)
+
+    def get_row_ids(self, row:tuple) -> tuple:
+        """records table row with command name and unit replaced by their ids."""
+        command_name, iso_ts_pre, iso_ts_post, value, magnitude, unit, error_message, cached, extra = row
+        return (
+            self.get_command_id(command_name), iso_ts_pre, iso_ts_post, value, magnitude,
+            self.get_unit_id(unit), error_message, cached, extra,
+        )
+
+    def start_file(self):
+        """New output file started: commit pending records and forget --structured_values unit ids."""
+        self.commit()
+        self.unit_strings = {}
+
+    def disable(self, error:Exception):
+        """Log a database error and stop writing to the database."""
+        logging.error(
+            f"sqlite: {self.database_path}: {error.__class__.__name__}: {error}, " +
+            "SQLite output disabled, output files continue"
+        )
+        self.disabled = True
+        self.rows = []
+
+        try:
+            self.connection.close()
+        except sqlite3.Error:
+            pass
+
+    def add_record(self, record:dict):
+        """Add an obd_logger record, committing when the batch is full or old."""
+        if self.disabled:
+            return
+
+        command_name = record['command_name']
+
+        if command_name == UNIT_COMMAND_NAME:
+            unit_id, unit_string = record['obd_response_value']
+            self.unit_strings[unit_id] = unit_string
+            return
+
+        magnitude = None
+        unit = None
+        value = record.get('obd_response_value')
+
+        if not isinstance(value, (list, dict, )):
+            _, magnitude, unit = get_value_items(value, record.get('obd_response_unit'), self.unit_strings)[0]
+
+        extra = {key: item for key, item in record.items() if key not in RECORD_COLUMNS}
+
+        self.rows.append((
+            command_name,
+            record.get('iso_ts_pre'),
+            record.get('iso_ts_post'),
+            json.dumps(value),
+            magnitude,
+            unit if magnitude is not None else None,
+            record.get('obd_error_message'),
+            1 if record.get('obd_response_cached') else 0,
+            json.dumps(extra) if extra else None,
+        ))
+
+        if len(self.rows) >= self.batch_size or monotonic() - self.batch_start >= self.batch_seconds:
+            self.commit()
+
+    def commit(self):
+        """Insert pending records in one transaction.  Database errors disable the sink."""
+        if self.rows and not self.disabled:
+            try:
+                with self.connection:
+                    self.connection.execute("BEGIN")
+                    self.connection.executemany(INSERT_RECORD, [self.get_row_ids(row) for row in self.rows])
+            except sqlite3.Error as e:
+                self.disable(e)
+                return
+
+            self.records += len(self.rows)
+            self.commits += 1
+            self.rows = []
+
+        self.batch_start = monotonic()
+
+    def close(self):
+        """Commit pending records and close the database."""
+        if self.disabled:
+            return
+
+        self.commit()
+        if not self.disabled:
+            self.connection.close()
+        logging.info(f"sqlite: {self.database_path}: {self.records} records in {self.commits} transactions")
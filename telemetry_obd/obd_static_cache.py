@@ -0,0 +1,105 @@
+# OBD Static Value Cache
+# telemetry-obd/telemetry_obd/obd_static_cache.py
+"""
+Session cache for OBD commands whose values can't change while the
+vehicle is connected (obd_logger --static_cache).
+
+VIN, CALIBRATION_ID, CVN, ECU_NAME and ESN are slow multi-frame requests.
+Once a static command has responded, its output record (cleaned value)
+is served from the cache instead of querying the vehicle again:
+
+    - "connection" policy: query once per OBD connection.  The cache is
+      invalidated when the health monitor reconnects.
+    - "file" policy: query once per output file so that every output file
+      has a real response for each static command.
+
+Bus time saved is the query time of the cached response for every cache hit.
+"""
+import logging
+
+STATIC_COMMANDS = ["VIN", "CALIBRATION_ID", "CVN", "ECU_NAME", "ESN", ]
+
+CONNECTION_POLICY = "connection"
+FILE_POLICY = "file"
+STATIC_CACHE_POLICIES = [CONNECTION_POLICY, FILE_POLICY, ]
+
+class StaticValueCache():
+    """
+    Caches output records for static commands.  Records hold the cleaned
+    response (decoded, raw capture or units lite) so cache hits skip
+    decoding and cleaning as well as the query.
+    """
+
+    def __init__(self, policy:str=CONNECTION_POLICY, command_names:list=STATIC_COMMANDS):
+        """Init function."""
+        if policy not in STATIC_CACHE_POLICIES:
+            raise ValueError(f"unknown static cache policy {policy}, choose from {', '.join(STATIC_CACHE_POLICIES)}")
+
+        self.policy = policy
+        self.command_names = set(command_names)
+        # command name to (record, connection, value encoder, query seconds)
+        self.cache = {}
+        self.hits = {}
+        self.saved_seconds = {}
+
+    def is_static(self, command_name:str) -> bool:
+        """True when command_name's responses are cached."""
+        return command_name in self.command_names
+
+    def start_file(self):
+        """New output file started, invalidates file policy cache."""
+        if self.policy == FILE_POLICY:
+            self.cache.clear()
+
+    def get(self, command_name:str, connection, value_encoder=None) -> dict:
+        """
+        Returns the cached output record for a static command or None when
+        command_name must be queried.  Don't modify the returned record.
+        """
+        entry = self.cache.get(command_name)
+        if entry is None:
+            return None
+
+        record, cached_connection, cached_value_encoder, query_seconds = entry
+
+        if cached_connection is not connection:
+            # reconnected since the record was cached
+            del self.cache[command_name]
+            return None
+
+        if 'obd_response_unit' in record and cached_value_encoder is not value_encoder:
+            # --structured_values unit ids are interned per output file
+            del self.cache[command_name]
+            return None
+
+        self.hits[command_name] = self.hits.get(command_name, 0) + 1
+        self.saved_seconds[command_name] = self.saved_seconds.get(command_name, 0.0) + query_seconds
+
+        return record
+
+    def add(self, record:dict, connection, query_seconds:float, value_encoder=None):
+        """
+        Cache a queried output record for a static command when it holds a
+        response without adapter errors.  value_encoder is the
+        StructuredValueEncoder the record was cleaned with.
+        """
+        command_name = record['command_name']
+
+        if not self.is_static(command_name) or record.get('obd_error_message'):
+            return
+
+        value = record.get('obd_response_value', record.get('raw_messages'))
+        if value is None or value == "no response":
+            return
+
+        self.cache[command_name] = (dict(record), connection, value_encoder, query_seconds, )
+
+    def log_statistics(self):
+        """Log cache hits and bus time saved per command."""
+        for command_name in sorted(self.hits):
+            logging.info(
+                f"static cache {command_name}: hits {self.hits[command_name]} " +
+                f"bus time saved {self.saved_seconds[command_name]:.3f} seconds"
+            )
+
+        logging.info(f"static cache: total bus time saved {sum(self.saved_seconds.values()):.3f} seconds")
@@ -0,0 +1,106 @@
+"""telemetry_obd/obd_synthetic_responses.py: Synthetic OBD responses for benchmarks and decoder checks."""
+
+from random import Random
+import logging
+import obd
+from obd.OBDResponse import OBDResponse
+from obd.protocols import ECU
+from obd.protocols.protocol import Frame, Message
+from .add_commands import NEW_COMMANDS
+from .obd_raw_decoder import get_protocol
+
+logger = logging.getLogger(__name__)
+
+# ISO 15765-4 CAN (11 bit ID, 500 kbaud) ELM 327 response lines
+CAN_11_500 = "6"
+
+# printable samples per seed in build_coverage_messages()
+PRINTABLE_SAMPLES = 16
+
+def build_obd_response(command_name:str, lines:list, protocol_id:str=CAN_11_500) -> OBDResponse:
+    """
+    Build an OBDResponse from ELM 327 response lines without a vehicle.
+    All messages are kept, including adapter error messages.
+    """
+    messages = get_protocol(protocol_id)(lines)
+    return OBDResponse(obd.commands[command_name], messages)
+
+def synthetic_payload(length:int, seed:int=0, printable:bool=True) -> bytes:
+    """
+    Deterministic pseudo random OBD response data bytes.  By default, bytes
+    are kept in the printable ASCII range so that string decoders (VIN,
+    CALIBRATION_ID) get decodable data.  printable False uses all 256 byte
+    values so that every bit flag gets exercised.
+    """
+    if printable:
+        return bytes(0x20 + ((seed + (index * 37) + 11) % 95) for index in range(length))
+
+    return bytes((seed + (index * 167) + 11) % 256 for index in range(length))
+
+def coverage_payloads(length:int, seed:int=0) -> list:
+    """
+    Pseudo random OBD response data bytes covering every support bit: one
+    payload for each first byte value (0 to 255), where support bit gated
+    decoders keep their support bits, followed by random bytes.  Different
+    seeds give independent samples.
+    """
+    if length <= 0:
+        return [b"", ]
+
+    random = Random(seed)
+    return [bytes([first, ]) + random.randbytes(length - 1) for first in range(256)]
+
+def build_payload_messages(command:obd.OBDCommand, payload:bytes) -> list:
+    """
+    Build python-obd messages a decoder can consume for command without
+    a vehicle.  Data holds the response mode/PID header followed by payload.
+    """
+    mode = int(command.command[:2], 16)
+    pid = int(command.command[2:4], 16)
+    data = bytearray([0x40 + mode, pid]) + payload
+
+    message = Message([Frame(data.hex().upper())])
+    message.data = data
+    message.ecu = ECU.ENGINE
+
+    return [message]
+
+def build_decoder_messages(command:obd.OBDCommand, seed:int=0, printable:bool=True) -> list:
+    """
+    Build python-obd messages for command holding synthetic data bytes
+    padded out to command.bytes.
+    """
+    return build_payload_messages(command, synthetic_payload(max(0, command.bytes - 2), seed, printable))
+
+def build_coverage_messages(command:obd.OBDCommand, seed:int=0) -> list:
+    """
+    Message samples for decoder checks: printable samples for string
+    decoders and coverage_payloads() samples exercising every support bit.
+    """
+    return [
+        build_decoder_messages(command, seed * PRINTABLE_SAMPLES + index)
+        for index in range(PRINTABLE_SAMPLES)
+    ] + [
+        build_payload_messages(command, payload)
+        for payload in coverage_payloads(max(0, command.bytes - 2), seed)
+    ]
+
+def decoded_new_commands(seed:int=0) -> dict:
+    """
+    Returns NEW_COMMANDS responses decoded from synthetic messages keyed by
+    command name.  Commands whose decoders can't handle the synthetic data
+    are left out.
+    """
+    obd_responses = {}
+
+    for command in NEW_COMMANDS:
+        try:
+            obd_response = command(build_decoder_messages(command, seed))
+        except Exception as e:
+            logging.info(f"{command.name}: synthetic data decoder exception {e.__class__.__name__}: {e}")
+            continue
+
+        if obd_response.value is not None:
+            obd_responses[command.name] = obd_response
+
+    return obd_responses
@@ -0,0 +1,473 @@
+# OBD Units Lite Decoding
+# telemetry-obd/telemetry_obd/units_lite.py
+"""
+Pint free decoding for add_commands.py decoders.
+
+Decoders in add_commands.py are rebound to a stand-in unit registry whose
+units vanish in arithmetic, so decoders compute plain int/float values.
+Units come from a static per-command schema (UNIT_SCHEMA in
+units_lite_schema.py) and are attached as LiteQuantity values which
+serialize exactly like pint Quantity values.  Pint Quantity values are
+available on demand through LiteQuantity.to_quantity().  Decoders with
+a byte layout (obd_byte_layouts.py) use their plain compiled decoders.
+
+Commands missing from UNIT_SCHEMA (python-obd decoders and decoders whose
+units lite output doesn't match pint output) keep using pint.
+
+Regenerate the schema after changing add_commands.py decoders:
+
+    python3.11 -m telemetry_obd.units_lite --schema > telemetry_obd/units_lite_schema.py
+"""
+from argparse import ArgumentParser
+from functools import partial
+from types import FunctionType
+from sys import stdout
+from pprint import pformat
+import sys
+import logging
+import obd
+from .__init__ import __version__
+from . import add_commands, obd_byte_layouts
+from .add_commands import NEW_COMMANDS
+from .obd_common_functions import (
+    get_error_capture_command,
+    get_obd_command,
+    normalize_obd_response_value,
+)
+from .obd_byte_layouts import get_compiled_decoder
+from .obd_synthetic_responses import build_coverage_messages
+from .units_lite_schema import UNIT_SCHEMA
+
+logger = logging.getLogger(__name__)
+
+# synthetic sample seeds, check samples are independent of schema samples
+SCHEMA_SEED = 0
+CHECK_SEED = 1
+
+class LiteUnit():
+    """
+    Stand-in for pint units while decoding.  Multiplying or dividing a
+    number by a LiteUnit returns the number unchanged.
+    """
+
+    def __mul__(self, other):
+        if isinstance(other, LiteUnit):
+            return self
+        return other
+
+    def __rmul__(self, other):
+        return other
+
+    def __truediv__(self, other):
+        if isinstance(other, LiteUnit):
+            return self
+        return 1 / other
+
+    def __rtruediv__(self, other):
+        return other
+
+    def __pow__(self, other):
+        return self
+
+LITE_UNIT = LiteUnit()
+
+class LiteUnitRegistry():
+    """
+    Stand-in for the add_commands.py pint UnitRegistry.
+    Every unit is LITE_UNIT and Quantity() returns the magnitude.
+    Parsed unit expressions (ureg['km/hour'], ureg('percent')) return
+    the magnitude pint gives them, 1.0 when the expression divides.
+    """
+
+    def __getattr__(self, name):
+        return LITE_UNIT
+
+    def __getitem__(self, expression):
+        return self(expression)
+
+    def __call__(self, expression):
+        return 1.0 if '/' in expression else 1
+
+    def Quantity(self, value, units=None):
+        return value
+
+LITE_UREG = LiteUnitRegistry()
+
+class LiteQuantity():
+    """
+    Plain number tagged with a pint unit string.  Serializes the same way
+    as pint Quantity values ("25 degree_Celsius").
+    """
+    __slots__ = ('magnitude', 'units', )
+
+    def __init__(self, magnitude, units:str):
+        """Init function."""
+        self.magnitude = magnitude
+        self.units = units
+
+    @property
+    def _units(self):
+        """Unit key used by StructuredValueEncoder."""
+        return self.units
+
+    def __str__(self):
+        return f"{self.magnitude} {self.units}"
+
+    def __repr__(self):
+        return f"<LiteQuantity({self.magnitude}, '{self.units}')>"
+
+    def __eq__(self, other):
+        if isinstance(other, LiteQuantity):
+            return self.magnitude == other.magnitude and self.units == other.units
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((self.magnitude, self.units, ))
+
+    def to_quantity(self):
+        """Returns the pint Quantity version of this value."""
+        return add_commands.ureg.Quantity(self.magnitude, self.units)
+
+def to_quantity(value):
+    """
+    Convert units lite values (LiteQuantity or lists of them) to pint
+    Quantity values.  Other values are returned unchanged.
+    """
+    if isinstance(value, LiteQuantity):
+        return value.to_quantity()
+
+    if isinstance(value, list):
+        return [to_quantity(item) for item in value]
+
+    return value
+
+def tag_units(value, units):
+    """
+    Attach schema units to plain decoder output.  units is a unit string,
+    None for values without units or a list of those matching list values.
+    """
+    if value is None or units is None:
+        return value
+
+    if isinstance(units, list):
+        if not isinstance(value, list) or len(value) != len(units):
+            logging.error(f"units lite: value {value} doesn't match units schema {units}")
+            return value
+
+        return [tag_units(item, item_units) for item, item_units in zip(value, units)]
+
+    if isinstance(value, bool) or not isinstance(value, (int, float, )):
+        return value
+
+    return LiteQuantity(value, units)
+
+# add_commands.py module namespace with decoders rebound to LITE_UREG
+lite_namespace = {}
+
+def get_lite_namespace() -> dict:
+    """
+    Returns a copy of the add_commands.py module namespace where every
+    function defined in add_commands.py (decoders and their helpers) uses
+    LITE_UREG instead of the pint UnitRegistry.
+    """
+    if not lite_namespace:
+        lite_namespace.update(vars(add_commands))
+        lite_namespace['ureg'] = LITE_UREG
+
+        for name, item in vars(add_commands).items():
+            if isinstance(item, FunctionType) and item.__module__ == add_commands.__name__:
+                lite_namespace[name] = FunctionType(
+                    item.__code__,
+                    lite_namespace,
+                    item.__name__,
+                    item.__defaults__,
+                    item.__closure__
+                )
+
+    return lite_namespace
+
+def get_plain_decoder(command:obd.OBDCommand):
+    """
+    Returns the units lite version of command's decoder returning plain
+    numbers or None when the decoder doesn't come from add_commands.py.
+    """
+    decoder = command.decode
+
+    if isinstance(decoder, partial):
+        plain_function = get_plain_decoder_function(decoder.func)
+        if plain_function:
+            return partial(plain_function, *decoder.args, **decoder.keywords)
+        return None
+
+    return get_plain_decoder_function(decoder)
+
+def get_plain_decoder_function(function):
+    """
+    Returns units lite version of add_commands.py function or None.
+    Decoders with a byte layout use the plain compiled decoder.
+    """
+    if not isinstance(function, FunctionType):
+        return None
+
+    if function.__module__ not in (add_commands.__name__, obd_byte_layouts.__name__, ):
+        return None
+
+    plain_decoder = get_compiled_decoder(function.__name__, quantities=False)
+    if plain_decoder:
+        return plain_decoder
+
+    if function.__module__ != add_commands.__name__:
+        return None
+
+    return get_lite_namespace()[function.__name__]
+
+def lite_decoder(plain_decoder, units, messages:list):
+    """Units lite decoder: plain decoder output tagged with schema units."""
+    return tag_units(plain_decoder(messages), units)
+
+lite_commands = {}
+
+def get_lite_command(command:obd.OBDCommand) -> obd.OBDCommand:
+    """
+    returns a copy of command decoding in units lite mode.  Commands
+    without a UNIT_SCHEMA entry are returned unchanged (pint decoding).
+    """
+    if command.name not in UNIT_SCHEMA:
+        return command
+
+    if command.name not in lite_commands:
+        lite_commands[command.name] = obd.OBDCommand(
+            command.name,
+            command.desc,
+            command.command,
+            command.bytes,
+            partial(lite_decoder, get_plain_decoder(command), UNIT_SCHEMA[command.name]),
+            command.ecu,
+            command.fast,
+            command.header
+        )
+
+    return lite_commands[command.name]
+
+def execute_obd_lite_command(connection:obd.OBD, command_name:str):
+    """
+    executes OBD interface query given command_name on OBD connection
+    decoding the response in units lite mode where available.
+    returns list or value
+    """
+    command = get_obd_command(command_name)
+
+    if not command:
+        logging.warn(f"LookupError: config file has command name <{command_name}> that doesn't exist")
+        return None
+
+    return connection.query(get_error_capture_command(get_lite_command(command)), force=True)
+
+def get_value_units(value):
+    """
+    Returns units schema for a pint decoder value: unit string for
+    Quantity values, list of those for lists, otherwise None.
+    """
+    if isinstance(value, list):
+        return [get_value_units(item) for item in value]
+
+    if value is not None and 'Quantity' in value.__class__.__name__:
+        return str(value.units)
+
+    return None
+
+def merge_units(units_a, units_b):
+    """
+    Merge units schemas from two samples.  None fills in from the other
+    sample.  Raises ValueError when the schemas conflict.
+    """
+    if units_a is None:
+        return units_b
+
+    if units_b is None:
+        return units_a
+
+    if isinstance(units_a, list) and isinstance(units_b, list) and len(units_a) == len(units_b):
+        return [merge_units(a, b) for a, b in zip(units_a, units_b)]
+
+    if units_a == units_b:
+        return units_a
+
+    raise ValueError(f"conflicting units {units_a} and {units_b}")
+
+def get_sample_messages(command:obd.OBDCommand, seed:int=SCHEMA_SEED) -> list:
+    """Synthetic message samples covering every support bit for schema generation and checks."""
+    return build_coverage_messages(command, seed)
+
+def decode_samples(command:obd.OBDCommand, plain_decoder, seed:int) -> list:
+    """
+    Returns (pint value, units lite plain value) for command's synthetic
+    samples.  Samples pint can't decode are left out, units lite decoder
+    exceptions are raised.
+    """
+    samples = []
+
+    for messages in get_sample_messages(command, seed):
+        try:
+            obd_response = command(messages)
+        except Exception:
+            # data the decoder can't handle
+            continue
+
+        samples.append((obd_response.value, plain_decoder(obd_response.messages), ))
+
+    return samples
+
+def compare_samples(command:obd.OBDCommand, samples:list, units) -> str:
+    """
+    Returns None when units lite values tagged with units reproduce pint
+    output for every sample, otherwise the first difference.
+    """
+    for pint_value, plain_value in samples:
+        if pint_value is None and plain_value is None:
+            continue
+
+        if pint_value is None or plain_value is None:
+            return f"pint value {pint_value}, units lite value {plain_value}"
+
+        expected = normalize_obd_response_value(command.name, pint_value)
+        actual = normalize_obd_response_value(command.name, tag_units(plain_value, units))
+        if expected != actual:
+            return f"pint {expected}, units lite {actual}"
+
+    return None
+
+def get_command_units(command:obd.OBDCommand):
+    """
+    Derive command's units schema by comparing pint and units lite decoding
+    on synthetic data.  Returns (True, units) when the schema reproduces
+    pint output for every sample, (False, reason) otherwise.
+    """
+    plain_decoder = get_plain_decoder(command)
+    if not plain_decoder:
+        return False, "not an add_commands.py decoder"
+
+    try:
+        samples = decode_samples(command, plain_decoder, SCHEMA_SEED)
+    except Exception as e:
+        return False, f"units lite {e.__class__.__name__}: {e}"
+
+    if not samples:
+        return False, "no usable synthetic samples"
+
+    units = None
+
+    for pint_value, _ in samples:
+        try:
+            units = merge_units(units, get_value_units(pint_value))
+        except ValueError as e:
+            return False, str(e)
+
+    difference = compare_samples(command, samples, units)
+    if difference:
+        return False, difference
+
+    return True, units
+
+def generate_unit_schema() -> dict:
+    """Returns UNIT_SCHEMA for NEW_COMMANDS decoders matching pint output."""
+    unit_schema = {}
+
+    for command in NEW_COMMANDS:
+        ok, units = get_command_units(command)
+        if ok:
+            unit_schema[command.name] = units
+        else:
+            logging.info(f"{command.name}: pint only: {units}")
+
+    return unit_schema
+
+def check_unit_schema() -> int:
+    """
+    Compare UNIT_SCHEMA to a freshly generated schema and check UNIT_SCHEMA
+    reproduces pint output on samples independent of the ones the schema
+    was generated from.  Returns mismatch count.
+    """
+    unit_schema = generate_unit_schema()
+    mismatches = 0
+
+    for command_name in sorted(set(unit_schema) | set(UNIT_SCHEMA)):
+        if unit_schema.get(command_name) != UNIT_SCHEMA.get(command_name):
+            logging.error(f"{command_name}: UNIT_SCHEMA {UNIT_SCHEMA.get(command_name)}, decoders {unit_schema.get(command_name)}")
+            mismatches += 1
+
+    for command in NEW_COMMANDS:
+        if command.name not in UNIT_SCHEMA:
+            continue
+
+        try:
+            samples = decode_samples(command, get_plain_decoder(command), CHECK_SEED)
+            difference = compare_samples(command, samples, UNIT_SCHEMA[command.name])
+        except Exception as e:
+            difference = f"units lite {e.__class__.__name__}: {e}"
+
+        if difference:
+            logging.error(f"{command.name}: check samples: {difference}")
+            mismatches += 1
+
+    return mismatches
+
+def argument_parsing()-> dict:
+    """Argument parsing"""
+    parser = ArgumentParser(description="Telemetry OBD Units Lite Schema")
+    parser.add_argument(
+        "--schema",
+        help="Print units_lite_schema.py generated from add_commands.py decoders.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--check",
+        help="Check units_lite_schema.py against add_commands.py decoders. Exit status is 1 on mismatch.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--verbose",
+        help="Turn verbose output on. Default is off.",
+        default=False,
+        action='store_true'
+    )
+    parser.add_argument(
+        "--version",
+        help="Print version number and exit.",
+        default=False,
+        action='store_true'
+    )
+    return vars(parser.parse_args())
+
+def main():
+    """Run main function."""
+
+    args = argument_parsing()
+
+    if args['version']:
+        print(f"Version {__version__}", file=stdout)
+        exit(0)
+
+    logging_level = logging.WARNING
+
+    if args['verbose']:
+        logging_level = logging.INFO
+
+    logging.basicConfig(stream=sys.stderr, level=logging_level)
+
+    if args['schema']:
+        print('"""telemetry_obd/units_lite_schema.py: Generated by python -m telemetry_obd.units_lite --schema"""', file=stdout)
+        print("", file=stdout)
+        print(f"UNIT_SCHEMA = {pformat(generate_unit_schema(), width=100)}", file=stdout)
+
+    if args['check']:
+        mismatches = check_unit_schema()
+        print(f"{mismatches} UNIT_SCHEMA mismatches", file=stdout)
+        if mismatches:
+            exit(1)
+
+
+if __name__ == "__main__":
+    main()
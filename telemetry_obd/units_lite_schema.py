@@ -0,0 +1,413 @@
+"""telemetry_obd/units_lite_schema.py: Generated by python -m telemetry_obd.units_lite --schema"""
+
+UNIT_SCHEMA = {'AFTERTREATMENT_STATUS': [None,
+                           None,
+                           None,
+                           None,
+                           None,
+                           None,
+                           None,
+                           None,
+                           None,
+                           None,
+                           None,
+                           'percent',
+                           'minute',
+                           'kilometer'],
+ 'ALTERNATIVE_FUEL': [None,
+                      None,
+                      None,
+                      None,
+                      None,
+                      'kilopascal',
+                      'degree_Celsius',
+                      'kilopascal',
+                      'kilopascal',
+                      'degree_Celsius'],
+ 'AUXILIARY_IN_OUT_STATUS': [None, None, None, None, None, None, None, None, None, None],
+ 'BOOST_PRESSURE': [None,
+                    None,
+                    None,
+                    None,
+                    None,
+                    None,
+                    'kilopascal',
+                    'kilopascal',
+                    'kilopascal',
+                    'kilopascal',
+                    None,
+                    None],
+ 'CACT': [None,
+          None,
+          None,
+          None,
+          'degree_Celsius',
+          'degree_Celsius',
+          'degree_Celsius',
+          'degree_Celsius'],
+ 'COMMANDED_DIESEL_AIR_INTAKE': [None,
+                                 None,
+                                 None,
+                                 None,
+                                 'percent',
+                                 'percent',
+                                 'percent',
+                                 'percent'],
+ 'COMMANDED_EGR_2': [None,
+                     None,
+                     None,
+                     None,
+                     None,
+                     None,
+                     'percent',
+                     'percent',
+                     'dimensionless',
+                     'percent',
+                     'percent',
+                     'dimensionless'],
+ 'CRANKCASE_VENTILATION': [None, None, 'pascal', 'revolutions_per_minute'],
+ 'CYLINDER_FUEL_RATE': 'milligram',
+ 'DEF_DOSING': [None, None, 'percent', 'liter'],
+ 'DEF_SENSOR': [None, None, None, None, None, 'percent', 'degree_Celsius', 'percent'],
+ 'DPF_BANK_1': [None, None, None, 'kilopascal', 'kilopascal', 'kilopascal'],
+ 'DPF_BANK_2': [None, None, None, 'kilopascal', 'kilopascal', 'kilopascal'],
+ 'DPF_TEMP': [None,
+              None,
+              None,
+              None,
+              'degree_Celsius',
+              'degree_Celsius',
+              'degree_Celsius',
+              'degree_Celsius'],
+ 'EGR_AIR_FLOW': [None, None, 'kilogram / hour', 'kilogram / hour'],
+ 'EGR_TEMP': [None,
+              None,
+              None,
+              None,
+              None,
+              None,
+              None,
+              None,
+              'degree_Celsius',
+              'degree_Celsius',
+              'degree_Celsius',
+              'degree_Celsius',
+              'degree_Celsius',
+              'degree_Celsius',
+              'degree_Celsius',
+              'degree_Celsius'],
+ 'EGT_BANK_1_TEMP': [None,
+                     None,
+                     None,
+                     None,
+                     'degree_Celsius',
+                     'degree_Celsius',
+                     'degree_Celsius',
+                     'degree_Celsius'],
+ 'EGT_BANK_2_TEMP': [None,
+                     None,
+                     None,
+                     None,
+                     'degree_Celsius',
+                     'degree_Celsius',
+                     'degree_Celsius',
+                     'degree_Celsius'],
+ 'ENGINE_COOLANT_TEMPERATURE': ['degree_Celsius', 'degree_Celsius'],
+ 'ENGINE_EXHAUST_FLOW_RATE': 'kilogram / second',
+ 'ENGINE_FRICTION_PERCENT_TORQUE': 'percent',
+ 'ENGINE_RUN_TIME': ['second', 'second', 'second'],
+ 'ENGINE_RUN_TIME_AECD_1': [None,
+                            None,
+                            None,
+                            None,
+                            None,
+                            'second',
+                            'second',
+                            'second',
+                            'second',
+                            'second',
+                            'second',
+                            'second',
+                            'second',
+                            'second',
+                            'second'],
+ 'ENGINE_RUN_TIME_AECD_2': [None,
+                            None,
+                            None,
+                            None,
+                            None,
+                            'second',
+                            'second',
+                            'second',
+                            'second',
+                            'second',
+                            'second',
+                            'second',
+                            'second',
+                            'second',
+                            'second'],
+ 'ENGINE_RUN_TIME_AECD_3': [None,
+                            None,
+                            None,
+                            None,
+                            None,
+                            'second',
+                            'second',
+                            'second',
+                            'second',
+                            'second',
+                            'second',
+                            'second',
+                            'second',
+                            'second',
+                            'second'],
+ 'ENGINE_RUN_TIME_AECD_4': [None,
+                            None,
+                            None,
+                            None,
+                            None,
+                            'second',
+                            'second',
+                            'second',
+                            'second',
+                            'second',
+                            'second',
+                            'second',
+                            'second',
+                            'second',
+                            'second'],
+ 'EVAP_PURGE_PRESSURE': [None, None, 'pascal', 'pascal'],
+ 'EVAP_SYS_VAPOR_PRESSURE': [None, None, None, None, 'pascal', 'pascal', 'pascal', 'pascal'],
+ 'EXHAUST_GAS_TEMP_BANK_1': [None,
+                             None,
+                             None,
+                             None,
+                             'degree_Celsius',
+                             'degree_Celsius',
+                             'degree_Celsius',
+                             'degree_Celsius'],
+ 'EXHAUST_GAS_TEMP_BANK_2': [None,
+                             None,
+                             None,
+                             None,
+                             'degree_Celsius',
+                             'degree_Celsius',
+                             'degree_Celsius',
+                             'degree_Celsius'],
+ 'EXHAUST_PRESSURE': [None, None, 'kilopascal', 'kilopascal'],
+ 'FUEL_PRESSURE_CONTROL': [None,
+                           None,
+                           None,
+                           None,
+                           None,
+                           None,
+                           'kilopascal',
+                           'kilopascal',
+                           'degree_Celsius',
+                           'kilopascal',
+                           'kilopascal',
+                           'degree_Celsius'],
+ 'FUEL_RATE_2': ['gram / second', 'gram / second'],
+ 'FUEL_SYSTEM': [None,
+                 None,
+                 None,
+                 None,
+                 None,
+                 None,
+                 None,
+                 None,
+                 'percent',
+                 'percent',
+                 'percent',
+                 'percent',
+                 'percent',
+                 'percent',
+                 'percent',
+                 'percent'],
+ 'FUEL_SYSTEM_STATUS': [None,
+                        None,
+                        None,
+                        None,
+                        None,
+                        None,
+                        None,
+                        None,
+                        None,
+                        None,
+                        None,
+                        None,
+                        None,
+                        None,
+                        None,
+                        None],
+ 'HYBRID_EV_DATA': [None, None, None, None, None, None, 'volt', 'ampere'],
+ 'HYDROCARBON_DOSER': [None, None, None, 'gram / minute', 'percent', 'kilopascal'],
+ 'INJECTION_PRESSURE_CONTROL': [None,
+                                None,
+                                None,
+                                None,
+                                'kilopascal',
+                                'kilopascal',
+                                'kilopascal',
+                                'kilopascal'],
+ 'INTAKE_AIR_TEMPERATURE_SENSOR': ['degree_Celsius', 'degree_Celsius'],
+ 'INTAKE_MANIFOLD_PRESSURE': [None, None, 'kilopascal', 'kilopascal'],
+ 'MASS_AIR_FLOW_SENSOR': ['gram / second', 'gram / second'],
+ 'MAX_DEF_RATE': [None, None, None, 'gram / hour'],
+ 'MOTORCYCLE_IO_STATUS': [None, None],
+ 'NOX_CONTROL_INFO': [None,
+                      None,
+                      None,
+                      None,
+                      None,
+                      None,
+                      None,
+                      None,
+                      None,
+                      None,
+                      'hour',
+                      'hour',
+                      'hour',
+                      'hour',
+                      'hour'],
+ 'NOX_EMISSION_RATE': [None, None, 'gram / second', None],
+ 'NOX_NTE_STATUS': [None, None, None, None],
+ 'NOX_SENSOR': [None, None, None, None, None, None, None, None, 'ppm', 'ppm', 'ppm', 'ppm'],
+ 'NOX_SENSOR_2': [None, None, None, None, None, None, None, None, 'ppm', 'ppm', 'ppm', 'ppm'],
+ 'NOX_SENSOR_CORRECTED': [None,
+                          None,
+                          None,
+                          None,
+                          None,
+                          None,
+                          None,
+                          None,
+                          'ppm',
+                          'ppm',
+                          'ppm',
+                          'ppm'],
+ 'NOX_SENSOR_CORRECTED_2': [None,
+                            None,
+                            None,
+                            None,
+                            None,
+                            None,
+                            None,
+                            None,
+                            'ppm',
+                            'ppm',
+                            'ppm',
+                            'ppm'],
+ 'NOX_SYSTEM': [None, None, None, None, 'lph', 'lph', 'percent', 'second'],
+ 'O2_SENSOR_WIDE': [None,
+                    None,
+                    None,
+                    None,
+                    None,
+                    None,
+                    None,
+                    None,
+                    'percent',
+                    'percent',
+                    'percent',
+                    'percent',
+                    'ratio',
+                    'ratio',
+                    'ratio',
+                    'ratio'],
+ 'O2_SENSOR_WIDE_RANGE': [None,
+                          None,
+                          None,
+                          None,
+                          None,
+                          None,
+                          None,
+                          None,
+                          'percent',
+                          'percent',
+                          'percent',
+                          'percent',
+                          None,
+                          None,
+                          None,
+                          None],
+ 'ODOMETER': 'kilometer',
+ 'PARTICULATE_MATTER': [None, None, 'milligram / meter ** 3', 'milligram / meter ** 3'],
+ 'PERCENT_TORQUE': ['percent', 'percent', 'percent', 'percent', 'percent'],
+ 'PM_NTE_STATUS': [None, None, None, None],
+ 'PM_SENSOR_OUTPUT': [None, None, None, None, None, None, None, None, 'percent', 'percent'],
+ 'REFERENCE_TORQUE': 'meter * newton',
+ 'SCR_CATALYST_STORAGE': [None,
+                          None,
+                          None,
+                          None,
+                          'gram / liter',
+                          'gram / liter',
+                          'gram / liter',
+                          'gram / liter'],
+ 'SCR_INDUCEMENT_SYSTEM': [None,
+                           None,
+                           None,
+                           None,
+                           None,
+                           None,
+                           None,
+                           None,
+                           None,
+                           None,
+                           None,
+                           None,
+                           None,
+                           None,
+                           None,
+                           None,
+                           None,
+                           None,
+                           None,
+                           None,
+                           None,
+                           'kilometer',
+                           'kilometer',
+                           'kilometer',
+                           'kilometer',
+                           'kilometer'],
+ 'SPEED_LIMITER': 'kilometer / hour',
+ 'THROTTLE': [None, None, None, None, 'percent', 'percent', 'percent', 'percent'],
+ 'TORQUE': 'percent',
+ 'TORQUE_DEMAND': 'percent',
+ 'TRANSMISSION_ACTUAL_GEAR': [None, None],
+ 'TURBO_A_TEMP': [None,
+                  None,
+                  None,
+                  None,
+                  'degree_Celsius',
+                  'degree_Celsius',
+                  'degree_Celsius',
+                  'degree_Celsius'],
+ 'TURBO_B_TEMP': [None,
+                  None,
+                  None,
+                  None,
+                  'degree_Celsius',
+                  'degree_Celsius',
+                  'degree_Celsius',
+                  'degree_Celsius'],
+ 'TURBO_INLET_PRESSURE': [None, None, None, None, 'kilopascal', 'kilopascal', 'kilopascal', None],
+ 'TURBO_RPM': [None, None, 'revolutions_per_minute', 'revolutions_per_minute'],
+ 'VEHICLE_OPERATION_DATA': ['kilometer', 'kilometer', 'kilometer', 'liter'],
+ 'VG_TURBO_CONTROL': [None,
+                      None,
+                      None,
+                      None,
+                      None,
+                      None,
+                      'percent',
+                      'percent',
+                      'percent',
+                      'percent',
+                      None,
+                      None],
+ 'WASTEGATE_CONTROL': [None, None, None, None, 'percent', 'percent', 'percent', 'percent'],
+ 'WWH_OBD_ECU_INFO': [None, 'hour', 'hour'],
+ 'WWH_OBD_SYSTEM_INFO': [None, None, None, 'hour'],
+ 'WWH_OBD_VEHICLE_INFO': [None, 'hour']}